@@ -0,0 +1,96 @@
+# Benchmark src/amm.py and check it against the router's own getAmountsOut/getAmountsIn
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_amm
+#
+# The router comparison only runs when RPC_URL is set, e.g. RPC_URL=https://mainnet.infura.io/v3/<key>
+# (getAmountOut and getAmountIn are pure, so they are called with random reserves)
+
+import os
+import random
+import time
+
+from src.amm import get_amounts_out, get_amounts_in, get_amounts_out_batch, get_amounts_in_batch
+
+CANDIDATES = 10000
+HOPS = 3
+
+UNISWAP_V2_ROUTER = '0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D'
+ROUTER_ABI = [
+    {"inputs": [{"name": "amountIn", "type": "uint256"}, {"name": "reserveIn", "type": "uint256"},
+                {"name": "reserveOut", "type": "uint256"}],
+     "name": "getAmountOut", "outputs": [{"name": "amountOut", "type": "uint256"}],
+     "stateMutability": "pure", "type": "function"},
+    {"inputs": [{"name": "amountOut", "type": "uint256"}, {"name": "reserveIn", "type": "uint256"},
+                {"name": "reserveOut", "type": "uint256"}],
+     "name": "getAmountIn", "outputs": [{"name": "amountIn", "type": "uint256"}],
+     "stateMutability": "pure", "type": "function"},
+]
+
+
+def bench(name: str, n: int, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {n / elapsed:>14,.0f} quotes/sec")
+
+
+def scalar_out(amounts, reserves):
+    result = []
+    for amount in amounts:
+        try:
+            result.append(get_amounts_out(amount, reserves)[-1])
+        except ValueError:
+            result.append(0)
+    return result
+
+
+def scalar_in(amounts, reserves):
+    result = []
+    for amount in amounts:
+        try:
+            result.append(get_amounts_in(amount, reserves)[0])
+        except ValueError:
+            result.append(None)
+    return result
+
+
+def main():
+    random.seed(4)
+    reserves = [(random.randint(10 ** 20, 10 ** 26), random.randint(10 ** 20, 10 ** 26)) for _ in range(HOPS)]
+    amounts_in = [random.randint(1, 10 ** 22) for _ in range(CANDIDATES)]
+    amounts_out = [random.randint(1, 10 ** 19) for _ in range(CANDIDATES)]
+
+    assert get_amounts_out_batch(amounts_in, reserves) == scalar_out(amounts_in, reserves)
+    assert get_amounts_in_batch(amounts_out, reserves) == scalar_in(amounts_out, reserves)
+
+    bench("get_amounts_out (scalar)", CANDIDATES, lambda: scalar_out(amounts_in, reserves))
+    bench("get_amounts_out_batch", CANDIDATES, lambda: get_amounts_out_batch(amounts_in, reserves))
+    bench("get_amounts_in (scalar)", CANDIDATES, lambda: scalar_in(amounts_out, reserves))
+    bench("get_amounts_in_batch", CANDIDATES, lambda: get_amounts_in_batch(amounts_out, reserves))
+
+    rpc_url = os.getenv("RPC_URL")
+    if not rpc_url:
+        print("RPC_URL not set, skipping the router comparison")
+        return
+
+    from web3 import Web3
+    w3 = Web3(Web3.HTTPProvider(rpc_url))
+    router = w3.eth.contract(address=UNISWAP_V2_ROUTER, abi=ROUTER_ABI)
+    mismatches = 0
+    for _ in range(50):
+        reserve_in, reserve_out = random.randint(1, 10 ** 30), random.randint(1, 10 ** 30)
+        amount = random.randint(1, reserve_out - 1) if reserve_out > 1 else 1
+        expected_out = router.functions.getAmountOut(amount, reserve_in, reserve_out).call()
+        expected_in = router.functions.getAmountIn(amount, reserve_in, reserve_out).call()
+        if get_amounts_out(amount, [(reserve_in, reserve_out)])[-1] != expected_out:
+            mismatches += 1
+        if get_amounts_in(amount, [(reserve_in, reserve_out)])[0] != expected_in:
+            mismatches += 1
+    print(f"router comparison: {mismatches} mismatches")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+# Pre-trade reads of contracts/dex.py: one call per value vs Multicall3 aggregate3 vs a JSON-RPC batch
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_multicall
+#   python -m benchmarks.bench_multicall --latency-ms 50 --rounds 20
+#
+# Two stand-in nodes (benchmarks/standin_node.py) are started in their own processes, one with a
+# Multicall3 contract and one without. The reads of a swap (ETH balance, token balance, router
+# allowance, pool reserves) are taken every way against the first, every value is checked to be the
+# same, then ReadAggregator is pointed at the second to check it falls back to a JSON-RPC batch.
+
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import time
+
+from web3 import AsyncWeb3
+from web3.providers.persistent import WebSocketProvider
+
+from src.batch import RpcBatcher
+from src.multicall import ReadAggregator, eth_balance, erc20_allowance, erc20_balance, pair_reserves
+from src.pairs import PairResolver
+from src.utils import to_checksum_address, to_hex_str
+
+NODE_PORT = 18700
+OWNER = '0x' + '11' * 20
+TOKEN = '0x' + '22' * 20
+WETH = '0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2'
+ROUTER = '0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D'
+FACTORY = '0x5C69bEe701ef814a2B6a3EDD4B1652CB9cc5aA6f'
+
+
+def pre_trade_reads():
+    pair = PairResolver().pair_address(FACTORY, TOKEN, WETH)
+    return {
+        'eth_balance': eth_balance(OWNER),
+        'token_balance': erc20_balance(TOKEN, OWNER),
+        'allowance': erc20_allowance(TOKEN, OWNER, ROUTER),
+        'reserves': pair_reserves(pair),
+    }
+
+
+# What dex.py did before: one request per value, awaited one after the other
+async def read_one_by_one(w3, reads):
+    values = {}
+    for name, read in reads.items():
+        if read.target is None:
+            values[name] = await w3.eth.get_balance(to_checksum_address(read.owner))
+        else:
+            output = await w3.eth.call({'to': to_checksum_address(read.target), 'data': to_hex_str(read.data)})
+            values[name] = read.decode(bytes(output))
+    return values
+
+
+async def timed(name, rounds, fn):
+    timings = []
+    values = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        values = await fn()
+        timings.append(time.perf_counter() - started)
+    print(f"{name:<28} median {statistics.median(timings) * 1000:8.2f}ms  max {max(timings) * 1000:8.2f}ms")
+    return values
+
+
+async def connect(port):
+    w3 = AsyncWeb3(WebSocketProvider(f"ws://127.0.0.1:{port}"))
+    await w3.provider.connect()
+    return w3
+
+
+async def run(rounds, latency_ms):
+    nodes = [
+        subprocess.Popen([sys.executable, "-m", "benchmarks.standin_node", "--port", str(NODE_PORT + i), "--rate", "0",
+                          "--latency-ms", str(latency_ms), *extra], stdout=subprocess.PIPE, text=True)
+        for i, extra in enumerate(([], ["--no-multicall"]))
+    ]
+    try:
+        for node in nodes:
+            node.stdout.readline()
+        reads = pre_trade_reads()
+        w3 = await connect(NODE_PORT)
+        multicall = ReadAggregator(RpcBatcher(w3.provider))
+        batch = ReadAggregator(RpcBatcher(w3.provider), multicall_address=None)
+
+        print(f"{len(reads)} reads, {latency_ms}ms per request")
+        baseline = await timed("one call per value", rounds, lambda: read_one_by_one(w3, reads))
+        via_multicall = await timed("Multicall3 aggregate3", rounds, lambda: multicall.read(**reads))
+        via_batch = await timed("JSON-RPC batch", rounds, lambda: batch.read(**reads))
+        # the reserves carry the node's clock as blockTimestampLast, compare the reserves only
+        for snapshot in (via_multicall, via_batch):
+            values = dict(snapshot.values, reserves=snapshot.values['reserves'][:2])
+            assert values == dict(baseline, reserves=baseline['reserves'][:2]), (snapshot, baseline)
+        print(f"same values every way, multicall read at block {via_multicall.block_number}")
+
+        w3_without = await connect(NODE_PORT + 1)
+        fallback = ReadAggregator(RpcBatcher(w3_without.provider))
+        snapshot = await fallback.read(**reads)
+        assert fallback.multicall_address is None and snapshot.source == "batch", snapshot
+        print(f"without Multicall3: {snapshot}")
+        await w3.provider.disconnect()
+        await w3_without.provider.disconnect()
+    finally:
+        for node in nodes:
+            node.terminate()
+            node.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.rounds, args.latency_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Compare local CREATE2 pair address derivation with factory.getPair over RPC
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_pair_address
+#
+# The RPC half only runs when RPC_URL is set, e.g. RPC_URL=https://mainnet.infura.io/v3/<key>
+
+import os
+import random
+import time
+
+from src.pairs import PairResolver, pair_for, sort_tokens, UNISWAP_V2_INIT_CODE_HASH
+from src.utils import to_data_bytes
+
+UNISWAP_V2_FACTORY = bytes.fromhex('5c69bee701ef814a2b6a3edd4b1652cb9cc5aa6f')
+# Well known mainnet tokens, so the RPC half queries pairs that exist
+TOKENS = [bytes.fromhex(address) for address in (
+    'c02aaa39b223fe8d0a0e5c4f27ead9083c756cc2',  # WETH
+    'a0b86991c6218b36c1d19d4a2e9eb0ce3606eb48',  # USDC
+    'dac17f958d2ee523a2206206994597c13d831ec7',  # USDT
+    '6b175474e89094c44da98b954eedeac495271d0f',  # DAI
+    '2260fac5e5542a773aa44fbcfedf7c193bc2c599',  # WBTC
+    '1f9840a85d5af5bf1d1762f919d85c3cb3fb3ed7',  # UNI
+)]
+LOOKUPS = 50000
+RPC_LOOKUPS = 50
+
+
+def bench(name: str, n: int, fn):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {n / elapsed:>14,.0f} lookups/sec  {elapsed / n * 1e6:>10.2f} us/lookup")
+
+
+def main():
+    random.seed(3)
+    pairs = [tuple(random.sample(TOKENS, 2)) for _ in range(LOOKUPS)]
+    init_code_hash = to_data_bytes(UNISWAP_V2_INIT_CODE_HASH)
+
+    it = iter(pairs)
+    bench("pair_for (no memo)", LOOKUPS, lambda: pair_for(UNISWAP_V2_FACTORY, *next(it), init_code_hash))
+
+    resolver = PairResolver()
+    it = iter(pairs)
+    bench("PairResolver (LRU memo)", LOOKUPS, lambda: resolver.pair_address(UNISWAP_V2_FACTORY, *next(it)))
+    print(f"  {resolver.cache_info()}")
+
+    rpc_url = os.getenv("RPC_URL")
+    if not rpc_url:
+        print("RPC_URL not set, skipping factory.getPair")
+        return
+
+    from web3 import Web3
+    w3 = Web3(Web3.HTTPProvider(rpc_url))
+    factory = w3.eth.contract(
+        address=w3.to_checksum_address(UNISWAP_V2_FACTORY),
+        abi=[{"constant": True, "inputs": [{"name": "", "type": "address"}, {"name": "", "type": "address"}],
+              "name": "getPair", "outputs": [{"name": "", "type": "address"}], "type": "function"}],
+    )
+    it = iter(pairs)
+
+    def get_pair():
+        token_a, token_b = next(it)
+        on_chain = factory.functions.getPair(w3.to_checksum_address(token_a), w3.to_checksum_address(token_b)).call()
+        local = resolver.pair_address(UNISWAP_V2_FACTORY, token_a, token_b)
+        if int(on_chain, 16) and to_data_bytes(on_chain) != local:
+            raise AssertionError(f"getPair {on_chain} != local 0x{local.hex()} for {sort_tokens(token_a, token_b)}")
+
+    bench("factory.getPair (RPC)", RPC_LOOKUPS, get_pair)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Microbenchmark for src/parse.py
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_parse
+
+import random
+import time
+
+from eth_abi import encode
+
+from src.parse import parse_univ2_router_tx, uniswap_v2_router_methods
+
+SAMPLES = 20000
+ROUNDS = 5
+
+
+# `rng` is a seeded random.Random (or the random module, seeded by the caller), so corpora are reproducible
+def random_address(rng=random) -> str:
+    return '0x' + rng.randbytes(20).hex()
+
+
+def random_value(abi_type: str, rng=random):
+    if abi_type == 'address':
+        return random_address(rng)
+    if abi_type == 'address[]':
+        return [random_address(rng) for _ in range(rng.randint(2, 4))]
+    if abi_type == 'bool':
+        return rng.random() < 0.5
+    if abi_type == 'uint8':
+        return rng.randint(27, 28)
+    if abi_type == 'bytes32':
+        return rng.randbytes(32)
+    return rng.getrandbits(rng.choice((64, 96, 128, 256)))
+
+
+def build_corpus(n: int, swaps_only: bool = False, rng=random) -> list:
+    entries = [
+        (selector, entry) for selector, entry in uniswap_v2_router_methods.items()
+        if entry.types and (not swaps_only or entry.method.startswith('swap'))
+    ]
+    corpus = []
+    for _ in range(n):
+        selector, entry = rng.choice(entries)
+        corpus.append(selector + encode(entry.types, [random_value(t, rng) for t in entry.types]))
+    return corpus
+
+
+def bench(name: str, corpus: list, decode_fn):
+    best = float('inf')
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        for tx_data in corpus:
+            decode_fn(tx_data)
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<32} {len(corpus) / best:>12,.0f} decodes/sec")
+
+
+def main():
+    random.seed(1)
+    corpus = build_corpus(SAMPLES)
+    swaps = build_corpus(SAMPLES, swaps_only=True)
+    bench("parse_univ2_router_tx (all)", corpus, parse_univ2_router_tx)
+    bench("parse_univ2_router_tx (swaps)", swaps, parse_univ2_router_tx)
+    views = [memoryview(tx_data) for tx_data in swaps]
+    bench("parse_univ2_router_tx (memoryview)", views, parse_univ2_router_tx)
+
+
+if __name__ == "__main__":
+    main()
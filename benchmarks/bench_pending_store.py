@@ -0,0 +1,168 @@
+# Memory per pending transaction and add/evict rate of src/pending.PendingTxStore
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_pending_store
+#   python -m benchmarks.bench_pending_store --transactions 200000 --senders 50000 --tokens 5000
+#
+# Synthetic router swaps arrive as raw JSON-RPC objects (hex strings, as a subscription delivers
+# them), from a pool of senders with increasing nonces, through paths drawn from a pool of tokens,
+# with a share of them replaced (same sender and nonce, new hash). Memory is measured with
+# tracemalloc, for the store and for what keeping the handler's inputs would cost: the formatted
+# transaction dict and its decoded call, keyed by hash. The store is then run well past its
+# capacity to check memory stays flat. Rates are timed apart, without tracemalloc and with the
+# calldata decoded beforehand.
+
+import argparse
+import gc
+import os
+import random
+import time
+import tracemalloc
+
+from eth_abi import encode
+
+from src.parse import parse_univ2_router_tx, uniswap_v2_router_methods
+from src.pending import PendingTxStore
+from src.utils import format_transaction, to_data_bytes
+
+ROUTERS = ['0x7a250d5630b4cf539739df2c5dacb4c659f2488d', '0xd9e1ce17f2641f24ae83637ab66a2cca9c378b9f']
+SWAPS = [(selector, entry) for selector, entry in uniswap_v2_router_methods.items() if entry.method.startswith('swap')]
+
+
+def make_transactions(n, senders, tokens, replace_share):
+    random.seed(24)
+    senders = ['0x' + os.urandom(20).hex() for _ in range(senders)]
+    tokens = ['0x' + os.urandom(20).hex() for _ in range(tokens)]
+    nonces = dict.fromkeys(senders, 0)
+    transactions = []
+    for _ in range(n):
+        sender = random.choice(senders)
+        if transactions and random.random() < replace_share:
+            # speed up the last transaction of a sender: same nonce, higher fees
+            nonce = max(0, nonces[sender] - 1)
+        else:
+            nonce = nonces[sender]
+            nonces[sender] += 1
+        selector, entry = random.choice(SWAPS)
+        args = []
+        for abi_type in entry.types:
+            if abi_type == 'address[]':
+                args.append(random.sample(tokens, random.randint(2, 3)))
+            elif abi_type == 'address':
+                args.append(sender)
+            else:
+                args.append(random.getrandbits(96))
+        max_fee = random.getrandbits(36)
+        transactions.append({
+            'hash': '0x' + os.urandom(32).hex(),
+            'from': sender,
+            'to': random.choice(ROUTERS),
+            'nonce': hex(nonce),
+            'gas': hex(200000),
+            'value': hex(random.getrandbits(60)),
+            'maxFeePerGas': hex(max_fee),
+            'maxPriorityFeePerGas': hex(max_fee // 10),
+            'input': '0x' + (selector + encode(entry.types, args)).hex(),
+            'type': '0x2',
+            'chainId': '0x1',
+            'accessList': [],
+            'v': '0x1',
+            'yParity': '0x1',
+            'r': '0x' + os.urandom(32).hex(),
+            's': '0x' + os.urandom(32).hex(),
+            'blockHash': None,
+            'blockNumber': None,
+            'transactionIndex': None,
+        })
+    return transactions
+
+
+# Bytes still allocated once `fill` returned, i.e. what it built and kept
+def measure(fill):
+    gc.collect()
+    tracemalloc.start()
+    kept = fill()
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return kept, current
+
+
+def keep_handler_inputs(transactions):
+    kept = {}
+    for tx in transactions:
+        tx = format_transaction(tx)
+        kept[tx['hash']] = (tx, parse_univ2_router_tx(tx['input']))
+    return kept
+
+
+def fill_store(store, transactions):
+    for tx in transactions:
+        store.add(tx, parse_univ2_router_tx(to_data_bytes(tx['input'])))
+    return store
+
+
+def rate(store, transactions, calls):
+    started = time.perf_counter()
+    for tx, call in zip(transactions, calls):
+        store.add(tx, call)
+    return len(transactions) / (time.perf_counter() - started)
+
+
+def run(n, senders, tokens, replace_share):
+    transactions = make_transactions(n, senders, tokens, replace_share)
+    print(f"{n} swaps from {senders} senders through {tokens} tokens, {replace_share:.0%} replacements")
+
+    calls = [parse_univ2_router_tx(to_data_bytes(tx['input'])) for tx in transactions]
+    baseline, baseline_bytes = measure(lambda: keep_handler_inputs(transactions))
+    print(f"{'dict + RouterCall by hash':<28} {len(baseline):>8} tx  {baseline_bytes / len(baseline):>7,.0f} B/tx")
+    del baseline
+
+    store, store_bytes = measure(lambda: fill_store(PendingTxStore(capacity=n, ttl=3600), transactions))
+    print(f"{'PendingTxStore':<28} {len(store):>8} tx  {store_bytes / len(store):>7,.0f} B/tx"
+          f"  x{baseline_bytes / len(transactions) / (store_bytes / len(store)):.1f} smaller  replaced={store.replaced}")
+    del store
+    store = PendingTxStore(capacity=n, ttl=3600)
+    print(f"{'add':<28} {n:>8} tx  {rate(store, transactions, calls):>9,.0f} adds/s")
+
+    started = time.perf_counter()
+    for record in list(store.by_hash.values()):
+        store.remove(record.hash)
+    print(f"{'remove':<28} {len(transactions) - store.replaced:>8} tx  {(n - store.replaced) / (time.perf_counter() - started):>9,.0f} removes/s")
+    del store
+
+    # steady state: 4x the capacity goes through, every add past it evicts the oldest record
+    capacity = n // 4
+    store = PendingTxStore(capacity=capacity, ttl=3600)
+    gc.collect()
+    tracemalloc.start()
+    samples = []
+    for i in range(4):
+        fill_store(store, transactions[i * capacity:(i + 1) * capacity])
+        gc.collect()
+        samples.append(tracemalloc.get_traced_memory()[0])
+    tracemalloc.stop()
+    print(f"{'at capacity ' + str(capacity):<28} {len(store):>8} tx  "
+          f"{' -> '.join(f'{sample / 2**20:.1f}' for sample in samples)} MiB  evicted={store.evicted}")
+    store = PendingTxStore(capacity=capacity, ttl=3600)
+    print(f"{'add at capacity':<28} {n:>8} tx  {rate(store, transactions, calls):>9,.0f} adds/s  evicted={store.evicted}")
+
+    # age: everything expires at once
+    store.ttl = 0
+    started = time.perf_counter()
+    expired = store.evict()
+    print(f"{'expire':<28} {expired:>8} tx  {expired / (time.perf_counter() - started):>9,.0f} evictions/s  left={len(store)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--senders", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--replace-share", type=float, default=0.05)
+    args = parser.parse_args()
+    run(args.transactions, args.senders, args.tokens, args.replace_share)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Benchmark harness for src/simulate.py: decoded pending swaps applied to cached reserves
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_simulate
+
+import os
+import random
+import time
+
+from src.parse import RouterCall, uniswap_v2_router_methods
+from src.simulate import SWAP_KINDS, simulate_swap
+
+SWAPS = 50000
+TOKENS = 50
+
+
+def build_reserves(tokens):
+    table = {}
+    for i, token_a in enumerate(tokens):
+        for token_b in tokens[i + 1:]:
+            reserve_a, reserve_b = random.randint(10 ** 18, 10 ** 26), random.randint(10 ** 18, 10 ** 26)
+            table[token_a, token_b] = (reserve_a, reserve_b, 0)
+            table[token_b, token_a] = (reserve_b, reserve_a, 0)
+    return table
+
+
+def build_swaps(tokens, n):
+    entries = [(selector, entry) for selector, entry in uniswap_v2_router_methods.items() if entry.method in SWAP_KINDS]
+    swaps = []
+    for _ in range(n):
+        selector, entry = random.choice(entries)
+        values = {
+            'amountIn': random.randint(10 ** 15, 10 ** 21),
+            'amountOut': random.randint(10 ** 15, 10 ** 18),
+            'amountOutMin': random.randint(0, 10 ** 18),
+            'amountInMax': random.randint(10 ** 18, 10 ** 22),
+            'path': tuple(random.sample(tokens, random.randint(2, 4))),
+            'to': os.urandom(20),
+            'deadline': 2 ** 32,
+        }
+        call = RouterCall(selector, entry.method, entry.names, tuple(values[name] for name in entry.names))
+        swaps.append((call, random.randint(10 ** 15, 10 ** 21)))
+    return swaps
+
+
+def main():
+    random.seed(5)
+    tokens = [os.urandom(20) for _ in range(TOKENS)]
+    reserves = build_reserves(tokens)
+    reserves_of = lambda token_a, token_b: reserves.get((token_a, token_b))
+    swaps = build_swaps(tokens, SWAPS)
+
+    start = time.perf_counter()
+    simulated = 0
+    reverting = 0
+    for call, value in swaps:
+        result = simulate_swap(call, reserves_of, value)
+        if result is not None:
+            simulated += 1
+            reverting += result.reverts
+    elapsed = time.perf_counter() - start
+    print(f"simulate_swap {SWAPS / elapsed:>12,.0f} swaps/sec ({simulated} simulated, {reverting} would revert)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# Startup time: `import main`, and a cold start until the first provider is subscribed to pending transactions
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_startup
+#   python -m benchmarks.bench_startup --runs 20
+#
+# Every run is a fresh interpreter. The cold start points main.py at the local stand-in node
+# (benchmarks/standin_node.py, started once in its own process) and stops it as soon as the
+# line is printed, so the figure is imports + configuration + ABI loading + the first WebSocket
+# handshake and eth_subscribe. Router and factory default to the mainnet UniswapV2 ones when .env
+# does not set them.
+#
+# The precompiled ABIs (src/abi.py) make `import main` fast (about 1.5s -> 0.15s). Providers connect
+# through src/wsrpc.py instead of web3, whose import alone took about 1.4s (eth_account and py_ecc):
+# the cold start to subscription went from about 1.56s to 0.25s. Nothing on main.py's path imports
+# web3 any more, contracts/dex.py only does in connect().
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+NODE_PORT = 18600
+READY_LINE = "Subscribed to newPendingTransactions"
+ENV_DEFAULTS = {
+    "UNISWAP_V2_TEST_ROUTER_ADDRESS": "0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D",
+    "UNISWAP_V2_TEST_FACTORY_ADDRESS": "0x5C69bEe701ef814a2B6a3EDD4B1652CB9cc5aA6f",
+}
+
+
+def child_env():
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    for name, value in ENV_DEFAULTS.items():
+        env.setdefault(name, value)
+    return env
+
+
+def time_import(runs) -> list:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import main"], env=child_env(), check=True,
+                       stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def time_cold_start(runs, node_port) -> list:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        bot = subprocess.Popen([sys.executable, "-m", "benchmarks.bench_startup", "--child", str(node_port)],
+                               env=child_env(), stdout=subprocess.PIPE, text=True)
+        try:
+            for line in bot.stdout:
+                if READY_LINE in line:
+                    timings.append(time.perf_counter() - started)
+                    break
+            else:
+                raise RuntimeError(f"main.py exited with {bot.wait()} before listening")
+        finally:
+            bot.kill()
+            bot.wait()
+    return timings
+
+
+# Runs main.main() against the stand-in node, everything but the provider list as configured
+def child(node_port):
+    import main as bot
+
+    bot.PROVIDER_URLS = {"standin": f"ws://127.0.0.1:{node_port}"}
+    bot.METRICS_CONFIG = {"enabled": False}
+    asyncio.run(bot.main())
+
+
+def report(name, timings):
+    print(f"{name:<28} median {statistics.median(timings) * 1000:8.1f}ms  "
+          f"min {min(timings) * 1000:8.1f}ms  max {max(timings) * 1000:8.1f}ms  ({len(timings)} runs)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--child", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child)
+        return
+
+    report("import main", time_import(args.runs))
+    env = child_env()
+    node = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.standin_node", "--port", str(NODE_PORT), "--rate", "10",
+         "--router", env["UNISWAP_V2_TEST_ROUTER_ADDRESS"], "--factory", env["UNISWAP_V2_TEST_FACTORY_ADDRESS"]],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    try:
+        # the node prints a line once it is listening
+        node.stdout.readline()
+        report("cold start to subscription", time_cold_start(args.runs, NODE_PORT))
+    finally:
+        node.terminate()
+        node.wait()
+
+
+if __name__ == "__main__":
+    main()
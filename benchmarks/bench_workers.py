@@ -0,0 +1,137 @@
+# Decode + swap simulation: on the event loop vs 1 to N worker processes reading a shared reserve table
+#
+# Run from the repository root:
+#   python -m benchmarks.bench_workers
+#   python -m benchmarks.bench_workers --transactions 50000 --max-processes 8 --batch-size 128
+#
+# Every pair along the synthetic swap paths gets random reserves, in a PairCache for the inline run
+# and in a ReserveTable for the workers, so every swap is simulated. Worker results are checked
+# against the inline ones. Alongside throughput, a ticker task measures how late the event loop
+# wakes up (what a socket read would wait), which is what moving the work off the loop is about.
+# The speedup is bounded by the machine's cores, os.cpu_count() is printed first.
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from benchmarks.bench_parse import build_corpus
+from src.metrics import Histogram
+from src.pairs import PairCache, PairResolver, PairState, sort_tokens
+from src.parse import parse_univ2_router_tx
+from src.simulate import simulate_swap
+from src.workers import ReserveTable, WorkerPool
+
+FACTORY = '0x5C69bEe701ef814a2B6a3EDD4B1652CB9cc5aA6f'
+TICK = 0.001
+
+
+def make_transactions(n):
+    random.seed(23)
+    return [{'input': tx_data, 'value': random.getrandbits(60)} for tx_data in build_corpus(n, swaps_only=True)]
+
+
+def fill_reserves(transactions, cache: PairCache, table: ReserveTable):
+    for tx in transactions:
+        call = parse_univ2_router_tx(tx['input'])
+        path = call.get('path') if call is not None else None
+        for token_a, token_b in zip(path or (), (path or ())[1:]):
+            if token_a == token_b:
+                continue
+            pair = cache.pair_address(token_a, token_b)
+            if pair in cache.states:
+                continue
+            reserve0, reserve1 = random.getrandbits(100), random.getrandbits(100)
+            cache.states[pair] = PairState(*sort_tokens(token_a, token_b), reserve0, reserve1, 1)
+            table.publish(pair, reserve0, reserve1, 1)
+
+
+def decode_inline(tx, cache):
+    call = parse_univ2_router_tx(tx['input'])
+    if call is None:
+        return None
+    return call, simulate_swap(call, cache.get_reserves, tx['value']) if call.is_swap else None
+
+
+# Wakes up every TICK and records how late it was, in microseconds
+async def ticker(lag: Histogram):
+    while True:
+        expected = time.perf_counter() + TICK
+        await asyncio.sleep(TICK)
+        lag.record(int(max(0.0, time.perf_counter() - expected) * 1e6))
+
+
+async def run_inline(transactions, cache, batch_size):
+    lag = Histogram()
+    tick = asyncio.create_task(ticker(lag))
+    results = []
+    started = time.perf_counter()
+    for i in range(0, len(transactions), batch_size):
+        results += [decode_inline(tx, cache) for tx in transactions[i:i + batch_size]]
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - started
+    tick.cancel()
+    return results, elapsed, lag
+
+
+async def run_workers(transactions, table, resolver, processes, batch_size):
+    pool = WorkerPool(table, FACTORY, resolver, processes=processes)
+    await pool.start()
+    lag = Histogram()
+    tick = asyncio.create_task(ticker(lag))
+    in_flight = asyncio.Semaphore(2 * processes)
+
+    async def one(batch):
+        async with in_flight:
+            return await pool.decode_batch(batch)
+
+    started = time.perf_counter()
+    batches = await asyncio.gather(*(one(transactions[i:i + batch_size]) for i in range(0, len(transactions), batch_size)))
+    elapsed = time.perf_counter() - started
+    tick.cancel()
+    pool.stop()
+    return [result for batch in batches for result in batch], elapsed, lag
+
+
+def same(inline, worker) -> bool:
+    if inline is None or worker is None or isinstance(worker, Exception):
+        return inline is None and worker is None
+    return inline[0] == worker[0] and inline[1] == worker[1]
+
+
+def report(name, n, elapsed, lag, baseline=None):
+    speedup = f"  x{baseline / elapsed:4.2f}" if baseline else ""
+    print(f"{name:<22} {n / elapsed:>10,.0f} tx/s{speedup}  loop lag p99 {lag.percentile(0.99):>7}us  max {lag.max:>7}us")
+
+
+async def run(n, max_processes, batch_size):
+    transactions = make_transactions(n)
+    resolver = PairResolver()
+    cache = PairCache(FACTORY, resolver)
+    table = ReserveTable.create(1 << 17)
+    try:
+        fill_reserves(transactions, cache, table)
+        print(f"{n} swaps, {len(table)} pairs, batches of {batch_size}, os.cpu_count()={os.cpu_count()}")
+        inline, baseline, lag = await run_inline(transactions, cache, batch_size)
+        report("event loop", n, baseline, lag)
+        for processes in range(1, max_processes + 1):
+            results, elapsed, lag = await run_workers(transactions, table, resolver, processes, batch_size)
+            mismatches = sum(not same(a, b) for a, b in zip(inline, results))
+            assert mismatches == 0 and len(results) == n, f"{mismatches} results differ from the inline run"
+            report(f"{processes} worker process{'es' if processes > 1 else ''}", n, elapsed, lag, baseline)
+    finally:
+        table.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--transactions", type=int, default=20000)
+    parser.add_argument("--max-processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(run(args.transactions, args.max_processes, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
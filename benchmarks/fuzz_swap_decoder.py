@@ -0,0 +1,85 @@
+# Check that the swap fast path in src/parse.py agrees with eth_abi on a fuzzed corpus,
+# then compare the throughput of both paths.
+#
+# Run from the repository root:
+#   python -m benchmarks.fuzz_swap_decoder
+
+import random
+
+from benchmarks.bench_parse import build_corpus, bench
+from src.parse import decode_args, decode_swap_args, swap_selectors, uniswap_v2_router_methods
+
+SAMPLES = 20000
+
+
+# Corrupt a valid calldata in one of the ways a hostile or buggy sender could
+def mutate(tx_data: bytes) -> bytes:
+    data = bytearray(tx_data)
+    kind = random.randrange(5)
+    if kind == 0:
+        # truncate
+        del data[random.randrange(4, len(data)):]
+    elif kind == 1:
+        # flip a random byte
+        data[random.randrange(4, len(data))] ^= 1 << random.randrange(8)
+    elif kind == 2:
+        # dirty the padding of a random word
+        word = 4 + 32 * random.randrange((len(data) - 4) // 32)
+        data[word + random.randrange(12)] = random.randrange(1, 256)
+    elif kind == 3:
+        # append garbage
+        data += bytes(random.randrange(256) for _ in range(random.randrange(1, 64)))
+    else:
+        # point the path offset somewhere else
+        amounts = swap_selectors[bytes(data[:4])]
+        word = 4 + 32 * amounts
+        data[word:word + 32] = random.randrange(0, len(data) + 64).to_bytes(32, 'big')
+    return bytes(data)
+
+
+def reference(tx_data: bytes):
+    try:
+        return decode_args(uniswap_v2_router_methods[tx_data[:4]], tx_data[4:])
+    except Exception:
+        return 'error'
+
+
+def verify(corpus: list) -> int:
+    mismatches = 0
+    fast_hits = 0
+    for tx_data in corpus:
+        fast = decode_swap_args(memoryview(tx_data)[4:], swap_selectors[tx_data[:4]])
+        if fast is None:
+            # falls back to eth_abi, nothing to compare
+            continue
+        fast_hits += 1
+        expected = reference(tx_data)
+        if fast != expected:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"mismatch for 0x{tx_data.hex()}\n  fast:    {fast}\n  eth_abi: {expected}")
+    print(f"{len(corpus)} inputs, {fast_hits} taken by the fast path, {mismatches} mismatches")
+    return mismatches
+
+
+def main():
+    random.seed(2)
+    valid = build_corpus(SAMPLES, swaps_only=True)
+    fuzzed = [mutate(tx_data) for tx_data in valid]
+
+    failed = verify(valid) + verify(fuzzed)
+
+    selectors = [swap_selectors[tx_data[:4]] for tx_data in valid]
+    entries = [uniswap_v2_router_methods[tx_data[:4]] for tx_data in valid]
+    views = [memoryview(tx_data)[4:] for tx_data in valid]
+    fast_inputs = list(zip(views, selectors))
+    generic_inputs = list(zip(entries, views))
+    bench("decode_swap_args", fast_inputs, lambda item: decode_swap_args(*item))
+    bench("eth_abi decode", generic_inputs, lambda item: decode_args(*item))
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
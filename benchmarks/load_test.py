@@ -0,0 +1,131 @@
+# End-to-end load test: main.main() against the local stand-in node
+#
+# Run from the repository root:
+#   python -m benchmarks.load_test                  # every scenario
+#   python -m benchmarks.load_test --duration 30 --scenario 0 --scenario 2
+#
+# For each scenario a stand-in node (benchmarks/standin_node.py) is started in its own process, so
+# it doesn't take CPU time from the bot, the bot is pointed at it as its only provider and run
+# unchanged for `warmup + duration` seconds, then cancelled. Throughput comes from the bot's own
+# Prometheus counters over the measured window, handling latencies (seen -> handler returned, and
+# the handler alone) from its summaries, which cover the whole run. Router and factory default to the mainnet UniswapV2 ones when .env does
+# not set them. Synthetic token metadata is written to a temporary registry, removed afterwards.
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+from dotenv import load_dotenv
+
+load_dotenv()
+os.environ.setdefault("UNISWAP_V2_TEST_ROUTER_ADDRESS", "0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D")
+os.environ.setdefault("UNISWAP_V2_TEST_FACTORY_ADDRESS", "0x5C69bEe701ef814a2B6a3EDD4B1652CB9cc5aA6f")
+
+import main as bot
+from src.logs import configure_logging, flush_logs
+
+NODE_PORT = 18546
+METRICS_PORT = 19100
+
+# (name, tx/s, latency ms, jitter ms, mempool source, full transactions)
+SCENARIOS = [
+    ("subscription, full bodies", 500, 0, 0, "subscription", True),
+    ("subscription, hashes + fetch", 500, 5, 5, "subscription", False),
+    ("filter polling + fetch", 500, 5, 5, "filter", False),
+    ("subscription, full bodies, slow node", 2000, 50, 50, "subscription", True),
+    ("subscription, hashes + fetch, slow node", 2000, 50, 50, "subscription", False),
+]
+
+
+async def scrape(port) -> dict:
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    await writer.drain()
+    body = (await reader.read()).decode().split('\r\n\r\n', 1)[1]
+    writer.close()
+    samples = {}
+    for line in body.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+async def run_scenario(index, scenario, warmup, duration):
+    name, rate, latency_ms, jitter_ms, source, full_transactions = scenario
+    node_port = NODE_PORT + index
+    node = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "benchmarks.standin_node", "--port", str(node_port), "--rate", str(rate),
+        "--latency-ms", str(latency_ms), "--jitter-ms", str(jitter_ms), "--block-time", "2",
+        "--router", os.environ["UNISWAP_V2_TEST_ROUTER_ADDRESS"],
+        "--factory", os.environ["UNISWAP_V2_TEST_FACTORY_ADDRESS"],
+        stdout=asyncio.subprocess.PIPE,
+    )
+    # the node prints a line once it is listening
+    await node.stdout.readline()
+    metrics_port = METRICS_PORT + index
+    bot.PROVIDER_URLS = {"standin": f"ws://127.0.0.1:{node_port}"}
+    bot.MEMPOOL_SOURCE = source
+    bot.FULL_TRANSACTIONS = full_transactions
+    bot.METRICS_CONFIG = {"enabled": True, "host": "127.0.0.1", "port": metrics_port}
+    bot.FAN_IN_CONFIG = {"log_interval": 3600, "connect_timeout": 10}
+    bot_task = asyncio.create_task(bot.main())
+    try:
+        await asyncio.sleep(warmup)
+        before = await scrape(metrics_port)
+        await asyncio.sleep(duration)
+        after = await scrape(metrics_port)
+    finally:
+        bot_task.cancel()
+        await asyncio.gather(bot_task, return_exceptions=True)
+        node.terminate()
+        await node.wait()
+
+    def rate_of(metric):
+        key = f"sandwichbot_{metric}"
+        return (after.get(key, 0) - before.get(key, 0)) / duration
+
+    def quantile(metric, q):
+        return after.get(f'sandwichbot_{metric}{{quantile="{q}"}}', 0) * 1000
+
+    print(f"[{index}] {name}: {rate} tx/s offered, latency {latency_ms}+{jitter_ms}ms")
+    # full bodies are filtered before entering the pipeline, hashes only once fetched
+    seen = rate_of('pipeline_received_total') + rate_of('pipeline_dropped_total')
+    if full_transactions and source == "subscription":
+        seen += rate_of('pipeline_filtered_total')
+    print(f"    seen {seen:,.0f}/s  received {rate_of('pipeline_received_total'):,.0f}/s  "
+          f"filtered {rate_of('pipeline_filtered_total'):,.0f}/s  handled {rate_of('pipeline_handled_total'):,.0f}/s  "
+          f"dropped {rate_of('pipeline_dropped_total'):,.0f}/s  missing {rate_of('pipeline_missing_total'):,.0f}/s")
+    print(f"    blocks {rate_of('reconciler_blocks_total') * duration:.0f}  "
+          f"mined {rate_of('reconciler_mined_total'):,.0f}/s  replaced {rate_of('reconciler_replaced_total'):,.0f}/s  "
+          f"pending store {after.get('sandwichbot_pending_store_size', 0):,.0f}")
+    for metric in ('pipeline_end_to_end_seconds', 'pipeline_handle_seconds', 'pipeline_fetch_seconds'):
+        print(f"    {metric:<28} p50 {quantile(metric, 0.5):8.2f}ms  p99 {quantile(metric, 0.99):8.2f}ms")
+
+
+async def run(indexes, warmup, duration):
+    for index in indexes:
+        await run_scenario(index, SCENARIOS[index], warmup, duration)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--scenario", type=int, action="append", help="index in SCENARIOS, repeatable")
+    parser.add_argument("--log-level", default="warn")
+    args = parser.parse_args()
+
+    configure_logging(level=args.log_level)
+    # the synthetic tokens go to a throwaway registry, not the bot's own registry.sqlite3
+    with tempfile.TemporaryDirectory() as registry_dir:
+        bot.TOKEN_REGISTRY.path = os.path.join(registry_dir, "registry.sqlite3")
+        asyncio.run(run(args.scenario or range(len(SCENARIOS)), args.warmup, args.duration))
+        bot.TOKEN_REGISTRY.close()
+    flush_logs()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# Replay a mempool capture through main.py's filter, decode and handler stages, without a network
+#
+# Run from the repository root:
+#   python -m benchmarks.replay_mempool capture.bin                 # original pacing
+#   python -m benchmarks.replay_mempool capture.bin --speed 10      # ten times faster
+#   python -m benchmarks.replay_mempool capture.bin --speed 0       # as fast as possible
+#   python -m benchmarks.replay_mempool capture.bin --synthesize 100000 --rate 500
+#
+# Captures are recorded by main.py when `capture_path` is set in config.json, --synthesize writes
+# a random one instead (router calls mixed with other traffic, replacing the file) before replaying it.
+# Nothing is fetched: hash-only records count as missing, and every pair is served the same fixed
+# reserves so the simulation step still runs. Router and factory default to the mainnet UniswapV2
+# ones when .env does not set them. At --speed 0 the stage latencies mostly measure queueing,
+# use a finite speed to read them.
+
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+os.environ.setdefault("UNISWAP_V2_TEST_ROUTER_ADDRESS", "0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D")
+os.environ.setdefault("UNISWAP_V2_TEST_FACTORY_ADDRESS", "0x5C69bEe701ef814a2B6a3EDD4B1652CB9cc5aA6f")
+
+import main as bot
+from benchmarks.bench_parse import build_corpus
+from src.capture import CaptureWriter, replay
+from src.logs import configure_logging, flush_logs
+from src.pipeline import MempoolPipeline
+
+ROUTER_SHARE = 0.3  # share of synthetic transactions sent to the router
+RESERVES = (2 * 10 ** 24).to_bytes(32, 'big') + (10 ** 24).to_bytes(32, 'big') + bytes(32)
+
+
+# Answers every getReserves call with RESERVES
+class OfflineReserves:
+    async def call(self, transaction):
+        return RESERVES
+
+
+def synthesize(path, n, rate):
+    rng = random.Random(18)
+    router = os.environ["UNISWAP_V2_TEST_ROUTER_ADDRESS"]
+    corpus = build_corpus(n, rng=rng)
+    capture = CaptureWriter(path, truncate=True)
+    t_ns = time.time_ns()
+    for i, tx_data in enumerate(corpus):
+        t_ns += int(rng.expovariate(rate) * 1e9)
+        to_router = rng.random() < ROUTER_SHARE
+        capture.write({
+            'hash': '0x' + rng.randbytes(32).hex(),
+            'from': '0x' + rng.randbytes(20).hex(),
+            'to': router if to_router else '0x' + rng.randbytes(20).hex(),
+            'input': '0x' + (tx_data.hex() if to_router else rng.randbytes(rng.choice((0, 68, 132))).hex()),
+            'value': hex(rng.getrandbits(60)),
+            'nonce': hex(i),
+            'gas': hex(300000),
+            'maxFeePerGas': hex(rng.getrandbits(36)),
+            'maxPriorityFeePerGas': hex(rng.getrandbits(30)),
+            'type': '0x2',
+        }, t_ns)
+    capture.close()
+    print(f"Wrote {n} synthetic transactions to {path}")
+
+
+async def run(path, speed, handler):
+    rpc = OfflineReserves()
+    # main() builds it otherwise
+    bot.PAIR_CACHE = bot.PairCache(bot.UNISWAP_V2_FACTORY_ADDRESS, bot.PAIR_RESOLVER)
+
+    async def fetch(tx_hash):
+        return None
+
+    async def handle(tx, route_data):
+        if handler:
+            await bot.sandwich_uniswap_v2_router_tx(tx, route_data, rpc)
+
+    pipeline = MempoolPipeline.from_config(
+        fetch, bot.decode_uniswap_v2_router_tx, handle, bot.PIPELINE_CONFIG, accept=bot.ROUTER_FILTER.accept
+    )
+    pipeline.start()
+    started = time.perf_counter()
+    fed = await replay(path, pipeline, speed=speed)
+    await pipeline.join()
+    elapsed = time.perf_counter() - started
+    await pipeline.stop()
+
+    print(f"{fed} records in {elapsed:.3f}s: {fed / elapsed:,.0f} tx/s (speed={speed or 'max'})")
+    print(' '.join(f"{name}={value}" for name, value in pipeline.stats.as_dict().items()))
+    for stage in ('decode', 'handle', 'end_to_end'):
+        histogram = pipeline.latency[stage]
+        print(f"  {stage:<12} p50={histogram.percentile(0.5):>8}us  p99={histogram.percentile(0.99):>8}us  "
+              f"max={histogram.max:>8}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="capture file")
+    parser.add_argument("--speed", type=float, default=1.0, help="1 original pacing, 0 as fast as possible")
+    parser.add_argument("--synthesize", type=int, metavar="N", help="write N random transactions to path first")
+    parser.add_argument("--rate", type=float, default=200, help="average tx/s of the synthetic capture")
+    parser.add_argument("--no-handler", action="store_true", help="stop after decoding")
+    parser.add_argument("--log-level", default="warn")
+    args = parser.parse_args()
+
+    configure_logging(level=args.log_level)
+    if args.synthesize:
+        synthesize(args.path, args.synthesize, args.rate)
+    asyncio.run(run(args.path, args.speed, not args.no_handler))
+    flush_logs()
+
+
+if __name__ == "__main__":
+    main()
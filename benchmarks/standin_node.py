@@ -0,0 +1,408 @@
+# Local stand-in for an Ethereum node, speaking the JSON-RPC subset main.py uses over WebSocket
+#
+# Run from the repository root:
+#   python -m benchmarks.standin_node --port 8546 --rate 500 --latency-ms 20
+# then point a provider at it, e.g. `quicknode_sepolia_wss=ws://127.0.0.1:8546` in .env.
+# benchmarks/load_test.py starts it the same way, in a separate process.
+#
+# Pending transactions are synthesized at `rate` tx/s, `router_share` of them calling the router
+# with random UniswapV2 Router calldata, and pushed to eth_subscribe("newPendingTransactions")
+# subscribers and pending filters. Blocks (without Sync logs) are produced every `block_time`
+# seconds and mine up to `block_size` of the oldest pending transactions, which the node then
+# returns with their block and a receipt. Every pair exists and has the same reserves, every address is an 18 decimals token
+# holding TOKEN_BALANCE of it with no allowance, and has ETH_BALANCE wei. Each request (and each
+# entry of a batch) is answered after `latency_ms` plus up to `jitter_ms` of random delay,
+# subscription messages are pushed right away. Traffic comes from a random.Random seeded with `seed`.
+#
+# Supported: web3_clientVersion, net_version, eth_chainId, eth_blockNumber, eth_subscribe,
+# eth_unsubscribe, eth_newPendingTransactionFilter, eth_newBlockFilter, eth_getFilterChanges,
+# eth_uninstallFilter, eth_getTransactionByHash, eth_getTransactionReceipt, eth_getBlockByHash,
+# eth_getBlockByNumber, eth_getLogs, eth_call (getReserves, getPair, decimals, symbol, balanceOf,
+# allowance, and Multicall3 aggregate3/getEthBalance/getBlockNumber unless --no-multicall),
+# eth_getTransactionCount, eth_getBalance
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import time
+
+from eth_abi import decode, encode
+from eth_utils import function_signature_to_4byte_selector
+from websockets.asyncio.server import serve
+
+from benchmarks.bench_parse import build_corpus
+from src.pairs import GET_RESERVES_SELECTOR, PairResolver
+from src.multicall import (ALLOWANCE_SELECTOR, AGGREGATE3_SELECTOR, BALANCE_OF_SELECTOR, GET_BLOCK_NUMBER_SELECTOR,
+                           GET_ETH_BALANCE_SELECTOR, MULTICALL3_ADDRESS)
+from src.registry import DECIMALS_SELECTOR, SYMBOL_SELECTOR
+from src.utils import to_data_bytes, to_hex_str
+
+GET_PAIR_SELECTOR = function_signature_to_4byte_selector('getPair(address,address)')
+UNISWAP_V2_ROUTER = '0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D'
+UNISWAP_V2_FACTORY = '0x5C69bEe701ef814a2B6a3EDD4B1652CB9cc5aA6f'
+RESERVES = (2 * 10 ** 24, 10 ** 24)
+ETH_BALANCE = 10 ** 20
+TOKEN_BALANCE = 10 ** 24
+CORPUS_SIZE = 4096
+TICK = 0.001  # seconds between two generation rounds
+
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class StandinNode:
+    def __init__(self, host='127.0.0.1', port=8546, rate=200, router_share=0.3, latency_ms=0, jitter_ms=0,
+                 block_time=12, chain_id=1, router=UNISWAP_V2_ROUTER, factory=UNISWAP_V2_FACTORY,
+                 pending_limit=100000, multicall=MULTICALL3_ADDRESS, block_size=300, seed=19):
+        self.host = host
+        self.random = random.Random(seed)  # every synthesized value comes from it, runs are reproducible
+        self.port = port
+        self.rate = rate
+        self.router_share = router_share
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.block_time = block_time
+        self.block_size = block_size
+        self.chain_id = chain_id
+        self.router = router
+        self.factory = to_data_bytes(factory)
+        self.resolver = PairResolver()
+        self.multicall = to_data_bytes(multicall) if multicall else None
+        self.pending = {}  # tx hash (hex) -> transaction object
+        self._pending_order = collections.deque()
+        self._unmined = collections.deque()  # tx hashes not in a block yet, oldest first
+        self.pending_limit = pending_limit
+        self.blocks = []  # block objects, index = number
+        self.emitted = 0  # pending transactions generated
+        self.requests = 0  # JSON-RPC requests answered, batch entries included
+        self._subscriptions = {}  # subscription id -> (websocket, kind, full transactions)
+        self._filters = {}  # filter id -> (kind, list of new entries)
+        self._next_id = 1
+        self._corpus = []
+        self._server = None
+        self._tasks = []
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self):
+        self._corpus = build_corpus(CORPUS_SIZE, rng=self.random)
+        self._new_block()
+        self._server = await serve(self._connection, self.host, self.port, max_size=None)
+        self._tasks = [asyncio.create_task(self._generate()), asyncio.create_task(self._produce_blocks())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def _new_id(self):
+        self._next_id += 1
+        return hex(self._next_id)
+
+    # -- traffic --
+
+    def _make_tx(self):
+        to_router = self.random.random() < self.router_share
+        input_data = self.random.choice(self._corpus) if to_router else self.random.randbytes(self.random.choice((0, 68)))
+        return {
+            'blockHash': None,
+            'blockNumber': None,
+            'transactionIndex': None,
+            'hash': '0x' + self.random.randbytes(32).hex(),
+            'from': '0x' + self.random.randbytes(20).hex(),
+            'to': self.router if to_router else '0x' + self.random.randbytes(20).hex(),
+            'input': '0x' + input_data.hex(),
+            'value': hex(self.random.getrandbits(60)),
+            'nonce': hex(self.random.getrandbits(16)),
+            'gas': hex(300000),
+            'gasPrice': hex(self.random.getrandbits(36)),
+            'maxFeePerGas': hex(self.random.getrandbits(36)),
+            'maxPriorityFeePerGas': hex(self.random.getrandbits(30)),
+            'type': '0x2',
+            'chainId': hex(self.chain_id),
+            'accessList': [],
+            'v': '0x0',
+            'yParity': '0x0',
+            'r': '0x' + self.random.randbytes(32).hex(),
+            's': '0x' + self.random.randbytes(32).hex(),
+        }
+
+    def _emit(self, tx):
+        tx_hash = tx['hash']
+        self.pending[tx_hash] = tx
+        self._pending_order.append(tx_hash)
+        self._unmined.append(tx_hash)
+        if len(self._pending_order) > self.pending_limit:
+            self.pending.pop(self._pending_order.popleft(), None)
+        self.emitted += 1
+        for kind, entries in self._filters.values():
+            if kind == 'pending':
+                entries.append(tx_hash)
+        for subscription_id, (websocket, kind, full) in list(self._subscriptions.items()):
+            if kind == 'newPendingTransactions':
+                self._push(websocket, subscription_id, tx if full else tx_hash)
+
+    def _push(self, websocket, subscription_id, result):
+        message = json.dumps({'jsonrpc': '2.0', 'method': 'eth_subscription',
+                              'params': {'subscription': subscription_id, 'result': result}})
+        asyncio.ensure_future(self._send(websocket, message))
+
+    async def _send(self, websocket, message):
+        try:
+            await websocket.send(message)
+        except Exception:
+            pass
+
+    async def _generate(self):
+        started = time.perf_counter()
+        while True:
+            due = int((time.perf_counter() - started) * self.rate)
+            while self.emitted < due:
+                self._emit(self._make_tx())
+            await asyncio.sleep(TICK)
+
+    def _new_block(self):
+        number = len(self.blocks)
+        block = {
+            'number': hex(number),
+            'hash': '0x' + self.random.randbytes(32).hex(),
+            'parentHash': self.blocks[-1]['hash'] if self.blocks else '0x' + bytes(32).hex(),
+            'timestamp': hex(int(time.time())),
+            'miner': '0x' + bytes(20).hex(),
+            'gasLimit': hex(30000000),
+            'gasUsed': '0x0',
+            'baseFeePerGas': hex(10 ** 9),
+            'difficulty': '0x0',
+            'extraData': '0x',
+            'logsBloom': '0x' + bytes(256).hex(),
+            'nonce': '0x' + bytes(8).hex(),
+            'receiptsRoot': '0x' + bytes(32).hex(),
+            'sha3Uncles': '0x' + bytes(32).hex(),
+            'stateRoot': '0x' + bytes(32).hex(),
+            'transactionsRoot': '0x' + bytes(32).hex(),
+            'size': '0x0',
+            'transactions': [],
+            'uncles': [],
+        }
+        while self._unmined and len(block['transactions']) < self.block_size:
+            tx = self.pending.get(self._unmined.popleft())
+            if tx is None:
+                continue
+            tx.update(blockHash=block['hash'], blockNumber=block['number'], transactionIndex=hex(len(block['transactions'])))
+            block['transactions'].append(tx['hash'])
+        self.blocks.append(block)
+        return block
+
+    # Blocks hold transaction hashes, bodies are looked up for full blocks
+    def _block_result(self, block, full):
+        if block is None or not full:
+            return block
+        return dict(block, transactions=[self.pending[h] for h in block['transactions'] if h in self.pending])
+
+    async def _produce_blocks(self):
+        while True:
+            await asyncio.sleep(self.block_time)
+            block = self._new_block()
+            for kind, entries in self._filters.values():
+                if kind == 'block':
+                    entries.append(block['hash'])
+            head = {k: v for k, v in block.items() if k not in ('transactions', 'uncles', 'size')}
+            for subscription_id, (websocket, kind, _) in list(self._subscriptions.items()):
+                if kind == 'newHeads':
+                    self._push(websocket, subscription_id, head)
+
+    # -- JSON-RPC --
+
+    async def _connection(self, websocket):
+        try:
+            async for message in websocket:
+                asyncio.ensure_future(self._answer(websocket, message))
+        finally:
+            for subscription_id in [s for s, (ws, _, _) in self._subscriptions.items() if ws is websocket]:
+                del self._subscriptions[subscription_id]
+
+    async def _answer(self, websocket, message):
+        request = json.loads(message)
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self.random.random() * self.jitter)
+        if isinstance(request, list):
+            response = [self._call(websocket, r) for r in request]
+        else:
+            response = self._call(websocket, request)
+        await self._send(websocket, json.dumps(response))
+
+    def _call(self, websocket, request):
+        self.requests += 1
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        try:
+            handler = getattr(self, 'rpc_' + request['method'], None)
+            if handler is None:
+                raise RpcError(-32601, f"the method {request['method']} does not exist/is not available")
+            response['result'] = handler(websocket, *request.get('params', []))
+        except RpcError as e:
+            response['error'] = {'code': e.code, 'message': str(e)}
+        return response
+
+    def rpc_web3_clientVersion(self, websocket):
+        return 'SandwichBot-standin/0.1'
+
+    def rpc_net_version(self, websocket):
+        return str(self.chain_id)
+
+    def rpc_eth_chainId(self, websocket):
+        return hex(self.chain_id)
+
+    def rpc_eth_blockNumber(self, websocket):
+        return hex(len(self.blocks) - 1)
+
+    def rpc_eth_subscribe(self, websocket, kind, full=False):
+        if kind not in ('newPendingTransactions', 'newHeads'):
+            raise RpcError(-32602, f"unsupported subscription {kind}")
+        subscription_id = self._new_id()
+        self._subscriptions[subscription_id] = (websocket, kind, bool(full))
+        return subscription_id
+
+    def rpc_eth_unsubscribe(self, websocket, subscription_id):
+        return self._subscriptions.pop(subscription_id, None) is not None
+
+    def rpc_eth_newPendingTransactionFilter(self, websocket):
+        filter_id = self._new_id()
+        self._filters[filter_id] = ('pending', [])
+        return filter_id
+
+    def rpc_eth_newBlockFilter(self, websocket):
+        filter_id = self._new_id()
+        self._filters[filter_id] = ('block', [])
+        return filter_id
+
+    def rpc_eth_getFilterChanges(self, websocket, filter_id):
+        if filter_id not in self._filters:
+            raise RpcError(-32000, "filter not found")
+        kind, entries = self._filters[filter_id]
+        self._filters[filter_id] = (kind, [])
+        return entries
+
+    def rpc_eth_uninstallFilter(self, websocket, filter_id):
+        return self._filters.pop(filter_id, None) is not None
+
+    def rpc_eth_getTransactionByHash(self, websocket, tx_hash):
+        return self.pending.get(tx_hash.lower())
+
+    def rpc_eth_getTransactionReceipt(self, websocket, tx_hash):
+        tx = self.pending.get(tx_hash.lower())
+        if tx is None or tx['blockHash'] is None:
+            return None
+        return {'transactionHash': tx['hash'], 'blockHash': tx['blockHash'], 'blockNumber': tx['blockNumber'],
+                'transactionIndex': tx['transactionIndex'], 'from': tx['from'], 'to': tx['to'], 'status': '0x1',
+                'gasUsed': hex(150000), 'cumulativeGasUsed': hex(150000), 'effectiveGasPrice': tx['gasPrice'],
+                'logs': [], 'logsBloom': '0x' + bytes(256).hex(), 'contractAddress': None, 'type': tx['type']}
+
+    def rpc_eth_getTransactionCount(self, websocket, address, block='latest'):
+        return '0x0'
+
+    def rpc_eth_getBlockByNumber(self, websocket, number, full=False):
+        if number in ('latest', 'pending', 'safe', 'finalized'):
+            return self._block_result(self.blocks[-1], full)
+        number = 0 if number == 'earliest' else int(number, 16)
+        return self._block_result(self.blocks[number] if number < len(self.blocks) else None, full)
+
+    def rpc_eth_getBlockByHash(self, websocket, block_hash, full=False):
+        return self._block_result(next((b for b in reversed(self.blocks) if b['hash'] == block_hash), None), full)
+
+    def rpc_eth_getLogs(self, websocket, params):
+        return []
+
+    def rpc_eth_getBalance(self, websocket, address, block='latest'):
+        return hex(ETH_BALANCE)
+
+    def rpc_eth_call(self, websocket, transaction, block='latest'):
+        data = to_data_bytes(transaction.get('data') or transaction.get('input'))
+        return to_hex_str(self._execute(to_data_bytes(transaction['to']), data))
+
+    def _execute(self, to: bytes, data: bytes) -> bytes:
+        if self.multicall is None and to == to_data_bytes(MULTICALL3_ADDRESS):
+            # nothing deployed there, calling an address without code succeeds with no output
+            return b''
+        if to == self.multicall:
+            if data[:4] == AGGREGATE3_SELECTOR:
+                results = []
+                for target, allow_failure, call_data in decode(['(address,bool,bytes)[]'], data[4:])[0]:
+                    try:
+                        results.append((True, self._execute(to_data_bytes(target), call_data)))
+                    except RpcError:
+                        if not allow_failure:
+                            raise
+                        results.append((False, b''))
+                return encode(['(bool,bytes)[]'], [results])
+            if data[:4] == GET_BLOCK_NUMBER_SELECTOR:
+                return (len(self.blocks) - 1).to_bytes(32, 'big')
+            if data[:4] == GET_ETH_BALANCE_SELECTOR:
+                return ETH_BALANCE.to_bytes(32, 'big')
+        if data[:4] == GET_RESERVES_SELECTOR:
+            reserve0, reserve1 = RESERVES
+            timestamp = int(time.time())
+            return reserve0.to_bytes(32, 'big') + reserve1.to_bytes(32, 'big') + timestamp.to_bytes(32, 'big')
+        if data[:4] == GET_PAIR_SELECTOR and len(data) >= 68:
+            return bytes(12) + self.resolver.pair_address(self.factory, data[16:36], data[48:68])
+        if data[:4] == DECIMALS_SELECTOR:
+            return (18).to_bytes(32, 'big')
+        if data[:4] == SYMBOL_SELECTOR:
+            # string return: offset, length, then the padded bytes
+            symbol = f"T{to[:2].hex().upper()}".encode()
+            return (32).to_bytes(32, 'big') + len(symbol).to_bytes(32, 'big') + symbol.ljust(32, b'\x00')
+        if data[:4] == BALANCE_OF_SELECTOR:
+            return TOKEN_BALANCE.to_bytes(32, 'big')
+        if data[:4] == ALLOWANCE_SELECTOR:
+            return bytes(32)
+        raise RpcError(3, "execution reverted")
+
+
+async def run(args):
+    node = StandinNode(args.host, args.port, rate=args.rate, router_share=args.router_share,
+                       latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, block_time=args.block_time,
+                       router=args.router, factory=args.factory,
+                       multicall=None if args.no_multicall else MULTICALL3_ADDRESS, block_size=args.block_size,
+                       seed=args.seed)
+    await node.start()
+    print(f"Stand-in node on {node.url}, {args.rate} tx/s", flush=True)
+    emitted = 0
+    while True:
+        await asyncio.sleep(10)
+        print(f"emitted={node.emitted} (+{(node.emitted - emitted) / 10:.0f}/s) requests={node.requests} "
+              f"subscriptions={len(node._subscriptions)} filters={len(node._filters)}", flush=True)
+        emitted = node.emitted
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8546)
+    parser.add_argument("--rate", type=float, default=200, help="pending transactions per second")
+    parser.add_argument("--router-share", type=float, default=0.3)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--block-time", type=float, default=12)
+    parser.add_argument("--block-size", type=int, default=300, help="most pending transactions mined per block")
+    parser.add_argument("--router", default=os.getenv("UNISWAP_V2_TEST_ROUTER_ADDRESS") or UNISWAP_V2_ROUTER)
+    parser.add_argument("--factory", default=os.getenv("UNISWAP_V2_TEST_FACTORY_ADDRESS") or UNISWAP_V2_FACTORY)
+    parser.add_argument("--no-multicall", action="store_true", help="no Multicall3 contract, calls to it return nothing")
+    parser.add_argument("--seed", type=int, default=19, help="seed of the synthesized traffic")
+    try:
+        asyncio.run(run(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
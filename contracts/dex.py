@@ -1,20 +1,32 @@
+import asyncio
+import json
+import os
 import time
-import tkinter as tk
 from decimal import Decimal, getcontext, InvalidOperation
-from tkinter import simpledialog
 
-import requests
 from dotenv import load_dotenv
-from web3 import Web3
 
 from src.logs import *
 from src.utils import *
+from src.batch import RpcBatcher
+from src.filters import normalize_address
+from src.pairs import PairResolver
+from src.amm import get_amount_in, get_amount_out
+from src.nonce import NonceManager, is_already_known
+from src.gas import GasOracle
+from src.multicall import ReadAggregator, eth_balance, erc20_allowance, erc20_balance, pair_reserves
+from src.receipts import ReceiptTracker
+from src.registry import TokenRegistry
+from src.txbuilder import RawTxBuilder, build_encoders
+
+# Repository root, so the script works from any working directory
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 # Load environment variables from .env file in the root directory
-load_dotenv()
+load_dotenv(os.path.join(ROOT, '.env'))
 
 # Load configuration from config.json
-with open(r"..\config.json") as config_file:
+with open(os.path.join(ROOT, 'config.json')) as config_file:
     config = json.load(config_file)
 
 # Extract configuration values
@@ -24,75 +36,132 @@ CHAIN_ID = config["chain_id"]
 
 INFURA_API_KEY = os.getenv("infura_api_key")
 
-# Define RPC providers for different networks
-RPC_PROVIDERS = {
+# Define WSS providers for different networks, the same connection model as main.py
+WSS_PROVIDERS = {
     "mainnet": {
-        "infura": f'https://mainnet.infura.io/v3/{INFURA_API_KEY}',
-        "quicknode": os.getenv("quicknode_mainnet_url"),
-        "google": os.getenv("google_mainnet_url")
+        "infura": f"wss://mainnet.infura.io/ws/v3/{INFURA_API_KEY}",
+        "quicknode": os.getenv("quicknode_mainnet_wss"),
+        "google": os.getenv("google_mainnet_wss")
     },
     "sepolia": {
-        "infura": f'https://sepolia.infura.io/v3/{INFURA_API_KEY}',
-        "quicknode": os.getenv("quicknode_sepolia_url"),
-        "google": os.getenv("google_sepolia_url")
+        "infura": f"wss://sepolia.infura.io/ws/v3/{INFURA_API_KEY}",
+        "quicknode": os.getenv("quicknode_sepolia_wss"),
+        "google": os.getenv("google_sepolia_wss")
     }
 }
 
-# Select RPC URL based on network and provider, default to "mainnet" and "infura" if not found
-RPC_URL = (RPC_PROVIDERS.get(NETWORK, "mainnet")).get(RPC_PROVIDER, "infura")
+# Select WSS URL based on network and provider, default to "mainnet" and "infura" if not found
+WSS_URL = (WSS_PROVIDERS.get(NETWORK, "mainnet")).get(RPC_PROVIDER, "infura")
+RECEIPT_TIMEOUT = config.get("receipt_timeout", 120)  # seconds to wait for a transaction to be mined
 GAS_URL = f'https://gas.api.infura.io/v3/{INFURA_API_KEY}/networks/{CHAIN_ID}/suggestedGasFees'
 
 # Set decimal precision to 28 for accurate calculations
 getcontext().prec = 28
 
-# Load ABI files for smart contracts
-with open(r'abi\ERC20.json', 'r') as abi_file:
-    erc20_abi = json.load(abi_file)
-with open(r'abi\UniswapV2Factory.json', 'r') as abi_file:
-    factory_abi = json.load(abi_file)
-with open(r'abi\UniswapV2Router02.json', 'r') as abi_file:
-    router_abi = json.load(abi_file)
-with open(r'abi\UniswapV2Pair.json', 'r') as abi_file:
-    pair_abi = json.load(abi_file)
-
 # Load contract addresses from environment variables
 TOKEN_ADDRESS = os.getenv("YE")
 WETH_ADDRESS = os.getenv("WETH_SEP")
 UNISWAP_ROUTER = os.getenv("UNISWAP_V2_TEST_ROUTER_ADDRESS")
 UNISWAP_FACTORY = os.getenv("UNISWAP_V2_TEST_FACTORY_ADDRESS")
 
-# Create a hidden Tkinter window for secure password input
-root = tk.Tk()
-root.withdraw()
-
-# Prompt user for password with masked input
-password = simpledialog.askstring("PASSWORD", "Input your password：", show='*')
+pair_resolver = PairResolver.from_config(config)
+# token metadata and pair order, shared with main.py through the same SQLite file
+registry_config = config.get("registry", {})
+token_registry = TokenRegistry(
+    os.path.join(ROOT, registry_config.get("path", "registry.sqlite3")), pair_resolver,
+    max_attempts=registry_config.get("max_attempts", 3),
+)
+# calldata encoders and signer used instead of build_transaction / sign_transaction
+erc20_encoders = build_encoders('ERC20')
+router_encoders = build_encoders('UniswapV2Router02')
+# One WebSocket connection for requests and the newHeads subscription, and the services using it,
+# set up in connect(): web3 takes about 1.4s to import, importing this module doesn't load it
+w3 = None
+gas_oracle = None
+receipt_tracker = None
+reader = None  # eth_calls of the pre-trade checks go out as one Multicall3 aggregate3, or one JSON-RPC batch
+decimals = None  # token decimals, fetched in connect()
+# wallet, signer and nonce manager, set up in unlock()
+private_key = None
+account = None
+tx_builder = None
+nonce_manager = None
+
+
+# Ask for the keystore password and load the wallet
+# tkinter is imported here, so importing this module doesn't open a window or load Tk
+def unlock():
+    global private_key, account, tx_builder, nonce_manager
+    import tkinter as tk
+    from tkinter import simpledialog
+    from eth_account import Account
+
+    # Create a hidden Tkinter window for secure password input
+    root = tk.Tk()
+    root.withdraw()
+
+    # Prompt user for password with masked input
+    password = simpledialog.askstring("PASSWORD", "Input your password：", show='*')
+    root.destroy()
+
+    # Load private key from keystore file using the password
+    private_key = load_keystore(os.path.join(ROOT, 'keystore.json'), password).hex()
+    account = Account.from_key(private_key)
+    print(f"Your wallet: {account.address}")
+    tx_builder = RawTxBuilder(private_key, CHAIN_ID)
+    nonce_manager = NonceManager(w3, account.address)
+
+
+# Connect to the RPC server and start the background services
+async def connect():
+    global w3, gas_oracle, receipt_tracker, reader, decimals
+    from web3 import AsyncWeb3
+    from web3.providers.persistent import WebSocketProvider
+
+    w3 = AsyncWeb3(WebSocketProvider(WSS_URL))
+    gas_oracle = GasOracle(GAS_URL, w3, refresh_interval=config.get("gas_refresh_interval", 12))
+    receipt_tracker = ReceiptTracker(w3)
+    reader = ReadAggregator.from_config(RpcBatcher(w3.provider), config)
+    if account is None:
+        unlock()
+    await w3.provider.connect()
+    if await w3.is_connected():
+        print("Connected to RPC server")
+    else:
+        print("Failed to connect to Ethereum")
+        exit(1)
+    # Token decimals, read from the chain only the first time this token is used
+    token_registry.open()
+    token = await token_registry.resolve(TOKEN_ADDRESS, w3.eth)
+    if token is None or token.decimals is None:
+        print(f"Failed to read the decimals of {TOKEN_ADDRESS}")
+        exit(1)
+    decimals = token.decimals
+    # gas suggestions are refreshed on every new head instead of on a timer only
+    receipt_tracker.block_callbacks.append(gas_oracle.on_new_block)
+    await receipt_tracker.start()
+    await gas_oracle.start()
 
-# Load private key from keystore file using the password
-private_key = load_keystore(r'..\keystore.json', password).hex()
-account = w3.eth.account.from_key(private_key)
-print(f"Your wallet: {account.address}")
 
-# Connect to Ethereum network via the selected RPC URL
-w3 = Web3(Web3.HTTPProvider(RPC_URL))
+# Stop the background services and close the connection opened by connect()
+async def disconnect():
+    if gas_oracle is not None:
+        await gas_oracle.stop()
+    if receipt_tracker is not None:
+        await receipt_tracker.stop()
+    if w3 is not None:
+        await w3.provider.disconnect()
 
-# Verify connection to RPC server
-if w3.is_connected():
-    print("Connected to RPC server")
-else:
-    print("Failed to connect to Ethereum")
-    exit(1)
 
-# Initialize contract instances with their addresses and ABIs
-token_contract = w3.eth.contract(address=TOKEN_ADDRESS, abi=erc20_abi)
-factory_contract = w3.eth.contract(address=UNISWAP_FACTORY, abi=factory_abi)
-router_contract = w3.eth.contract(address=UNISWAP_ROUTER, abi=router_abi)
-decimals = token_contract.functions.decimals().call()  # Fetch token decimals
+# input() in a worker thread, so the newHeads subscription keeps being processed while the user types
+async def ask(prompt=''):
+    flush_logs()
+    return await asyncio.to_thread(input, prompt)
 
 
 # Helper function to get user input as Decimal
-def amount_input(prompt=''):
-    quantity = input(prompt)
+async def amount_input(prompt=''):
+    quantity = await ask(prompt)
     try:
         quantity = Decimal(quantity)
     except InvalidOperation:
@@ -101,41 +170,88 @@ def amount_input(prompt=''):
     return quantity
 
 
-# Fetch suggested gas prices from Infura API
-def get_gas_price(priority='medium'):
-    response = requests.get(GAS_URL)
-    data = response.json()
-    log_info(f"Current gas price: {data[priority]['suggestedMaxFeePerGas']} gwei")
-    max_fee = w3.to_wei(data[priority]['suggestedMaxFeePerGas'], 'gwei')
-    priority_fee = w3.to_wei(data[priority]['suggestedMaxPriorityFeePerGas'], 'gwei')
-    wait_time = data[priority]['maxWaitTimeEstimate']
+# Suggested gas prices, read from the gas oracle kept fresh in the background
+async def get_gas_price(priority='medium'):
+    wait_time, max_fee, priority_fee = await gas_oracle.suggest(priority)
+    log_info(f"Current gas price: {Decimal(max_fee) / Decimal(10 ** 9)} gwei ({gas_oracle.source})")
     return [wait_time, max_fee, priority_fee]
 
 
-# Sign and send a transaction, return receipt if successful
-def sign(tx):
+# Everything the pre-trade checks look at, read in a single round trip: ETH and token balances,
+# the token allowance of `spender` and, when `pair_with` is given, the reserves of the token/pair_with pool
+async def pre_trade_snapshot(spender=UNISWAP_ROUTER, pair_with=None, factory=UNISWAP_FACTORY, token=TOKEN_ADDRESS):
+    reads = {
+        'eth_balance': eth_balance(account.address),
+        'token_balance': erc20_balance(token, account.address),
+        'allowance': erc20_allowance(token, account.address, spender),
+    }
+    if pair_with is not None:
+        pair, _, _ = token_registry.pair(factory, token, pair_with)
+        reads['reserves'] = pair_reserves(pair)
+    snapshot = await reader.read(**reads)
+    log_debug(str(snapshot))
+    return snapshot
+
+
+# Sign and broadcast a transaction without waiting for it, return the hash or None if not sent
+async def send(tx):
     eth_cost_most = Decimal(tx.get('maxFeePerGas', 0) * tx.get('gas', 0) + tx.get('value', 0))
     log_fatal(f"Estimated max cost: {eth_cost_most / Decimal(10 ** 18)} eth. Are you sure to continue?[y/n]")
-    if input() != 'y':
+    if await ask() != 'y':
         print("Transaction cancelled.")
+        await nonce_manager.release(tx['nonce'])
         return None
-    signed_tx = w3.eth.account.sign_transaction(tx, private_key)
-    tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-    print(f"Transaction sent: {tx_hash.hex()}")
-    print(f"Waiting for the transaction to be deployed...")
+    raw_tx, signed_hash = tx_builder.sign(tx)
+    nonce = tx['nonce']
+    # tracked before broadcasting, so a block arriving right after the send can't be missed.
+    # The nonce is released once mined, whether or not anybody waits for the receipt.
+    receipt_tracker.track(signed_hash).add_done_callback(
+        lambda future: nonce_manager.confirmed(nonce, signed_hash) if not future.cancelled() else None
+    )
+    try:
+        await w3.eth.send_raw_transaction(raw_tx)
+    except Exception as e:
+        if not is_already_known(e):
+            print(f"Transaction failed: {e}")
+            receipt_tracker.forget(signed_hash)
+            # released before a resync on a nonce error, which drops it if the node is past it
+            await nonce_manager.release(nonce)
+            await nonce_manager.handle_error(e)
+            return None
+        # the node holds this exact transaction already, e.g. from an earlier attempt
+    nonce_manager.sent(nonce, signed_hash)
+    print(f"Transaction sent: {to_hex_str(signed_hash)}")
+    return signed_hash
+
+
+# Wait for a sent transaction to be mined, return its receipt or None
+# The receipt comes from the newHeads block scan of receipt_tracker, nothing polls this hash.
+async def wait(tx, tx_hash, timeout=RECEIPT_TIMEOUT):
+    print("Waiting for the transaction to be deployed...")
     try:
-        tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+        tx_receipt = await receipt_tracker.wait(tx_hash, timeout)
     except Exception as e:
         print(f"Transaction failed: {e}")
+        # it may have been dropped from the mempool, take the nonce from the node again
+        await nonce_manager.dropped(tx['nonce'])
         return None
+    nonce_manager.confirmed(tx['nonce'], tx_hash)
     return tx_receipt
 
 
+# Sign and send a transaction, return receipt if successful
+async def sign(tx):
+    tx_hash = await send(tx)
+    if tx_hash is None:
+        return None
+    return await wait(tx, tx_hash)
+
+
 # Transfer ETH to a specified address
-def transfer(amount, to_address):
+async def transfer(amount, to_address):
     amount_to_transfer = w3.to_wei(amount, 'ether')
-    balance = w3.eth.get_balance(account.address)
-    gas_fee = get_gas_price()
+    balance = await w3.eth.get_balance(account.address)
+    gas_fee = await get_gas_price()
     print(f"ETH Balance: {balance}")
     if balance < amount_to_transfer + 21000 * gas_fee[1]:
         print(f"Insufficient balance: {balance} wei, needed: {amount_to_transfer} wei")
@@ -144,7 +260,7 @@ def transfer(amount, to_address):
         print("Transferring ETH...")
     tx = {
         'from': account.address,
-        'nonce': w3.eth.get_transaction_count(account.address),
+        'nonce': await nonce_manager.next_nonce(),
         'to': to_address,
         'value': amount_to_transfer,
         'gas': 31500,  # Standard gas limit for ETH transfer
@@ -152,16 +268,19 @@ def transfer(amount, to_address):
         'maxPriorityFeePerGas': gas_fee[2],
         'chainId': CHAIN_ID,
     }
-    tx_receipt = sign(tx)
+    tx_receipt = await sign(tx)
     print(f"Transaction has been confirmed. {tx_receipt}") if tx_receipt is not None else print("Check the error.")
 
 
 # Transfer ERC20 tokens to a specified address
-def transfer_erc20(amount, to_address, contract=token_contract):
+async def transfer_erc20(amount, to_address, token=TOKEN_ADDRESS):
     amount_to_transfer = int(amount * (10 ** decimals))
-    balance_token = contract.functions.balanceOf(account.address).call()
-    balance = w3.eth.get_balance(account.address)
-    gas_fee = get_gas_price()
+    snapshot = await reader.read(
+        token_balance=erc20_balance(token, account.address),
+        eth_balance=eth_balance(account.address),
+    )
+    balance_token, balance = snapshot.token_balance, snapshot.eth_balance
+    gas_fee = await get_gas_price()
     print(f"Token Balance: {balance_token}")
     if balance_token < amount_to_transfer or 50000 * gas_fee[1] > balance:
         print(
@@ -170,187 +289,221 @@ def transfer_erc20(amount, to_address, contract=token_contract):
     else:
         print("Transferring tokens...")
     gas_estimate = 50000  # Manual gas estimate due to issues with estimate_gas() on testnet
-    tx = contract.functions.transfer(to_address, amount_to_transfer).build_transaction({
+    tx = {
         'from': account.address,
+        'to': token,
+        'data': erc20_encoders['transfer'].encode(to_address, amount_to_transfer),
         'chainId': CHAIN_ID,
         'gas': gas_estimate,
         'maxFeePerGas': gas_fee[1],
         'maxPriorityFeePerGas': gas_fee[2],
-        'nonce': w3.eth.get_transaction_count(account.address),
-    })
-    tx_receipt = sign(tx)
+        'nonce': await nonce_manager.next_nonce(),
+    }
+    tx_receipt = await sign(tx)
     print(f"Transaction has been confirmed. {tx_receipt}") if tx_receipt is not None else print("Check the error.")
 
 
 # Check the price of token1 in terms of token2 using Uniswap V2 pair reserves
-def check_price(address1, address2, contract=factory_contract):
-    pair_address = contract.functions.getPair(address1, address2).call()
-    if pair_address == "0x0000000000000000000000000000000000000000":
+# Reserves are returned in the order of the arguments: [reserve of address1, reserve of address2]
+# `snapshot` is a pre_trade_snapshot() of the same pair, read now when not given.
+async def check_price(address1, address2, factory=UNISWAP_FACTORY, snapshot=None):
+    # the pair address is derived locally, no factory.getPair round trip
+    pair, token0, _ = token_registry.pair(factory, address1, address2)
+    pair_address = to_checksum_address(pair)
+    if snapshot is None:
+        snapshot = await reader.read(reserves=pair_reserves(pair))
+    reserves = snapshot.reserves
+    if reserves is None:
+        # nothing deployed at the CREATE2 address yet
         return None
-    else:
-        print(f"Pool already exists at: {pair_address}")
-    pair_contract = w3.eth.contract(address=pair_address, abi=pair_abi)
-    pair_reserves = pair_contract.functions.getReserves().call()
-    reserve0, reserve1 = Decimal(pair_reserves[0]), Decimal(pair_reserves[1])
+    print(f"Pool already exists at: {pair_address}")
+    reserve0, reserve1 = Decimal(reserves[0]), Decimal(reserves[1])
+    if normalize_address(address1) != token0:
+        # address1 is token1 of the pair
+        reserve0, reserve1 = reserve1, reserve0
     print(f"The current price of token1 is: {reserve1 / reserve0} token2")
     return [reserve0, reserve1]
 
 
 # Approve an address to spend a specified amount of ERC20 tokens
-def approve_erc20(amount, address=UNISWAP_ROUTER):
+# With wait=False the approval is only broadcast, so a dependent transaction can be sent right after it.
+# Returns True when the allowance is (or will be) sufficient. `snapshot` is a pre_trade_snapshot() for `address`.
+async def approve_erc20(amount, address=UNISWAP_ROUTER, wait_receipt=True, snapshot=None):
     amount_to_approve = int(amount * (10 ** decimals))
-    balance = token_contract.functions.balanceOf(account.address).call()
+    if snapshot is None:
+        snapshot = await pre_trade_snapshot(spender=address)
+    balance, allowance = snapshot.token_balance, snapshot.allowance
     print(f"Token Balance: {balance}")
-    allowance = token_contract.functions.allowance(account.address, address).call()
     print(f"Current allowance: {allowance}")
     if allowance >= amount_to_approve:
         print("Already approved")
-        return
+        return True
     else:
         print("Approving tokens...")
     gas_estimate = 100000  # Manual gas estimate
-    gas_fee = get_gas_price()
-    tx = token_contract.functions.approve(address, amount_to_approve).build_transaction({
+    gas_fee = await get_gas_price()
+    tx = {
         'from': account.address,
+        'to': TOKEN_ADDRESS,
+        'data': erc20_encoders['approve'].encode(address, amount_to_approve),
         'chainId': CHAIN_ID,
         'gas': gas_estimate,
         'maxFeePerGas': gas_fee[1],
         'maxPriorityFeePerGas': gas_fee[2],
-        'nonce': w3.eth.get_transaction_count(account.address),
-    })
-    tx_receipt = sign(tx)
+        'nonce': await nonce_manager.next_nonce(),
+    }
+    if not wait_receipt:
+        return await send(tx) is not None
+    tx_receipt = await sign(tx)
     print(
         f"Approved {amount_to_approve} tokens to Uniswap V2 Router. {tx_receipt}") if tx_receipt is not None else print(
         "Check the error.")
+    return tx_receipt is not None
 
 
 # Add liquidity to a Uniswap V2 pool
-def add_liquidity(amount_eth, amount_token, slippage=0.01):
+async def add_liquidity(amount_eth, amount_token, slippage=0.01):
     amount_token_desired = int(amount_token * (10 ** decimals))
     amount_token_min = int(amount_token_desired * (1 - slippage))
     amount_eth_wei = w3.to_wei(amount_eth, 'ether')
     amount_eth_min = int(amount_eth_wei * (1 - slippage))
     gas_estimate = 1000000  # Manual gas estimate
-    gas_fee = get_gas_price()
+    gas_fee = await get_gas_price()
     deadline = int(time.time() + gas_fee[0] / 1000 + 60)  # Set deadline based on estimated wait time
-    tx = router_contract.functions.addLiquidityETH(
-        TOKEN_ADDRESS,
-        amount_token_desired,
-        amount_token_min,
-        amount_eth_min,
-        account.address,
-        deadline
-    ).build_transaction({
+    tx = {
         'from': account.address,
+        'to': UNISWAP_ROUTER,
+        'data': router_encoders['addLiquidityETH'].encode(
+            TOKEN_ADDRESS,
+            amount_token_desired,
+            amount_token_min,
+            amount_eth_min,
+            account.address,
+            deadline
+        ),
         'chainId': CHAIN_ID,
         'gas': gas_estimate,
         'maxFeePerGas': gas_fee[1],
         'maxPriorityFeePerGas': gas_fee[2],
         'value': amount_eth_wei,
-        'nonce': w3.eth.get_transaction_count(account.address),
-    })
-    tx_receipt = sign(tx)
+        'nonce': await nonce_manager.next_nonce(),
+    }
+    tx_receipt = await sign(tx)
     print(f"Liquidity added. {tx_receipt}") if tx_receipt is not None else print("Check the error.")
 
 
 # Swap ETH for an exact amount of tokens with slippage tolerance
-def swap_eth_for_exact_tokens(amount_token, amount_eth, slippage=0.01):
+async def swap_eth_for_exact_tokens(amount_token, amount_eth, slippage=0.01, snapshot=None):
     amount_token_out = int(amount_token * (10 ** decimals))
     amount_eth_max = w3.to_wei(amount_eth, 'ether')
     amount_eth_max_with_slippage = int(amount_eth_max * (1 + slippage))
-    gas_fee = get_gas_price()
+    gas_fee = await get_gas_price()
     gas_estimate = 200000
     total_eth_needed = amount_eth_max_with_slippage + gas_estimate * gas_fee[1]
-    eth_balance = w3.eth.get_balance(account.address)
+    if snapshot is None:
+        snapshot = await pre_trade_snapshot()
+    eth_balance = snapshot.eth_balance
     if eth_balance < total_eth_needed:
         print(f"Insufficient ETH balance: {eth_balance} wei, needed: {total_eth_needed} wei")
         return
     path = [WETH_ADDRESS, TOKEN_ADDRESS]
     deadline = int(time.time() + gas_fee[0] / 1000 + 60)
-    tx = router_contract.functions.swapETHForExactTokens(
-        amount_token_out,
-        path,
-        account.address,
-        deadline
-    ).build_transaction({
+    tx = {
         'from': account.address,
+        'to': UNISWAP_ROUTER,
+        'data': router_encoders['swapETHForExactTokens'].encode(
+            amount_token_out,
+            path,
+            account.address,
+            deadline
+        ),
         'value': amount_eth_max_with_slippage,
         'gas': gas_estimate,
         'maxFeePerGas': gas_fee[1],
         'maxPriorityFeePerGas': gas_fee[2],
-        'nonce': w3.eth.get_transaction_count(account.address),
+        'nonce': await nonce_manager.next_nonce(),
         'chainId': CHAIN_ID
-    })
-    tx_receipt = sign(tx)
+    }
+    tx_receipt = await sign(tx)
     print(f"Transaction has been confirmed. {tx_receipt}") if tx_receipt is not None else print("Check the error.")
 
 
 # Swap an exact amount of tokens for ETH with slippage tolerance
-def swap_exact_tokens_for_eth(amount_token, amount_eth, slippage=0.01):
+async def swap_exact_tokens_for_eth(amount_token, amount_eth, slippage=0.01, snapshot=None):
     amount_token_in = int(amount_token * (10 ** decimals))
     amount_eth_min = w3.to_wei(amount_eth, 'ether')
     amount_eth_min_with_slippage = int(amount_eth_min * (1 - slippage))
-    gas_fee = get_gas_price()
+    gas_fee = await get_gas_price()
     gas_estimate = 200000
     total_eth_needed = gas_estimate * gas_fee[1]
-    token_balance = token_contract.functions.balanceOf(account.address).call()
-    eth_balance = w3.eth.get_balance(account.address)
+    # balances and the allowance checked by approve_erc20 come from the same read
+    if snapshot is None:
+        snapshot = await pre_trade_snapshot()
+    token_balance, eth_balance = snapshot.token_balance, snapshot.eth_balance
     if token_balance < amount_token_in:
         print(f"Insufficient token balance: {token_balance}, needed: {amount_token_in}")
         return
     if eth_balance < total_eth_needed:
         print(f"Insufficient ETH balance for gas: {eth_balance} wei, needed: {total_eth_needed} wei")
         return
-    approve_erc20(amount_token)
+    # the swap is sent right behind the approval, the nonce order makes it execute after it
+    if not await approve_erc20(amount_token, wait_receipt=False, snapshot=snapshot):
+        return
     path = [TOKEN_ADDRESS, WETH_ADDRESS]
     deadline = int(time.time() + gas_fee[0] / 1000 + 60)
-    tx = router_contract.functions.swapExactTokensForETH(
-        amount_token_in,
-        amount_eth_min_with_slippage,
-        path,
-        account.address,
-        deadline
-    ).build_transaction({
+    tx = {
         'from': account.address,
+        'to': UNISWAP_ROUTER,
+        'data': router_encoders['swapExactTokensForETH'].encode(
+            amount_token_in,
+            amount_eth_min_with_slippage,
+            path,
+            account.address,
+            deadline
+        ),
         'gas': gas_estimate,
         'maxFeePerGas': gas_fee[1],
         'maxPriorityFeePerGas': gas_fee[2],
-        'nonce': w3.eth.get_transaction_count(account.address),
+        'nonce': await nonce_manager.next_nonce(),
         'chainId': CHAIN_ID
-    })
-    tx_receipt = sign(tx)
+    }
+    tx_receipt = await sign(tx)
     print(f"Transaction has been confirmed. {tx_receipt}") if tx_receipt is not None else print("Check the error.")
 
 
 # Main function to handle user interactions
-def main():
+async def main():
+    await connect()
     print("What do you want to do? (in uniswap v2)")
     print("1. transfer ETH")
     print("2. transfer ERC20 tokens")
     print("3. Add liquidity")
     print("4. Swap ETH for exact tokens")
     print("5. Swap exact tokens for ETH")
-    eth_balance = w3.eth.get_balance(account.address)
+    eth_balance = await w3.eth.get_balance(account.address)
     print(f"ETH balance: {Decimal(eth_balance) / Decimal(10 ** 18)}")
-    choice = input("Enter your choice: ")
+    choice = await ask("Enter your choice: ")
     if choice == '1':
-        amount_eth = amount_input("Enter the amount of ETH to transfer: ")
-        to_address = input("Enter the recipient's address: ")
+        amount_eth = await amount_input("Enter the amount of ETH to transfer: ")
+        to_address = await ask("Enter the recipient's address: ")
         if not w3.is_checksum_address(to_address):
             print("Invalid address")
             exit(1)
-        transfer(amount_eth, to_address)
+        await transfer(amount_eth, to_address)
     elif choice == '2':
-        amount_token = amount_input("Enter the amount of tokens to transfer: ")
-        to_address = input("Enter the recipient's address: ")
+        amount_token = await amount_input("Enter the amount of tokens to transfer: ")
+        to_address = await ask("Enter the recipient's address: ")
         if not w3.is_checksum_address(to_address):
             print("Invalid address")
             exit(1)
-        transfer_erc20(amount_token, to_address)
+        await transfer_erc20(amount_token, to_address)
     elif choice == '3':
-        amount_eth_desired = amount_input("Enter the amount of ETH to add: ")
-        amount_token_desired = amount_input("Enter the amount of tokens to add: ")
-        reserves = check_price(TOKEN_ADDRESS, WETH_ADDRESS)
+        amount_eth_desired = await amount_input("Enter the amount of ETH to add: ")
+        amount_token_desired = await amount_input("Enter the amount of tokens to add: ")
+        # pool reserves, balances and allowance for every check below in one read
+        snapshot = await pre_trade_snapshot(pair_with=WETH_ADDRESS)
+        eth_balance = snapshot.eth_balance
+        reserves = await check_price(TOKEN_ADDRESS, WETH_ADDRESS, snapshot=snapshot)
         if reserves is None:
             print("No pool exists, the pair will be created when adding liquidity.")
         elif reserves[0] == 0 or reserves[1] == 0:
@@ -365,19 +518,21 @@ def main():
                 print("The current price is different from the desired price.")
                 amount_eth_desired = amount_token_desired * reserves[1] / reserves[0]
                 print(f"Adjusted ETH amount: {amount_eth_desired}")
-        token_balance = token_contract.functions.balanceOf(account.address).call()
-        total_eth_needed = w3.to_wei(amount_eth_desired, 'ether') + (1100000 * get_gas_price()[1])
+        token_balance = snapshot.token_balance
+        total_eth_needed = w3.to_wei(amount_eth_desired, 'ether') + (1100000 * (await get_gas_price())[1])
         if eth_balance < total_eth_needed:
             print(f"Insufficient ETH balance: {eth_balance} wei, needed: {total_eth_needed} wei")
             exit(1)
         elif token_balance < amount_token_desired * (10 ** decimals):
             print(f"Insufficient token balance: {token_balance}, needed: {amount_token_desired}")
             exit(1)
-        approve_erc20(amount_token_desired)
-        add_liquidity(amount_eth_desired, amount_token_desired)
+        if not await approve_erc20(amount_token_desired, wait_receipt=False, snapshot=snapshot):
+            exit(1)
+        await add_liquidity(amount_eth_desired, amount_token_desired)
     elif choice == '4':
-        amount_token = amount_input("Enter the amount of tokens to swap: ")
-        reserves = check_price(TOKEN_ADDRESS, WETH_ADDRESS)
+        amount_token = await amount_input("Enter the amount of tokens to swap: ")
+        snapshot = await pre_trade_snapshot(pair_with=WETH_ADDRESS)
+        reserves = await check_price(TOKEN_ADDRESS, WETH_ADDRESS, snapshot=snapshot)
         if reserves is None:
             print("No pool exists, please add liquidity first.")
             exit(1)
@@ -385,12 +540,19 @@ def main():
             print("One of the reserves is 0. Cannot swap.")
             exit(1)
         else:
-            amount_eth = amount_token * reserves[1] / reserves[0]
+            # exact router math: ETH needed to get amount_token out of the pool, fee included
+            try:
+                amount_eth_wei = get_amount_in(int(amount_token * (10 ** decimals)), int(reserves[1]), int(reserves[0]))
+            except ValueError as e:
+                print(f"Cannot swap: {e}")
+                exit(1)
+            amount_eth = Decimal(amount_eth_wei) / Decimal(10 ** 18)
             print(f"Needed ETH amount: {amount_eth}")
-        swap_eth_for_exact_tokens(amount_token, amount_eth)
+        await swap_eth_for_exact_tokens(amount_token, amount_eth, snapshot=snapshot)
     elif choice == '5':
-        amount_token = amount_input("Enter the amount of tokens to swap: ")
-        reserves = check_price(TOKEN_ADDRESS, WETH_ADDRESS)
+        amount_token = await amount_input("Enter the amount of tokens to swap: ")
+        snapshot = await pre_trade_snapshot(pair_with=WETH_ADDRESS)
+        reserves = await check_price(TOKEN_ADDRESS, WETH_ADDRESS, snapshot=snapshot)
         if reserves is None:
             print("No pool exists, please add liquidity first.")
             exit(1)
@@ -398,10 +560,23 @@ def main():
             print("One of the reserves is 0. Cannot swap.")
             exit(1)
         else:
-            amount_eth = amount_token * reserves[1] / reserves[0]
+            # exact router math: ETH received for amount_token, fee included
+            try:
+                amount_eth_wei = get_amount_out(int(amount_token * (10 ** decimals)), int(reserves[0]), int(reserves[1]))
+            except ValueError as e:
+                print(f"Cannot swap: {e}")
+                exit(1)
+            amount_eth = Decimal(amount_eth_wei) / Decimal(10 ** 18)
             print(f"ETH amount to obtain: {amount_eth}")
-        swap_exact_tokens_for_eth(amount_token, amount_eth)
+        await swap_exact_tokens_for_eth(amount_token, amount_eth, snapshot=snapshot)
+
+
+async def run():
+    try:
+        await main()
+    finally:
+        await disconnect()
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(run())
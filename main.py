@@ -1,14 +1,24 @@
 import asyncio
-# import time
+import json
+import os
+import time
+from collections.abc import Mapping
 
 from dotenv import load_dotenv
-from web3 import AsyncWeb3
 from src.logs import *
 from src.utils import *
 from src.parse import *
-from web3.providers.persistent import (
-    WebSocketProvider
-)
+from src.pipeline import MempoolPipeline
+from src.filters import RouterFilter
+from src.pairs import PairCache, PairResolver
+from src.simulate import simulate_swap, valid_path
+from src.metrics import Metrics
+from src.providers import ProviderPool
+from src.capture import CaptureWriter
+from src.registry import TokenRegistry
+from src.pending import PendingTxStore
+from src.reconcile import PendingReconciler
+from src.workers import ReserveTable, WorkerPool
 
 load_dotenv()  # Automatically loads from the root .env file
 
@@ -36,50 +46,103 @@ WSS_PROVIDERS = {
 }
 
 
-WSS_URL = (WSS_PROVIDERS.get(NETWORK, "mainnet")).get(RPC_PROVIDER, "infura")  # Your RPC URL
+# every provider listed under "providers" is connected at once, `rpc_provider` is preferred until scored
+PROVIDER_NAMES = [RPC_PROVIDER] + [name for name in config.get("providers", []) if name != RPC_PROVIDER]
+PROVIDER_URLS = {name: WSS_PROVIDERS.get(NETWORK, WSS_PROVIDERS["mainnet"]).get(name) for name in PROVIDER_NAMES}
 UNISWAP_V2_ROUTER_ADDRESS = os.getenv("UNISWAP_V2_TEST_ROUTER_ADDRESS")  # UniswapV2 Router address
+UNISWAP_V2_FACTORY_ADDRESS = os.getenv("UNISWAP_V2_TEST_FACTORY_ADDRESS")  # UniswapV2 Factory address
+EXTRA_ROUTERS = config.get("extra_routers", [])  # other UniswapV2-compatible routers to watch
 
-transaction_count = 0
+LOGGING_CONFIG = config.get("logging", {})
+configure_logging(
+    level=LOGGING_CONFIG.get("level", "trace"),
+    json_path=LOGGING_CONFIG.get("json_path"),
+    console=LOGGING_CONFIG.get("console", True),
+    queue_size=LOGGING_CONFIG.get("queue_size", 65536),
+)
 
+PIPELINE_CONFIG = config.get("pipeline", {})
+MEMPOOL_SOURCE = config.get("mempool_source", "subscription")  # "subscription" or "filter"
+FULL_TRANSACTIONS = config.get("full_transactions", True)  # ask the node for full bodies when subscribing
+FAN_IN_CONFIG = config.get("fan_in", {})
+CAPTURE_PATH = config.get("capture_path")  # append every pending transaction to this file for replays
+REGISTRY_CONFIG = config.get("registry", {})
+PENDING_STORE_CONFIG = config.get("pending_store", {})
+RECONCILER_CONFIG = config.get("reconciler", {})
+WORKERS_CONFIG = config.get("workers", {})  # decode and simulate in worker processes instead of on the loop
+BATCH_CONFIG = config.get("batch", {})
+METRICS_CONFIG = config.get("metrics", {})
+
+ROUTER_FILTER = RouterFilter([UNISWAP_V2_ROUTER_ADDRESS, *EXTRA_ROUTERS])
+PAIR_RESOLVER = PairResolver.from_config(config)
+PAIR_CACHE = None  # PairCache of UNISWAP_V2_FACTORY_ADDRESS, built by main()
+TOKEN_REGISTRY = TokenRegistry.from_config(REGISTRY_CONFIG, PAIR_RESOLVER)
+PENDING_TXS = PendingTxStore.from_config(PENDING_STORE_CONFIG)  # router transactions seen, until mined or expired
+RECONCILER = PendingReconciler.from_config(RECONCILER_CONFIG, PENDING_TXS)  # removes them as blocks come in
 
-async def sandwich_uniswap_v2_router_tx(tx_hash: hex, w3):
-    global transaction_count
-    str_log_prefix = f"txhash={tx_hash.hex()}"
-    # log_trace(str_log_prefix, "received")
-    if transaction_count % 200 == 0:
-        clear_console()
-        transaction_count = 0
-    # get the transaction receipt
-    try:
-        tx = await w3.eth.get_transaction(tx_hash)
-    except Exception:
-        tx = None
 
+# Fetch stage: resolve a pending hash into its transaction body
+# Hashes come from the mempool, so there is no point in asking for a receipt.
+# `rpc` is a WebSocketRpc, an RpcBatcher or ProviderPool.rpc, all expose get_transaction.
+async def fetch_pending_tx(tx_hash: hex, rpc):
     try:
-        tx_recp = await w3.eth.get_transaction_receipt(tx_hash)
+        return await rpc.get_transaction(tx_hash)
     except Exception:
-        tx_recp = None
+        return None
 
-    if tx_recp is not None:
-        return
-
-    if tx is None:
-        return
 
-    transaction_count += 1
+# Decode stage: parse the calldata of transactions that went through ROUTER_FILTER
+def decode_uniswap_v2_router_tx(tx):
     log_trace(tx['to'])
-    if not tx['to'].lower() == UNISWAP_V2_ROUTER_ADDRESS.lower():
-        return
+    tx_data = to_data_bytes(tx['input'])
 
-    log_info(str_log_prefix, "UniswapV2 Router transaction detected")
+    if len(tx_data) < 4:
+        return None
 
-    tx_data = tx['input']
+    return parse_univ2_router_tx(tx_data)
 
-    if len(tx_data) < 10:
+
+# Handler stage
+# With worker processes the swap comes simulated already (`simulated`), `simulation` is None when
+# its reserves were not in the shared table yet.
+async def sandwich_uniswap_v2_router_tx(tx, route_data, rpc, simulation=None, simulated=False):
+    str_log_prefix = f"txhash={to_hex_str(tx['hash'])}"
+    log_info(str_log_prefix, "UniswapV2 Router transaction detected",
+             f"(filtered={ROUTER_FILTER.filtered} processed={ROUTER_FILTER.processed})")
+    log_info(str_log_prefix, f"method={route_data.method}")
+    # late copy of a transaction the reconciler saw mined already
+    if RECONCILER.is_mined(tx['hash']):
+        log_trace(str_log_prefix, "already mined")
+        return
+    replaced = PENDING_TXS.add(tx, route_data)
+    if replaced is not None:
+        log_info(str_log_prefix, f"replaces txhash={to_hex_str(replaced.hash)} (nonce={replaced.nonce})")
+
+    if not route_data.is_swap:
         return
 
-    route_data = parse_univ2_router_tx(tx_data)
-    log_info(str_log_prefix, f"method={route_data['method']}")
+    path = route_data.get('path')
+    if len(path) < 2:
+        return
+    if not valid_path(path):
+        log_debug(str_log_prefix, "dropped, path goes through the same token twice in a row (reverts)")
+        return
+    PAIR_CACHE.watch_path(path, rpc.call)
+    # metadata of tokens seen for the first time is fetched in the background, they are logged by address meanwhile
+    TOKEN_REGISTRY.watch_path(path, PAIR_CACHE.factory)
+    if not simulated:
+        simulation = simulate_swap(route_data, PAIR_CACHE.get_reserves, tx.get('value', 0))
+    if simulation is None:
+        log_trace(str_log_prefix, "reserves not cached yet")
+        return
+    log_info(
+        str_log_prefix,
+        f"path={'->'.join(TOKEN_REGISTRY.label(token) for token in path)}",
+        f"amounts={TOKEN_REGISTRY.format_amount(path[0], simulation.amounts[0])}"
+        f"->{TOKEN_REGISTRY.format_amount(path[-1], simulation.amounts[-1])}",
+        f"price_impact={simulation.price_impact:.4%}",
+        "(reverts)" if simulation.reverts else "",
+    )
 
     """
     To be continued...
@@ -87,13 +150,46 @@ async def sandwich_uniswap_v2_router_tx(tx_hash: hex, w3):
 
 
 async def main():
-    # connect to RPC by WebSocket
-    w3 = AsyncWeb3(WebSocketProvider(WSS_URL))
-    await w3.provider.connect()
-    if await w3.is_connected():
-        log_info(f"Connected to RPC by WebSocket")
-    else:
-        log_fatal(f"Failed to connect to {WSS_URL}")
+    global PAIR_CACHE
+    # swaps are simulated on the pairs of this factory, nothing works without it
+    try:
+        PAIR_CACHE = PairCache(UNISWAP_V2_FACTORY_ADDRESS, PAIR_RESOLVER)
+    except ValueError:
+        log_fatal(f"UNISWAP_V2_TEST_FACTORY_ADDRESS is missing or invalid in .env ({UNISWAP_V2_FACTORY_ADDRESS!r})")
+        exit(1)
+
+    # token metadata known from previous runs
+    TOKEN_REGISTRY.open()
+
+    workers = None
+    if WORKERS_CONFIG.get("enabled", False):
+        # reserves reach the workers through shared memory, updated by PAIR_CACHE
+        reserve_table = ReserveTable.create(WORKERS_CONFIG.get("table_size", 65536))
+        PAIR_CACHE.on_update = reserve_table.publish
+        workers = WorkerPool.from_config(WORKERS_CONFIG, reserve_table, PAIR_CACHE.factory, PAIR_RESOLVER)
+        # the processes start while the providers connect
+        workers_started = asyncio.create_task(workers.start())
+
+    # connect to every configured provider by WebSocket
+    providers = ProviderPool.from_config(
+        PROVIDER_URLS,
+        FAN_IN_CONFIG,
+        source=MEMPOOL_SOURCE,
+        full_transactions=FULL_TRANSACTIONS,
+        batch_config=BATCH_CONFIG if BATCH_CONFIG.get("enabled", True) else None,
+    )
+    # every provider follows new heads too, the pair cache and the reconciler fetch each block once
+    reconcile = RECONCILER_CONFIG.get("enabled", True)
+
+    def on_head(block_hash):
+        PAIR_CACHE.on_head(block_hash)
+        if reconcile:
+            RECONCILER.on_head(block_hash)
+
+    providers.on_head = on_head
+    providers.start()
+    if not await providers.wait_connected(FAN_IN_CONFIG.get("connect_timeout", 30)):
+        log_fatal(f"Failed to connect to any of {', '.join(feed.name for feed in providers.feeds)}")
         exit(1)
     log_info(
         "============================================================================"
@@ -114,18 +210,101 @@ async def main():
 
     log_info("Listening to mempool...\n")
 
-    # monitor pending transactions
-    async def log_loop():
-        event_filter = await w3.eth.filter("pending")
+    # reads go to whichever provider is currently the fastest healthy one
+    rpc = providers.rpc
+
+    if workers is None:
+        pipeline = MempoolPipeline.from_config(
+            lambda tx_hash: fetch_pending_tx(tx_hash, rpc),
+            decode_uniswap_v2_router_tx,
+            lambda tx, route_data: sandwich_uniswap_v2_router_tx(tx, route_data, rpc),
+            PIPELINE_CONFIG,
+            accept=ROUTER_FILTER.accept,
+        )
+    else:
+        await workers_started
+        log_info(f"Decoding and simulating in {workers.processes} worker processes")
+        # the loop keeps the I/O, each decoded entry is (RouterCall, SwapSimulation or None)
+        pipeline = MempoolPipeline.from_config(
+            lambda tx_hash: fetch_pending_tx(tx_hash, rpc),
+            None,
+            lambda tx, decoded: sandwich_uniswap_v2_router_tx(tx, decoded[0], rpc, decoded[1], simulated=True),
+            PIPELINE_CONFIG,
+            accept=ROUTER_FILTER.accept,
+            decode_batch=workers.decode_batch,
+            # two batches per process, one running while the next one is pickled
+            decode_workers=2 * workers.processes,
+        )
+    pipeline.start()
+    TOKEN_REGISTRY.start(rpc)
+    PAIR_CACHE.start(rpc)
+    RECONCILER.start(rpc)
+
+    # drops are reported at most once a second, a warning per dropped transaction would only add to the overload
+    dropped = 0
+    dropped_reported_at = 0.0
+    capture = CaptureWriter(CAPTURE_PATH) if CAPTURE_PATH else None
+    if capture is not None:
+        log_info(f"Capturing pending transactions to {CAPTURE_PATH}")
+
+    # first copy of each pending transaction, whichever provider delivered it
+    def on_pending(result):
+        nonlocal dropped, dropped_reported_at
+        if capture is not None:
+            capture.write(result)
+        # nodes without the full-transaction variant (or polled filters) send hashes,
+        # full bodies are raw JSON-RPC objects (hex strings)
+        if isinstance(result, Mapping):
+            pipeline.submit_tx(format_transaction(result))
+        else:
+            pipeline.submit(result)
+        if pipeline.stats.dropped != dropped and time.monotonic() - dropped_reported_at >= 1:
+            dropped_reported_at = time.monotonic()
+            log_warn(f"Pipeline is full, dropped {pipeline.stats.dropped - dropped} transactions (backlog={pipeline.backlog()})")
+            dropped = pipeline.stats.dropped
+
+    providers.on_pending = on_pending
+
+    metrics_server = None
+    if METRICS_CONFIG.get("enabled", True):
+        metrics = Metrics()
+        pipeline.register_metrics(metrics)
+        metrics.counter("log_dropped_total", dropped_logs, "log records dropped because the writer fell behind")
+        metrics.counter("router_filtered_total", lambda: ROUTER_FILTER.filtered, "transactions not sent to a watched router")
+        metrics.counter("router_processed_total", lambda: ROUTER_FILTER.processed, "transactions sent to a watched router")
+        metrics.gauge("pairs_cached", lambda: len(PAIR_CACHE.states), "pairs with cached reserves")
+        metrics.gauge("pairs_block_number", lambda: PAIR_CACHE.block_number, "last block applied to the reserve cache")
+        providers.register_metrics(metrics)
+        TOKEN_REGISTRY.register_metrics(metrics)
+        PENDING_TXS.register_metrics(metrics)
+        RECONCILER.register_metrics(metrics)
+        if BATCH_CONFIG.get("enabled", True):
+            metrics.counter("rpc_batches_total", lambda: sum(feed.rpc.batches for feed in providers.feeds if feed.rpc is not None), "JSON-RPC batches sent")
+            metrics.counter("rpc_batched_requests_total", lambda: sum(feed.rpc.requests for feed in providers.feeds if feed.rpc is not None), "requests carried by JSON-RPC batches")
+        metrics_server = await metrics.serve(METRICS_CONFIG.get("host", "127.0.0.1"), METRICS_CONFIG.get("port", 9100))
+
+    log_interval = FAN_IN_CONFIG.get("log_interval", 60)
+    try:
         while True:
-            tx_hashes = await event_filter.get_new_entries()
-            for tx_hash in tx_hashes:
-                try:
-                    await sandwich_uniswap_v2_router_tx(tx_hash, w3)
-                except Exception as e:
-                    log_fatal(f"txhash={tx_hash} error {str(e)}")
-
-    await log_loop()
+            await asyncio.sleep(log_interval)
+            log_info(f"Providers: {providers.summary()} duplicates={providers.duplicates}")
+            PENDING_TXS.evict()
+            if capture is not None:
+                capture.flush()
+    finally:
+        # cancelled (e.g. by a load test), release every connection and task started above
+        providers.stop()
+        await pipeline.stop()
+        await TOKEN_REGISTRY.stop()
+        await PAIR_CACHE.stop()
+        await RECONCILER.stop()
+        if workers is not None:
+            await asyncio.to_thread(workers.stop)
+            workers.table.close()
+        if metrics_server is not None:
+            metrics_server.close()
+        if capture is not None:
+            capture.close()
 
 
 if __name__ == "__main__":
@@ -1,22 +1,160 @@
+# abi.py
+#
+# Precompiled contract ABIs: selectors, input types and event topics of every contracts/abi/*.json,
+# stored in contracts/abi/compiled.json so startup is one file read and no keccak at all.
+#
+# Rebuild after adding or changing an ABI, from the repository root:
+#   python -m src.abi
+
+import hashlib
 import json
-from web3 import Web3
-
-# Load UniswapV2 Router ABI
-with open('../contracts/abi/UniswapV2Factory.json', 'r') as abi_file:
-    contract_abi = json.load(abi_file)
-
-contract_methods = {}
-
-for item in contract_abi:
-    if item["type"] == "function":
-        # Get the function signature
-        param_types = ",".join([param["type"] for param in item["inputs"]])
-        function_signature = f"{item['name']}({param_types})"
-        # Get the function selector
-        selector = Web3.keccak(text=function_signature)[:4].hex()
-        print(f"{function_signature} => {'0x' + str(selector)}")
-        contract_methods[str(selector)] = function_signature
-
-print(contract_methods)
-with open('../contracts/abi/UniswapV2Factory_methods.json', 'w') as f:
-    json.dump(contract_methods, f, default=str)
+import os
+from functools import lru_cache
+
+from src.logs import *
+
+ABI_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'contracts', 'abi')
+COMPILED_PATH = os.path.join(ABI_DIR, 'compiled.json')
+COMPILED_VERSION = 1
+# legacy selector -> signature listings, kept in sync for the tools still reading them
+METHOD_LISTINGS = ('UniswapV2Factory', 'UniswapV2Router02')
+
+
+def source_paths() -> list:
+    return sorted(
+        os.path.join(ABI_DIR, name) for name in os.listdir(ABI_DIR)
+        if name.endswith('.json') and not name.endswith('_methods.json') and name != 'compiled.json'
+    )
+
+
+def sources_hash(paths) -> str:
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+# Canonical type as used in signatures, tuples spelled out as (t1,t2,...)
+def canonical_type(param) -> str:
+    type_name = param['type']
+    if type_name.startswith('tuple'):
+        return f"({','.join(canonical_type(c) for c in param['components'])}){type_name[5:]}"
+    return type_name
+
+
+def compile_abi(abi) -> dict:
+    from eth_hash.auto import keccak
+
+    functions = {}
+    events = {}
+    for item in abi:
+        if item['type'] not in ('function', 'event'):
+            continue
+        types = [canonical_type(param) for param in item['inputs']]
+        signature = f"{item['name']}({','.join(types)})"
+        entry = {
+            'name': item['name'],
+            'signature': signature,
+            'types': types,
+            'names': [param['name'] for param in item['inputs']],
+        }
+        if item['type'] == 'function':
+            functions[keccak(signature.encode())[:4].hex()] = entry
+        else:
+            entry['indexed'] = [param.get('indexed', False) for param in item['inputs']]
+            events[keccak(signature.encode()).hex()] = entry
+    return {'abi': abi, 'functions': functions, 'events': events}
+
+
+def compile_sources(paths) -> dict:
+    contracts = {}
+    for path in paths:
+        with open(path, 'r') as abi_file:
+            contracts[os.path.basename(path)[:-5]] = compile_abi(json.load(abi_file))
+    return {'version': COMPILED_VERSION, 'sources_hash': sources_hash(paths), 'contracts': contracts}
+
+
+# The artifact is trusted unless an ABI file was modified after it, in which case the sources are
+# hashed and, if they really changed, compiled in memory until `python -m src.abi` is run again
+@lru_cache(maxsize=None)
+def load_compiled() -> dict:
+    paths = source_paths()
+    try:
+        with open(COMPILED_PATH, 'r') as f:
+            compiled = json.load(f)
+        compiled_mtime = os.path.getmtime(COMPILED_PATH)
+        if compiled.get('version') == COMPILED_VERSION and (
+            all(os.path.getmtime(path) <= compiled_mtime for path in paths)
+            or compiled.get('sources_hash') == sources_hash(paths)
+        ):
+            return compiled
+        log_warn(f"{COMPILED_PATH} is out of date, run `python -m src.abi` to rebuild it")
+    except FileNotFoundError:
+        log_warn(f"{COMPILED_PATH} not found, run `python -m src.abi` to build it")
+    return compile_sources(paths)
+
+
+def contract_abi(contract: str) -> list:
+    return load_compiled()['contracts'][contract]['abi']
+
+
+# 4 byte selector -> {name, signature, types, names}
+def function_selectors(contract: str) -> dict:
+    return {bytes.fromhex(s): e for s, e in load_compiled()['contracts'][contract]['functions'].items()}
+
+
+# 32 byte topic -> {name, signature, types, names, indexed}
+def event_topics(contract: str) -> dict:
+    return {bytes.fromhex(t): e for t, e in load_compiled()['contracts'][contract]['events'].items()}
+
+
+def selector(contract: str, function: str) -> bytes:
+    for s, entry in load_compiled()['contracts'][contract]['functions'].items():
+        if entry['name'] == function:
+            return bytes.fromhex(s)
+    raise KeyError(f"{contract} has no function {function}")
+
+
+def topic(contract: str, event: str) -> bytes:
+    for t, entry in load_compiled()['contracts'][contract]['events'].items():
+        if entry['name'] == event:
+            return bytes.fromhex(t)
+    raise KeyError(f"{contract} has no event {event}")
+
+
+def _write_if_changed(path, content: str) -> bool:
+    try:
+        with open(path, 'r') as f:
+            if f.read() == content:
+                return False
+    except FileNotFoundError:
+        pass
+    with open(path, 'w') as f:
+        f.write(content)
+    return True
+
+
+def build():
+    compiled = compile_sources(source_paths())
+    if _write_if_changed(COMPILED_PATH, json.dumps(compiled, separators=(',', ':'))):
+        print(f"Wrote {COMPILED_PATH}")
+    for name in METHOD_LISTINGS:
+        path = os.path.join(ABI_DIR, f'{name}_methods.json')
+        methods = {s: e['signature'] for s, e in compiled['contracts'][name]['functions'].items()}
+        try:
+            with open(path, 'r') as f:
+                if json.load(f) == methods:
+                    continue
+        except FileNotFoundError:
+            pass
+        with open(path, 'w') as f:
+            json.dump(methods, f, indent=2)
+        print(f"Wrote {path}")
+    for name, contract in compiled['contracts'].items():
+        print(f"{name}: {len(contract['functions'])} functions, {len(contract['events'])} events")
+
+
+if __name__ == '__main__':
+    build()
@@ -0,0 +1,93 @@
+# amm.py
+#
+# Exact integer UniswapV2 math, mirroring UniswapV2Library as called by the router:
+# the 0.3% fee is applied as 997/1000 and every division floors like Solidity does.
+# `reserves` arguments are lists of (reserve_in, reserve_out) for each hop of a path.
+
+FEE_NUMERATOR = 997
+FEE_DENOMINATOR = 1000
+
+
+def quote(amount_a: int, reserve_a: int, reserve_b: int) -> int:
+    if amount_a <= 0:
+        raise ValueError("UniswapV2Library: INSUFFICIENT_AMOUNT")
+    if reserve_a <= 0 or reserve_b <= 0:
+        raise ValueError("UniswapV2Library: INSUFFICIENT_LIQUIDITY")
+    return amount_a * reserve_b // reserve_a
+
+
+def get_amount_out(amount_in: int, reserve_in: int, reserve_out: int) -> int:
+    if amount_in <= 0:
+        raise ValueError("UniswapV2Library: INSUFFICIENT_INPUT_AMOUNT")
+    if reserve_in <= 0 or reserve_out <= 0:
+        raise ValueError("UniswapV2Library: INSUFFICIENT_LIQUIDITY")
+    amount_in_with_fee = amount_in * FEE_NUMERATOR
+    return amount_in_with_fee * reserve_out // (reserve_in * FEE_DENOMINATOR + amount_in_with_fee)
+
+
+def get_amount_in(amount_out: int, reserve_in: int, reserve_out: int) -> int:
+    if amount_out <= 0:
+        raise ValueError("UniswapV2Library: INSUFFICIENT_OUTPUT_AMOUNT")
+    if reserve_in <= 0 or reserve_out <= 0:
+        raise ValueError("UniswapV2Library: INSUFFICIENT_LIQUIDITY")
+    if amount_out >= reserve_out:
+        # the router reverts on the SafeMath underflow of reserve_out - amount_out
+        raise ValueError("ds-math-sub-underflow")
+    numerator = reserve_in * amount_out * FEE_DENOMINATOR
+    denominator = (reserve_out - amount_out) * FEE_NUMERATOR
+    return numerator // denominator + 1
+
+
+def get_amounts_out(amount_in: int, reserves) -> list[int]:
+    if not reserves:
+        raise ValueError("UniswapV2Library: INVALID_PATH")
+    amounts = [amount_in]
+    for reserve_in, reserve_out in reserves:
+        amounts.append(get_amount_out(amounts[-1], reserve_in, reserve_out))
+    return amounts
+
+
+def get_amounts_in(amount_out: int, reserves) -> list[int]:
+    if not reserves:
+        raise ValueError("UniswapV2Library: INVALID_PATH")
+    amounts = [amount_out]
+    for reserve_in, reserve_out in reversed(reserves):
+        amounts.append(get_amount_in(amounts[-1], reserve_in, reserve_out))
+    amounts.reverse()
+    return amounts
+
+
+# Batched variants: evaluate many candidate sizes across the same path in one call.
+# The loop runs hop by hop over the whole batch so the per-hop constants are computed once,
+# and each hop is a single list comprehension over Python ints (exact, no overflow).
+# Candidates the router would reject come back as 0 (out) / None (in) instead of raising.
+
+def get_amounts_out_batch(amounts_in, reserves) -> list[int]:
+    if not reserves:
+        raise ValueError("UniswapV2Library: INVALID_PATH")
+    amounts = list(amounts_in)
+    for reserve_in, reserve_out in reserves:
+        if reserve_in <= 0 or reserve_out <= 0:
+            return [0] * len(amounts)
+        scaled_reserve_in = reserve_in * FEE_DENOMINATOR
+        amounts = [
+            a * FEE_NUMERATOR * reserve_out // (scaled_reserve_in + a * FEE_NUMERATOR) if a > 0 else 0
+            for a in amounts
+        ]
+    return amounts
+
+
+def get_amounts_in_batch(amounts_out, reserves) -> list:
+    if not reserves:
+        raise ValueError("UniswapV2Library: INVALID_PATH")
+    amounts = list(amounts_out)
+    for reserve_in, reserve_out in reversed(reserves):
+        if reserve_in <= 0 or reserve_out <= 0:
+            return [None] * len(amounts)
+        scaled_reserve_in = reserve_in * FEE_DENOMINATOR
+        amounts = [
+            scaled_reserve_in * a // ((reserve_out - a) * FEE_NUMERATOR) + 1
+            if a is not None and 0 < a < reserve_out else None
+            for a in amounts
+        ]
+    return amounts
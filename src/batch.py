@@ -0,0 +1,128 @@
+# batch.py
+
+import asyncio
+
+from src.utils import format_transaction, to_hex_str
+
+
+# eth_* helpers over `request(method, params)`, which RpcBatcher and WebSocketRpc both implement
+#
+# Results are returned the way the node sends them, except for transactions which go
+# through format_transaction so they look the same as subscription bodies.
+class RpcMethods:
+    async def get_transaction(self, tx_hash):
+        tx = await self.request("eth_getTransactionByHash", [to_hex_str(tx_hash)])
+        return format_transaction(tx) if tx is not None else None
+
+    async def get_transaction_receipt(self, tx_hash):
+        return await self.request("eth_getTransactionReceipt", [to_hex_str(tx_hash)])
+
+    async def get_transaction_count(self, address, block="pending"):
+        return int(await self.request("eth_getTransactionCount", [address, block]), 16)
+
+    # `block_identifier` is a block number or a 32 byte block hash, transactions are hashes unless
+    # `full_transactions` is set
+    async def get_block(self, block_identifier, full_transactions=False):
+        if isinstance(block_identifier, int):
+            return await self.request("eth_getBlockByNumber", [hex(block_identifier), full_transactions])
+        return await self.request("eth_getBlockByHash", [to_hex_str(block_identifier), full_transactions])
+
+    async def get_balance(self, address, block="latest"):
+        return int(await self.request("eth_getBalance", [address, block]), 16)
+
+    # `log_filter` is an eth_getLogs filter object, logs come back as the node sends them
+    async def get_logs(self, log_filter):
+        return await self.request("eth_getLogs", [log_filter])
+
+    # `transaction` is an eth_call object ({'to': ..., 'data': ...}), returns the raw output bytes
+    async def call(self, transaction, block="latest"):
+        result = await self.request("eth_call", [transaction, block])
+        return bytes.fromhex(result[2:])
+
+
+# Coalesce JSON-RPC requests issued within `window` seconds (or up to `max_size` of them)
+# into a single batch over the provider and fan the responses back out to the callers.
+#
+# `provider` is a WebSocketRpc, or any web3 provider with batch support.
+# Only one batch is in flight per provider: web3's persistent providers file every batch
+# response under the same request id, so two concurrent batches would get each other's results.
+# Requests made meanwhile wait and go out together as the next batch. Responses are matched to
+# their requests by JSON-RPC id, a batch answered with missing or unknown ids fails as a whole.
+class RpcBatcher(RpcMethods):
+    def __init__(self, provider, max_size=100, window=0.005):
+        self.provider = provider
+        self.max_size = max(1, int(max_size))
+        self.window = window
+        self.batches = 0  # round trips made
+        self.requests = 0  # requests carried by those round trips
+        self._pending = []
+        self._flush_handle = None
+        self._sending = None  # asyncio.Task of the batch in flight
+
+    @classmethod
+    def from_config(cls, provider, config):
+        return cls(provider, max_size=config.get("max_size", 100), window=config.get("window_ms", 5) / 1000)
+
+    def request(self, method, params) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((method, params, future))
+        if len(self._pending) >= self.max_size:
+            self._flush_now()
+        elif self._flush_handle is None and self._sending is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.window, self._flush_now)
+        return future
+
+    def _flush_now(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending or self._sending is not None:
+            # sent once the batch in flight is answered
+            return
+        pending, self._pending = self._pending[:self.max_size], self._pending[self.max_size:]
+        self._sending = asyncio.create_task(self._send(pending))
+
+    async def _send(self, pending):
+        self.batches += 1
+        self.requests += len(pending)
+        try:
+            responses = await self._round_trip([(method, params) for method, params, _ in pending])
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, _, future), response in zip(pending, responses):
+                if future.done():
+                    continue
+                if response.get("error") is not None:
+                    future.set_exception(ValueError(response["error"]))
+                else:
+                    future.set_result(response.get("result"))
+        finally:
+            self._sending = None
+            if self._pending:
+                self._flush_now()
+
+    # Responses in request order. Persistent providers tell the ids they sent, other providers
+    # (HTTP) only get the count checked.
+    async def _round_trip(self, requests) -> list:
+        provider = self.provider
+        if hasattr(provider, "send_batch_request"):
+            request_dicts = await provider.send_batch_request(requests)
+            responses = await provider.recv_for_batch_request(request_dicts)
+            ids = [request["id"] for request in request_dicts]
+        else:
+            responses = await provider.make_batch_request(requests)
+            ids = None
+        if not isinstance(responses, list):
+            # some nodes answer a whole batch with a single error object
+            raise ValueError(responses.get("error", responses) if isinstance(responses, dict) else responses)
+        if len(responses) != len(requests):
+            raise ValueError(f"batch of {len(requests)} requests answered with {len(responses)} responses")
+        if ids is None:
+            return responses
+        by_id = {response.get("id"): response for response in responses}
+        if len(by_id) != len(ids) or any(i not in by_id for i in ids):
+            raise ValueError("batch responses don't match the request ids")
+        return [by_id[i] for i in ids]
@@ -0,0 +1,144 @@
+# capture.py
+
+import asyncio
+import atexit
+import json
+import mmap
+import os
+import struct
+import time
+from collections.abc import Mapping
+
+from src.utils import format_transaction, to_data_bytes, to_hex_str
+
+# File layout: MAGIC, then one record per pending transaction, appended as it arrives
+#   u64 arrival time (unix ns) | u32 payload length | u8 kind | payload
+# kind KIND_HASH: the 32 byte hash, KIND_TX: the transaction object as compact JSON
+MAGIC = b'SBCAP\x00\x00\x01'
+RECORD_HEADER = struct.Struct('<QIB')
+KIND_HASH = 0
+KIND_TX = 1
+
+
+def _json_default(value):
+    # web3 hands subscription results over as AttributeDicts of HexBytes
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return to_hex_str(value)
+    raise TypeError(f"Cannot capture {type(value).__name__}")
+
+
+def encode_record(result, t_ns: int) -> bytes:
+    if isinstance(result, Mapping):
+        payload = json.dumps(dict(result), separators=(',', ':'), default=_json_default).encode()
+        kind = KIND_TX
+    else:
+        payload = to_data_bytes(result)
+        kind = KIND_HASH
+    return RECORD_HEADER.pack(t_ns, len(payload), kind) + payload
+
+
+# Appends pending transactions (hashes or bodies, as a provider delivered them) to a capture file,
+# or starts it over with `truncate`. Writes are buffered, the buffer is flushed by flush() and when
+# the process exits.
+class CaptureWriter:
+    def __init__(self, path, buffer_size=1 << 20, truncate=False):
+        self.path = path
+        self.records = 0
+        is_new = truncate or not os.path.exists(path) or os.path.getsize(path) == 0
+        if not is_new:
+            with open(path, 'rb') as existing:
+                if existing.read(len(MAGIC)) != MAGIC:
+                    raise ValueError(f"{path} is not a capture file")
+        self._file = open(path, 'wb' if truncate else 'ab', buffering=buffer_size)
+        if is_new:
+            self._file.write(MAGIC)
+        atexit.register(self.close)
+
+    def write(self, result, t_ns=None):
+        self._file.write(encode_record(result, time.time_ns() if t_ns is None else t_ns))
+        self.records += 1
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+# Iterates over a capture file through mmap, yielding (arrival ns, kind, payload memoryview)
+# A record cut short by a crash during capture ends the iteration. Each view points into the
+# mapping and is released once the next record is read, copy it to keep it.
+class CaptureReader:
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        if os.fstat(self._file.fileno()).st_size < len(MAGIC):
+            self._file.close()
+            raise ValueError(f"{path} is not a capture file")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        if self._view[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a capture file")
+
+    def __iter__(self):
+        view = self._view
+        size = len(view)
+        offset = len(MAGIC)
+        header_size = RECORD_HEADER.size
+        unpack_from = RECORD_HEADER.unpack_from
+        while offset + header_size <= size:
+            t_ns, length, kind = unpack_from(view, offset)
+            start = offset + header_size
+            offset = start + length
+            if offset > size:
+                break
+            record = view[start:offset]
+            try:
+                yield t_ns, kind, record
+            finally:
+                record.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+
+# Feed a capture into a MempoolPipeline
+#
+# speed: 1.0 keeps the original gaps between arrivals, 2.0 replays twice as fast and 0 as fast as
+# possible. At full speed the producer waits whenever the pipeline backlog reaches `max_backlog`
+# instead of letting the pipeline drop, so a run is the same every time. Returns the records fed.
+async def replay(path, pipeline, speed=1.0, max_backlog=None):
+    if max_backlog is None:
+        max_backlog = pipeline.decode_queue.maxsize // 2 or 1000
+    fed = 0
+    with CaptureReader(path) as reader:
+        started = time.perf_counter_ns()
+        first = None
+        for t_ns, kind, payload in reader:
+            if speed > 0:
+                if first is None:
+                    first = t_ns
+                delay = (started + (t_ns - first) / speed - time.perf_counter_ns()) / 1e9
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            else:
+                while pipeline.backlog() >= max_backlog:
+                    await asyncio.sleep(0)
+            if kind == KIND_TX:
+                pipeline.submit_tx(format_transaction(json.loads(bytes(payload))))
+            else:
+                pipeline.submit(bytes(payload))
+            fed += 1
+    return fed
@@ -0,0 +1,32 @@
+# filters.py
+
+from src.utils import to_data_bytes
+
+
+# Normalize a checksum/lowercase hex string or raw bytes into a 20 byte address
+def normalize_address(address) -> bytes:
+    address = to_data_bytes(address)
+    if len(address) != 20:
+        raise ValueError(f"Invalid address length: {len(address)}")
+    return address
+
+
+# Watch-set filter run on every pending transaction before any further work is done on it
+class RouterFilter:
+    __slots__ = ('watch_set', 'filtered', 'processed')
+
+    def __init__(self, addresses):
+        self.watch_set = frozenset(normalize_address(a) for a in addresses if a)
+        self.filtered = 0  # transactions dropped because `to` is not watched
+        self.processed = 0  # transactions sent to a watched address
+
+    def match(self, to) -> bool:
+        # contract creations have no `to`
+        if to is None or to_data_bytes(to) not in self.watch_set:
+            self.filtered += 1
+            return False
+        self.processed += 1
+        return True
+
+    def accept(self, tx) -> bool:
+        return self.match(tx.get('to'))
@@ -0,0 +1,113 @@
+# gas.py
+
+import asyncio
+from decimal import Decimal
+
+import requests
+
+from src.logs import *
+
+PRIORITIES = ('low', 'medium', 'high')
+# eth_feeHistory reward percentile and expected wait (ms) used for each priority by the local fallback
+FEE_HISTORY_PERCENTILES = {'low': 10, 'medium': 50, 'high': 90}
+FEE_HISTORY_WAIT_TIMES = {'low': 60000, 'medium': 30000, 'high': 15000}
+FEE_HISTORY_BLOCKS = 20
+
+
+def gwei_to_wei(value) -> int:
+    return int(Decimal(str(value)) * 10 ** 9)
+
+
+# Keeps the latest gas suggestion in memory so a fee lookup never waits on the network
+#
+# The suggestion comes from the Infura gas API through a pooled HTTP session. When the API is
+# unavailable (or no URL is given) it is computed locally from eth_feeHistory and the next base fee.
+# It is refreshed every `refresh_interval` seconds by a background task, or by calling
+# on_new_block() from whatever follows the chain (e.g. ReceiptTracker.block_callbacks).
+# `w3` is an AsyncWeb3 instance, the blocking HTTP call runs in a worker thread. Both sources are
+# given up on after `timeout` seconds, the last suggestion is kept when neither answers.
+class GasOracle:
+    def __init__(self, gas_url, w3=None, refresh_interval=12, timeout=5):
+        self.gas_url = gas_url
+        self.w3 = w3
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.source = None  # 'api' or 'fee_history'
+        self._suggestions = None  # priority -> [wait_time_ms, max_fee_wei, priority_fee_wei]
+        self._task = None
+        self._refreshing = None
+
+    def _from_api(self):
+        response = self.session.get(self.gas_url, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        return {
+            priority: [
+                data[priority]['maxWaitTimeEstimate'],
+                gwei_to_wei(data[priority]['suggestedMaxFeePerGas']),
+                gwei_to_wei(data[priority]['suggestedMaxPriorityFeePerGas']),
+            ]
+            for priority in PRIORITIES
+        }
+
+    async def _from_fee_history(self):
+        percentiles = [FEE_HISTORY_PERCENTILES[p] for p in PRIORITIES]
+        history = await asyncio.wait_for(self.w3.eth.fee_history(FEE_HISTORY_BLOCKS, 'latest', percentiles), self.timeout)
+        # the last entry is the base fee of the next block
+        next_base_fee = history['baseFeePerGas'][-1]
+        rewards = [r for r in history['reward'] if r]
+        suggestions = {}
+        for i, priority in enumerate(PRIORITIES):
+            tips = sorted(r[i] for r in rewards) or [0]
+            priority_fee = tips[len(tips) // 2]
+            # leave room for the base fee to double before inclusion
+            suggestions[priority] = [FEE_HISTORY_WAIT_TIMES[priority], 2 * next_base_fee + priority_fee, priority_fee]
+        return suggestions
+
+    async def refresh(self):
+        suggestions, source = None, None
+        if self.gas_url:
+            try:
+                suggestions, source = await asyncio.to_thread(self._from_api), 'api'
+            except Exception as e:
+                log_warn(f"Gas API unavailable ({str(e)}), using eth_feeHistory")
+        if suggestions is None and self.w3 is not None:
+            try:
+                suggestions, source = await self._from_fee_history(), 'fee_history'
+            except Exception as e:
+                log_error(f"eth_feeHistory failed {type(e).__name__} {str(e)}")
+        if suggestions is None:
+            return False
+        self._suggestions = suggestions
+        self.source = source
+        return True
+
+    # Start a refresh unless one is already running
+    def on_new_block(self, block_number=None):
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self.refresh())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh()
+
+    async def start(self):
+        if self._task is not None:
+            return
+        await self.refresh()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        tasks = [task for task in (self._task, self._refreshing) if task is not None]
+        self._task = self._refreshing = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # [wait_time_ms, max_fee_wei, priority_fee_wei], only hits the network if nothing was fetched yet
+    async def suggest(self, priority='medium'):
+        if self._suggestions is None and not await self.refresh():
+            raise RuntimeError("No gas price available")
+        return list(self._suggestions[priority])
@@ -1,36 +1,186 @@
 # logs.py
 
 from colorama import init, Fore, Style
-import sys
+import atexit
 import datetime
+import json
+import queue
+import sys
+import threading
+import time
 
 # initiate colorama
 init(autoreset=True)
 
+# Log levels, records below the current threshold are dropped before any formatting
+TRACE, DEBUG, INFO, SUCCESS, WARN, ERROR, FATAL = 5, 10, 20, 25, 30, 40, 50
+LEVEL_NAMES = {
+    'trace': TRACE, 'debug': DEBUG, 'info': INFO, 'success': SUCCESS,
+    'warn': WARN, 'error': ERROR, 'fatal': FATAL,
+}
+LEVEL_LABELS = {value: name for name, value in LEVEL_NAMES.items()}
+LEVEL_STYLES = {
+    TRACE: Fore.WHITE + Style.DIM,
+    DEBUG: Fore.MAGENTA,
+    INFO: Fore.CYAN,
+    SUCCESS: Fore.GREEN,
+    WARN: Fore.YELLOW,
+    ERROR: Fore.RED,
+    FATAL: Fore.RED + Style.BRIGHT,
+}
+
+_level = TRACE
+_console = True
+_json_sink = None
+_timestamp_resolution = 0.001  # seconds, records within the same tick share one formatted timestamp
+_records = queue.Queue(maxsize=65536)
+_dropped = 0  # records dropped because the queue was full, the writer falling behind the callers
+_stop = object()
+
+
+# Formatting a timestamp is the costly part of a record, the writer keeps the last one around
+class _TimestampCache:
+    def __init__(self):
+        self.tick = None
+        self.text = ''
+
+    def format(self, created):
+        tick = int(created / _timestamp_resolution)
+        if tick != self.tick:
+            self.tick = tick
+            self.text = datetime.datetime.fromtimestamp(created).isoformat()
+        return self.text
+
+
+def _write(created, level, message, timestamps):
+    timestamp = timestamps.format(created)
+    if _console:
+        stream = sys.stderr if level >= ERROR else sys.stdout
+        print(f"[{timestamp}] " + LEVEL_STYLES[level] + message, file=stream)
+    if _json_sink is not None:
+        _json_sink.write(json.dumps({'ts': timestamp, 'level': LEVEL_LABELS.get(level, level), 'msg': message}) + '\n')
+
+
+# Background thread: all console and file I/O happens here, never on the caller's thread
+def _writer(records, reported):
+    timestamps = _TimestampCache()
+    # `reported` drops were already reported
+    while True:
+        record = records.get()
+        if record is _stop:
+            break
+        if isinstance(record, threading.Event):
+            # flush_logs marker, everything queued before it has been written
+            try:
+                if _json_sink is not None:
+                    _json_sink.flush()
+            except Exception:
+                pass
+            record.set()
+            continue
+        try:
+            if _dropped != reported:
+                _write(time.time(), WARN, f"Log queue full, dropped {_dropped - reported} records", timestamps)
+                reported = _dropped
+            _write(*record, timestamps)
+            if _json_sink is not None and records.empty():
+                _json_sink.flush()
+        except Exception:
+            # a broken sink must never take the writer down
+            pass
+
+
+def _start_writer():
+    thread = threading.Thread(target=_writer, args=(_records, _dropped), name='log-writer', daemon=True)
+    thread.start()
+    return thread
+
+
+_writer_thread = _start_writer()
+
+
+# Markers are never dropped, they wait for room in the queue
+def _put_marker(marker, timeout):
+    try:
+        _records.put(marker, timeout=timeout)
+        return True
+    except queue.Full:
+        return False
+
+
+# Block until everything logged so far is written, e.g. before prompting the user with input()
+def flush_logs(timeout=1.0):
+    if not _writer_thread.is_alive():
+        return
+    done = threading.Event()
+    if _put_marker(done, timeout):
+        done.wait(timeout)
+
+
+# Write everything queued so far, stop the writer and close the JSON file, called automatically at exit
+def shutdown_logging():
+    global _json_sink
+    if _writer_thread.is_alive() and _put_marker(_stop, 5):
+        _writer_thread.join(timeout=5)
+    if _json_sink is not None:
+        _json_sink.close()
+        _json_sink = None
+
+
+atexit.register(shutdown_logging)
+
+
+# level: name ('info', ...) or number, json_path: optional JSON-lines file appended to
+# queue_size: records waiting for the writer, beyond it records are dropped and counted (dropped_logs)
+# Calling it again stops the current writer and closes the current JSON file first.
+def configure_logging(level='trace', json_path=None, console=True, timestamp_resolution=0.001, queue_size=65536):
+    global _level, _json_sink, _console, _timestamp_resolution, _records, _writer_thread
+    shutdown_logging()
+    _level = LEVEL_NAMES[level.lower()] if isinstance(level, str) else int(level)
+    _console = console
+    _timestamp_resolution = timestamp_resolution
+    if json_path:
+        _json_sink = open(json_path, 'a', encoding='utf-8')
+    _records = queue.Queue(maxsize=max(1, int(queue_size)))
+    _writer_thread = _start_writer()
+
+
+def dropped_logs() -> int:
+    return _dropped
+
+
+def _log(level, args):
+    global _dropped
+    try:
+        _records.put_nowait((time.time(), level, ' '.join(map(str, args))))
+    except queue.Full:
+        _dropped += 1
+
+
 def log_warn(*args):
-    timestamp = datetime.datetime.now().isoformat()
-    print(f"[{timestamp}] " + Fore.YELLOW + ' '.join(map(str, args)))
+    if WARN >= _level:
+        _log(WARN, args)
 
 def log_success(*args):
-    timestamp = datetime.datetime.now().isoformat()
-    print(f"[{timestamp}] " + Fore.GREEN + ' '.join(map(str, args)))
+    if SUCCESS >= _level:
+        _log(SUCCESS, args)
 
 def log_info(*args):
-    timestamp = datetime.datetime.now().isoformat()
-    print(f"[{timestamp}] " + Fore.CYAN + ' '.join(map(str, args)))
+    if INFO >= _level:
+        _log(INFO, args)
 
 def log_error(*args):
-    timestamp = datetime.datetime.now().isoformat()
-    print(f"[{timestamp}] " + Fore.RED + ' '.join(map(str, args)), file=sys.stderr)
+    if ERROR >= _level:
+        _log(ERROR, args)
 
 def log_trace(*args):
-    timestamp = datetime.datetime.now().isoformat()
-    print(f"[{timestamp}] " + Fore.WHITE + Style.DIM + ' '.join(map(str, args)))
+    if TRACE >= _level:
+        _log(TRACE, args)
 
 def log_debug(*args):
-    timestamp = datetime.datetime.now().isoformat()
-    print(f"[{timestamp}] " + Fore.MAGENTA + ' '.join(map(str, args)))
+    if DEBUG >= _level:
+        _log(DEBUG, args)
 
 def log_fatal(*args):
-    timestamp = datetime.datetime.now().isoformat()
-    print(f"[{timestamp}] " + Fore.RED + Style.BRIGHT + ' '.join(map(str, args)), file=sys.stderr)
+    if FATAL >= _level:
+        _log(FATAL, args)
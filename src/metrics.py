@@ -0,0 +1,126 @@
+# metrics.py
+
+import asyncio
+
+from src.logs import *
+
+# Histogram buckets: values below SUB_BUCKETS get one bucket each, above that every power of two
+# is split into SUB_BUCKETS linear buckets, so any recorded value is off by at most 1/SUB_BUCKETS.
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+def bucket_index(value: int) -> int:
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return SUB_BUCKETS * (shift + 1) + (value >> shift) - SUB_BUCKETS
+
+
+def bucket_value(index: int) -> int:
+    if index < SUB_BUCKETS:
+        return index
+    shift, sub = divmod(index - SUB_BUCKETS, SUB_BUCKETS)
+    return (SUB_BUCKETS + sub) << shift
+
+
+# HDR-style latency histogram, values are recorded as integer microseconds
+class Histogram:
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value: int):
+        if value < 0:
+            value = 0
+        index = bucket_index(value)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> int:
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bucket_value(index), self.max)
+        return self.max
+
+
+# Registry rendered in the Prometheus text exposition format
+# Counters and gauges are read through callables at scrape time, so the hot path only
+# increments its own plain attributes.
+class Metrics:
+    QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+    def __init__(self, prefix='sandwichbot'):
+        self.prefix = prefix
+        self._metrics = []  # (name, type, help, source)
+
+    def counter(self, name, source, help=''):
+        self._metrics.append((name, 'counter', help, source))
+
+    def gauge(self, name, source, help=''):
+        self._metrics.append((name, 'gauge', help, source))
+
+    def histogram(self, name, histogram: Histogram, help=''):
+        self._metrics.append((name, 'summary', help, histogram))
+
+    def render(self) -> str:
+        lines = []
+        for name, kind, help, source in self._metrics:
+            name = f"{self.prefix}_{name}"
+            if help:
+                lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == 'summary':
+                for q in self.QUANTILES:
+                    lines.append(f'{name}{{quantile="{q}"}} {source.percentile(q) / 1e6}')
+                lines.append(f"{name}_sum {source.total / 1e6}")
+                lines.append(f"{name}_count {source.count}")
+            else:
+                lines.append(f"{name} {source()}")
+        return '\n'.join(lines) + '\n'
+
+    # Minimal HTTP server on the running loop, answers GET /metrics
+    async def serve(self, host='127.0.0.1', port=9100):
+        async def handle(reader, writer):
+            try:
+                request_line = await reader.readline()
+                # drain the headers
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                parts = request_line.split()
+                if len(parts) >= 2 and parts[0] == b'GET' and parts[1].split(b'?')[0] == b'/metrics':
+                    body = self.render().encode()
+                    status = b'200 OK'
+                else:
+                    body = b'not found\n'
+                    status = b'404 Not Found'
+                writer.write(
+                    b'HTTP/1.1 ' + status + b'\r\n'
+                    b'Content-Type: text/plain; version=0.0.4\r\n'
+                    b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+                    b'Connection: close\r\n\r\n' + body
+                )
+                await writer.drain()
+            except Exception as e:
+                log_error(f"metrics request failed {str(e)}")
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, host, port)
+        log_info(f"Serving metrics on http://{host}:{port}/metrics")
+        return server
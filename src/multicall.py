@@ -0,0 +1,167 @@
+# multicall.py
+
+import asyncio
+import time
+from typing import Callable, NamedTuple
+
+from eth_abi import decode, encode
+
+from src.logs import *
+from src.abi import selector
+from src.utils import to_checksum_address, to_data_bytes, to_hex_str
+
+# Multicall3 is deployed at the same address on mainnet, Sepolia and most other chains
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+AGGREGATE3_SELECTOR = selector('Multicall3', 'aggregate3')
+GET_BLOCK_NUMBER_SELECTOR = selector('Multicall3', 'getBlockNumber')
+GET_ETH_BALANCE_SELECTOR = selector('Multicall3', 'getEthBalance')
+BALANCE_OF_SELECTOR = selector('ERC20', 'balanceOf')
+ALLOWANCE_SELECTOR = selector('ERC20', 'allowance')
+GET_RESERVES_SELECTOR = selector('UniswapV2Pair', 'getReserves')
+# Substrings of node errors meaning the eth_call itself reverted
+REVERT_ERRORS = (
+    'execution reverted',
+    'revert',
+)
+
+
+def is_revert(error) -> bool:
+    message = str(error).lower()
+    return any(e in message for e in REVERT_ERRORS)
+
+
+# Nothing at the multicall address answers aggregate3: no code, a revert or an undecodable output
+class MulticallUnavailable(ValueError):
+    pass
+
+
+# One read: `data` sent to `target`, the output turned into a value by `decode`
+# (which returns None when the output is too short, e.g. no contract at the address).
+# ETH balances have no target, they are read by Multicall3.getEthBalance or eth_getBalance.
+class Read(NamedTuple):
+    target: bytes | None
+    data: bytes
+    decode: Callable
+    owner: bytes | None = None
+
+
+def _word(address) -> bytes:
+    return bytes(12) + to_data_bytes(address)
+
+
+def decode_uint(output: bytes) -> int | None:
+    return int.from_bytes(output[:32], 'big') if len(output) >= 32 else None
+
+
+def decode_reserves(output: bytes) -> tuple | None:
+    if len(output) < 96:
+        return None
+    return int.from_bytes(output[:32], 'big'), int.from_bytes(output[32:64], 'big'), int.from_bytes(output[64:96], 'big')
+
+
+def eth_balance(owner) -> Read:
+    return Read(None, GET_ETH_BALANCE_SELECTOR + _word(owner), decode_uint, to_data_bytes(owner))
+
+
+def erc20_balance(token, owner) -> Read:
+    return Read(to_data_bytes(token), BALANCE_OF_SELECTOR + _word(owner), decode_uint)
+
+
+def erc20_allowance(token, owner, spender) -> Read:
+    return Read(to_data_bytes(token), ALLOWANCE_SELECTOR + _word(owner) + _word(spender), decode_uint)
+
+
+# (reserve0, reserve1, blockTimestampLast) of a UniswapV2 pair, None when it is not deployed
+def pair_reserves(pair) -> Read:
+    return Read(to_data_bytes(pair), GET_RESERVES_SELECTOR, decode_reserves)
+
+
+# Values of one aggregated read, as attributes named after the keywords given to read()
+# A read that reverted or returned nothing is None. `block_number` is the block every value was
+# read at with Multicall3, with a JSON-RPC batch the reads are only as consistent as the node.
+class Snapshot:
+    def __init__(self, values: dict, block_number: int | None, source: str):
+        self.__dict__.update(values)
+        self.values = values
+        self.block_number = block_number
+        self.source = source  # "multicall" or "batch"
+
+    def __repr__(self):
+        values = ' '.join(f"{name}={value}" for name, value in self.values.items())
+        return f"Snapshot(block={self.block_number} source={self.source} {values})"
+
+
+# Packs independent eth_calls into one Multicall3.aggregate3 call, or into one JSON-RPC batch when
+# no multicall contract is configured (or none answers at the configured address).
+# `rpc` exposes call() and get_balance(), an RpcBatcher so the batch fallback is a single round trip.
+#
+# Multicall3 is only given up for good on MulticallUnavailable. Any other failure (a node error,
+# a timeout, a dropped connection) sends the reads of the next `retry_interval` seconds as batches.
+class ReadAggregator:
+    def __init__(self, rpc, multicall_address=MULTICALL3_ADDRESS, retry_interval=60):
+        self.rpc = rpc
+        self.multicall_address = to_data_bytes(multicall_address) if multicall_address else None
+        self.retry_interval = retry_interval
+        self.round_trips = 0
+        self._retry_at = 0.0  # time.monotonic() before which Multicall3 is not tried again
+
+    @classmethod
+    def from_config(cls, rpc, config):
+        return cls(
+            rpc,
+            config.get("multicall_address", MULTICALL3_ADDRESS),
+            retry_interval=config.get("multicall_retry_interval", 60),
+        )
+
+    async def read(self, **reads: Read) -> Snapshot:
+        if self.multicall_address is not None and time.monotonic() >= self._retry_at:
+            try:
+                return await self._read_multicall(reads)
+            except MulticallUnavailable as e:
+                log_warn(f"Multicall3 unavailable ({str(e)}), reading with JSON-RPC batches from now on")
+                self.multicall_address = None
+            except Exception as e:
+                log_warn(f"Multicall3 read failed ({str(e)}), reading with JSON-RPC batches for {self.retry_interval}s")
+                self._retry_at = time.monotonic() + self.retry_interval
+        return await self._read_batch(reads)
+
+    async def _read_multicall(self, reads) -> Snapshot:
+        multicall = self.multicall_address
+        calls = [(multicall, False, GET_BLOCK_NUMBER_SELECTOR)]
+        calls += [(read.target or multicall, True, read.data) for read in reads.values()]
+        data = AGGREGATE3_SELECTOR + encode(['(address,bool,bytes)[]'], [calls])
+        self.round_trips += 1
+        try:
+            output = bytes(await self.rpc.call({'to': to_checksum_address(multicall), 'data': to_hex_str(data)}))
+        except ValueError as e:
+            # aggregate3 with allowFailure never reverts, whatever is deployed there is not Multicall3
+            if is_revert(e):
+                raise MulticallUnavailable(f"aggregate3 reverted at {to_checksum_address(multicall)}: {str(e)}")
+            raise
+        if not output:
+            raise MulticallUnavailable(f"no contract at {to_checksum_address(multicall)}")
+        try:
+            results = decode(['(bool,bytes)[]'], output)[0]
+        except Exception as e:
+            raise MulticallUnavailable(f"unexpected aggregate3 output ({type(e).__name__})")
+        block_number = decode_uint(results[0][1])
+        values = {
+            name: read.decode(return_data) if success else None
+            for (name, read), (success, return_data) in zip(reads.items(), results[1:])
+        }
+        return Snapshot(values, block_number, "multicall")
+
+    async def _read_batch(self, reads) -> Snapshot:
+        async def one(read):
+            try:
+                if read.target is None:
+                    return await self.rpc.get_balance(to_checksum_address(read.owner))
+                output = await self.rpc.call({'to': to_checksum_address(read.target), 'data': to_hex_str(read.data)})
+                return read.decode(bytes(output))
+            except Exception as e:
+                log_debug(f"Read failed {str(e)}")
+                return None
+
+        self.round_trips += 1
+        results = await asyncio.gather(*(one(read) for read in reads.values()))
+        return Snapshot(dict(zip(reads, results)), None, "batch")
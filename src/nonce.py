@@ -0,0 +1,110 @@
+# nonce.py
+
+import asyncio
+
+from src.logs import *
+
+# Substrings of node errors meaning our local nonce no longer matches the chain
+NONCE_ERRORS = (
+    'nonce too low',
+    'nonce too high',
+    'replacement transaction underpriced',
+    'invalid nonce',
+)
+# The node already holds this exact transaction (e.g. a retried broadcast), it was sent
+ALREADY_KNOWN_ERRORS = (
+    'already known',
+    'known transaction',
+)
+
+
+def is_nonce_error(error) -> bool:
+    message = str(error).lower()
+    return any(e in message for e in NONCE_ERRORS)
+
+
+def is_already_known(error) -> bool:
+    message = str(error).lower()
+    return any(e in message for e in ALREADY_KNOWN_ERRORS)
+
+
+# Hands out nonces for one account locally
+#
+# The pending nonce is fetched once, then every transaction gets the next number under a lock,
+# so several transactions can be built, signed and sent back-to-back without a round trip each.
+# Sent transactions are tracked until they are confirmed; on a nonce error or a dropped
+# transaction the manager resyncs from the node, never going back below a nonce still in flight.
+# Nonces handed out are held until sent() or release(), a resync while a transaction is being
+# signed or sent doesn't hand its nonce out again. Nonces released without being sent are handed
+# out again first. `w3` is an AsyncWeb3 instance.
+class NonceManager:
+    def __init__(self, w3, address):
+        self.w3 = w3
+        self.address = address
+        self.in_flight = {}  # nonce -> tx hash
+        self.handed_out = set()  # nonces given by next_nonce() and neither sent nor released yet
+        self.gaps = set()  # nonces below _next released without being sent
+        self._next = None
+        self._lock = asyncio.Lock()
+
+    async def _fetch(self):
+        return await self.w3.eth.get_transaction_count(self.address, 'pending')
+
+    async def resync(self):
+        async with self._lock:
+            node_nonce = await self._fetch()
+            # anything below the node's pending nonce is either mined or known to the node
+            for nonce in [n for n in self.in_flight if n < node_nonce]:
+                del self.in_flight[nonce]
+            # sent from here but not seen by the node yet, or being sent, those can't be handed out again
+            taken = self.in_flight.keys() | self.handed_out
+            self._next = max(node_nonce, max(taken) + 1) if taken else node_nonce
+            self.gaps = {n for n in range(node_nonce, self._next) if n not in taken}
+            log_info(f"Nonce resynced: next={self._next}, in flight={len(self.in_flight)}, "
+                     f"being sent={len(self.handed_out)}, gaps={len(self.gaps)}")
+
+    async def next_nonce(self) -> int:
+        async with self._lock:
+            if self.gaps:
+                nonce = min(self.gaps)
+                self.gaps.discard(nonce)
+            else:
+                if self._next is None:
+                    self._next = await self._fetch()
+                nonce = self._next
+                self._next += 1
+            self.handed_out.add(nonce)
+            return nonce
+
+    def sent(self, nonce, tx_hash):
+        self.handed_out.discard(nonce)
+        self.gaps.discard(nonce)
+        self.in_flight[nonce] = tx_hash
+
+    # Mined. With `tx_hash`, only if the nonce is still held by that transaction.
+    def confirmed(self, nonce, tx_hash=None):
+        if tx_hash is None or self.in_flight.get(nonce) == tx_hash:
+            self.in_flight.pop(nonce, None)
+
+    # Sent but never mined (e.g. evicted from the mempool), its nonce comes back from the node
+    async def dropped(self, nonce):
+        self.in_flight.pop(nonce, None)
+        await self.resync()
+
+    # A nonce was handed out but the transaction was never broadcast (cancelled, signing failed)
+    async def release(self, nonce):
+        async with self._lock:
+            self.handed_out.discard(nonce)
+            if self._next is not None and nonce == self._next - 1:
+                self._next = nonce
+            elif self._next is not None and nonce < self._next and nonce not in self.in_flight:
+                # later nonces are taken already, the next transaction fills the gap
+                self.gaps.add(nonce)
+
+    # Call with any error raised while sending or waiting, returns True if it was nonce related
+    async def handle_error(self, error) -> bool:
+        if is_nonce_error(error):
+            log_warn(f"Nonce error: {str(error)}")
+            await self.resync()
+            return True
+        return False
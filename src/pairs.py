@@ -0,0 +1,216 @@
+# pairs.py
+
+import asyncio
+import time
+from functools import lru_cache
+
+from eth_hash.auto import keccak
+
+from src.logs import *
+from src.abi import selector, topic
+from src.filters import normalize_address
+from src.utils import to_checksum_address, to_data_bytes, to_hex_str, to_quantity
+
+# init code hash of the canonical UniswapV2Pair, forks deploying another pair bytecode have their own
+UNISWAP_V2_INIT_CODE_HASH = '0x96e8ac4277198ff8b6f785478aa9a39f403cb768dd02cbee326c3e7da348845f'
+
+SYNC_TOPIC = topic('UniswapV2Pair', 'Sync')
+GET_RESERVES_SELECTOR = selector('UniswapV2Pair', 'getReserves')
+
+
+# Order two token addresses the way UniswapV2Factory does
+def sort_tokens(token_a: bytes, token_b: bytes) -> tuple[bytes, bytes]:
+    if token_a == token_b:
+        raise ValueError("Identical token addresses")
+    return (token_a, token_b) if token_a < token_b else (token_b, token_a)
+
+
+# CREATE2 address of the pair contract, same as UniswapV2Library.pairFor
+def pair_for(factory: bytes, token_a: bytes, token_b: bytes, init_code_hash: bytes) -> bytes:
+    token0, token1 = sort_tokens(token_a, token_b)
+    return keccak(b'\xff' + factory + keccak(token0 + token1) + init_code_hash)[12:]
+
+
+# Offline replacement for factory.getPair, memoized per (factory, token0, token1)
+# `factories` maps factory addresses to the init code hash of the pair they deploy,
+# factories not listed use `default_init_code_hash`.
+class PairResolver:
+    def __init__(self, factories=None, default_init_code_hash=UNISWAP_V2_INIT_CODE_HASH, maxsize=65536):
+        self.default_init_code_hash = to_data_bytes(default_init_code_hash)
+        self.init_code_hashes = {
+            normalize_address(factory): to_data_bytes(init_code_hash)
+            for factory, init_code_hash in (factories or {}).items()
+        }
+        self._pair_for = lru_cache(maxsize=maxsize)(self._compute)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get("factories", {}), config.get("init_code_hash", UNISWAP_V2_INIT_CODE_HASH))
+
+    def _compute(self, factory: bytes, token0: bytes, token1: bytes) -> bytes:
+        init_code_hash = self.init_code_hashes.get(factory, self.default_init_code_hash)
+        return pair_for(factory, token0, token1, init_code_hash)
+
+    # Accepts hex strings or raw bytes, returns the raw 20 byte pair address
+    def pair_address(self, factory, token_a, token_b) -> bytes:
+        token0, token1 = sort_tokens(normalize_address(token_a), normalize_address(token_b))
+        return self._pair_for(normalize_address(factory), token0, token1)
+
+    def cache_info(self):
+        return self._pair_for.cache_info()
+
+
+# Latest known reserves of a pair, `block_number` is the block they were read at
+class PairState:
+    __slots__ = ('token0', 'token1', 'reserve0', 'reserve1', 'block_number')
+
+    def __init__(self, token0, token1, reserve0=0, reserve1=0, block_number=0):
+        self.token0 = token0
+        self.token1 = token1
+        self.reserve0 = reserve0
+        self.reserve1 = reserve1
+        self.block_number = block_number
+
+
+# In-memory pair index and reserve table for one factory
+#
+# - pair addresses come from a PairResolver, never from factory.getPair
+# - reserves are loaded once with getReserves when a pair is first watched, then only updated
+#   from the Sync logs of each new block: on_head (ProviderPool.on_head, like the reconciler's)
+#   queues every block hash once, the task started by start() fetches its logs
+# - lookups never touch the network, callers decide what staleness they accept
+# - pairs found without a contract are not asked about again for `missing_ttl` seconds (they may
+#   be created meanwhile), and at most `missing_size` of them are remembered
+class PairCache:
+    def __init__(self, factory, resolver=None, missing_ttl=60.0, missing_size=65536):
+        self.factory = normalize_address(factory)
+        self.resolver = resolver or PairResolver()
+        self.block_number = 0  # last block whose Sync logs were applied
+        self.states = {}  # pair address -> PairState
+        self.missing = {}  # pair address without a deployed contract -> time.monotonic() to check it again
+        self.missing_ttl = missing_ttl
+        self.missing_size = max(1, int(missing_size))
+        self._loading = {}  # pair address -> asyncio.Task of the initial getReserves
+        self._heads = {}  # last 64 block hashes queued, oldest first, so each block is fetched once
+        self._queue = None
+        self._task = None
+        self._rpc = None
+        # on_update(pair, reserve0, reserve1, block_number) after every change, e.g. ReserveTable.publish
+        self.on_update = None
+
+    def pair_address(self, token_a: bytes, token_b: bytes) -> bytes:
+        return self.resolver.pair_address(self.factory, token_a, token_b)
+
+    # Reserves of token_a/token_b in that order, with the block they are from, or None if unknown
+    def get_reserves(self, token_a: bytes, token_b: bytes):
+        state = self.states.get(self.pair_address(token_a, token_b))
+        if state is None:
+            return None
+        if token_a == state.token0:
+            return state.reserve0, state.reserve1, state.block_number
+        return state.reserve1, state.reserve0, state.block_number
+
+    # Start tracking the pairs along a swap path, `call` is w3.eth.call or RpcBatcher.call
+    def watch_path(self, path, call):
+        for token_a, token_b in zip(path, path[1:]):
+            pair = self.pair_address(token_a, token_b)
+            if pair in self.states or pair in self._loading or self._known_missing(pair):
+                continue
+            task = asyncio.create_task(self._load(pair, *sort_tokens(token_a, token_b), call))
+            self._loading[pair] = task
+            task.add_done_callback(lambda _, pair=pair: self._loading.pop(pair, None))
+
+    def _known_missing(self, pair) -> bool:
+        deadline = self.missing.get(pair)
+        if deadline is None:
+            return False
+        if deadline > time.monotonic():
+            return True
+        del self.missing[pair]
+        return False
+
+    def _add_missing(self, pair):
+        now = time.monotonic()
+        if len(self.missing) >= self.missing_size:
+            self.missing = {p: deadline for p, deadline in self.missing.items() if deadline > now}
+            if len(self.missing) >= self.missing_size:
+                del self.missing[next(iter(self.missing))]
+        self.missing[pair] = now + self.missing_ttl
+
+    async def _load(self, pair, token0, token1, call):
+        try:
+            output = bytes(await call({'to': to_checksum_address(pair), 'data': to_hex_str(GET_RESERVES_SELECTOR)}))
+        except Exception as e:
+            log_error(f"pair={to_hex_str(pair)} getReserves failed {str(e)}")
+            return
+        if len(output) < 96:
+            # no code at the CREATE2 address, the pair has not been created yet
+            self._add_missing(pair)
+            return
+        # a Sync log may already have filled it in while the call was in flight
+        if pair not in self.states:
+            reserve0 = int.from_bytes(output[:32], 'big')
+            reserve1 = int.from_bytes(output[32:64], 'big')
+            self.states[pair] = PairState(token0, token1, reserve0, reserve1, self.block_number)
+            if self.on_update is not None:
+                self.on_update(pair, reserve0, reserve1, self.block_number)
+
+    # Apply the Sync logs of a block, only pairs already watched are updated
+    def apply_sync_logs(self, logs, block_number):
+        for log in logs:
+            pair = normalize_address(log['address'])
+            state = self.states.get(pair)
+            if state is None:
+                continue
+            data = to_data_bytes(log['data'])
+            state.reserve0 = int.from_bytes(data[:32], 'big')
+            state.reserve1 = int.from_bytes(data[32:64], 'big')
+            state.block_number = block_number
+            if self.on_update is not None:
+                self.on_update(pair, state.reserve0, state.reserve1, block_number)
+        self.block_number = max(self.block_number, block_number)
+
+    # `rpc` exposes get_logs and get_block, an RpcBatcher, w3.eth or ProviderPool.rpc
+    def start(self, rpc):
+        self._rpc = rpc
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # ProviderPool.on_head, called with the hash of each new block by every provider announcing it
+    def on_head(self, block_hash):
+        block_hash = to_data_bytes(block_hash)
+        if block_hash in self._heads or self._queue is None:
+            return
+        self._heads[block_hash] = None
+        if len(self._heads) > 64:
+            del self._heads[next(iter(self._heads))]
+        self._queue.put_nowait(block_hash)
+
+    async def _run(self):
+        while True:
+            block_hash = await self._queue.get()
+            try:
+                await self._refresh(block_hash)
+            except Exception as e:
+                # let another provider's announcement of the same block retry it
+                self._heads.pop(block_hash, None)
+                log_error(f"block={to_hex_str(block_hash)} Sync logs failed {str(e)}")
+
+    # One eth_getLogs per block, plus the block itself when it has no Sync log to read its number from
+    async def _refresh(self, block_hash):
+        logs = await self._rpc.get_logs({'blockHash': to_hex_str(block_hash), 'topics': [to_hex_str(SYNC_TOPIC)]})
+        if logs:
+            block_number = to_quantity(logs[0]['blockNumber'])
+        else:
+            block = await self._rpc.get_block(block_hash)
+            if block is None:
+                raise ValueError("unknown block")
+            block_number = to_quantity(block['number'])
+        self.apply_sync_logs(logs, block_number)
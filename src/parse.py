@@ -1,62 +1,158 @@
-import json
-from eth_abi import decode
-
-# Load UniswapV2 Router ABI
-with open('contracts/abi/UniswapV2Router02.json', 'r') as abi_file:
-    uniswap_v2_router_abi = json.load(abi_file)
-
-with open('contracts/abi/UniswapV2Router02_methods.json', 'r') as methods_file:
-    uniswap_v2_router_methods = json.load(methods_file)
-
-# Create a dictionary to map method names to the function signatures
-def get_function_signature_mapping(abi):
-    return {
-        f['name']: f['inputs'] for f in abi if f['type'] == 'function'
-    }
-
-
-# Get the mapping of function signatures from the ABI
-function_signatures = get_function_signature_mapping(uniswap_v2_router_abi)
-
-# Helper function to decode UniswapV2 Router transaction data
-def parse_univ2_router_tx(tx_data):
-    # Remove '0x' from tx data and get the first 4 bytes (the method selector)
-    method_selector = str(tx_data.hex())[:8]
-
-    # Check if the method
-    if method_selector not in uniswap_v2_router_methods:
-        return {
-            'method': None,
-            'availability': False
-        }
-
-    method = uniswap_v2_router_methods.get(method_selector)
-
-    if method[:4] != 'swap':
-        return {
-            'method': method,
-            'availability': False
-        }
-
-    return {
-        'method': method,
-        'availability': False
-    }
-
-    # Decode parameters
-    decoded_params = decode(
-        ['uint256', 'address[]', 'address', 'uint256'],  # The parameters for 'swapExactETHForTokens'
-        bytes.fromhex(tx_data[10:])  # Strip the first 4 bytes (method selector)
-    )
-
-    amount_out_min, path, to, deadline = decoded_params
-
-    return {
-        'availability': True,
-        'method': method,
-        'amountOutMin': amount_out_min,
-        'path': path,
-        'to': to,
-        'deadline': deadline
-    }
+from typing import NamedTuple
 
+from src.abi import contract_abi, function_selectors
+
+# UniswapV2 Router ABI, selectors come precompiled from contracts/abi/compiled.json
+uniswap_v2_router_abi = contract_abi('UniswapV2Router02')
+
+
+# Decoded router call: `args` are in ABI order and `names` is shared with the dispatch table.
+# Addresses are returned as raw 20 byte values, `address[]` as a tuple of them.
+class RouterCall(NamedTuple):
+    selector: bytes
+    method: str
+    names: tuple
+    args: tuple
+
+    @property
+    def is_swap(self) -> bool:
+        return self.method.startswith('swap')
+
+    def get(self, name, default=None):
+        try:
+            return self.args[self.names.index(name)]
+        except ValueError:
+            return default
+
+    def as_dict(self):
+        return dict(zip(self.names, self.args))
+
+
+# Calldata with a known selector that does not decode as the ABI says
+# A ValueError, which the pipeline counts as malformed input rather than as an error.
+class MalformedCalldata(ValueError):
+    pass
+
+
+# Entry of the dispatch table, built once per ABI function
+class RouterMethod(NamedTuple):
+    method: str
+    signature: str
+    types: tuple
+    names: tuple
+    # positions of `address` and `address[]` arguments, converted to raw bytes after decoding
+    address_args: tuple
+    address_list_args: tuple
+
+
+# `functions` is a selector -> entry mapping as returned by src.abi.function_selectors
+def build_selector_table(functions) -> dict:
+    table = {}
+    for selector, entry in functions.items():
+        types = tuple(entry['types'])
+        table[selector] = RouterMethod(
+            method=entry['name'],
+            signature=entry['signature'],
+            types=types,
+            names=tuple(entry['names']),
+            address_args=tuple(i for i, t in enumerate(types) if t == 'address'),
+            address_list_args=tuple(i for i, t in enumerate(types) if t == 'address[]'),
+        )
+    return table
+
+
+# 4 byte selector -> RouterMethod
+uniswap_v2_router_methods = build_selector_table(function_selectors('UniswapV2Router02'))
+
+
+def _address_bytes(address: str) -> bytes:
+    return bytes.fromhex(address[2:])
+
+
+# Every swap takes a fixed head of uint256 amounts, then (address[] path, address to, uint256 deadline).
+# selector -> number of leading amounts, for the methods matching one of these two layouts
+SWAP_LAYOUTS = {
+    ('uint256', 'address[]', 'address', 'uint256'): 1,
+    ('uint256', 'uint256', 'address[]', 'address', 'uint256'): 2,
+}
+swap_selectors = {
+    selector: SWAP_LAYOUTS[entry.types]
+    for selector, entry in uniswap_v2_router_methods.items()
+    if entry.method.startswith('swap') and entry.types in SWAP_LAYOUTS
+}
+
+_ZERO_PADDING = bytes(12)
+
+
+# Read a swap argument list straight out of the calldata by offset arithmetic.
+# Returns None whenever the layout is not exactly what the ABI encoder produces,
+# so the caller can fall back to eth_abi (which raises on really malformed input).
+def decode_swap_args(body: memoryview, amounts: int) -> tuple | None:
+    size = len(body)
+    head = (amounts + 3) * 32
+    if size < head:
+        return None
+    from_bytes = int.from_bytes
+
+    args = [from_bytes(body[i:i + 32], 'big') for i in range(0, amounts * 32, 32)]
+    pos = amounts * 32
+    offset = from_bytes(body[pos:pos + 32], 'big')
+    to_word = body[pos + 32:pos + 64]
+    if to_word[:12] != _ZERO_PADDING:
+        return None
+    deadline = from_bytes(body[pos + 64:pos + 96], 'big')
+
+    # the dynamic part: a length word followed by one padded address per word
+    if offset < head or offset + 32 > size:
+        return None
+    length = from_bytes(body[offset:offset + 32], 'big')
+    end = offset + 32 + length * 32
+    if end > size:
+        return None
+    path = []
+    for word in range(offset + 32, end, 32):
+        if body[word:word + 12] != _ZERO_PADDING:
+            return None
+        path.append(bytes(body[word + 12:word + 32]))
+
+    args.append(tuple(path))
+    args.append(bytes(to_word[12:]))
+    args.append(deadline)
+    return tuple(args)
+
+
+# Generic path, decode with eth_abi and convert addresses to raw bytes
+# eth_abi is only imported the first time a call misses the fast swap decoder
+def decode_args(entry: RouterMethod, body) -> tuple:
+    from eth_abi import decode
+    from eth_abi.exceptions import DecodingError
+
+    try:
+        args = decode(entry.types, bytes(body))
+    except (DecodingError, ValueError) as e:
+        raise MalformedCalldata(f"{entry.method}: {str(e)}") from None
+    if entry.address_args or entry.address_list_args:
+        args = list(args)
+        for i in entry.address_args:
+            args[i] = _address_bytes(args[i])
+        for i in entry.address_list_args:
+            args[i] = tuple(_address_bytes(a) for a in args[i])
+        args = tuple(args)
+    return args
+
+
+# Decode UniswapV2 Router calldata (bytes, bytearray or memoryview), return None for unknown selectors
+# Raises MalformedCalldata when a known selector is followed by arguments that don't decode.
+def parse_univ2_router_tx(tx_data) -> RouterCall | None:
+    tx_data = memoryview(tx_data)
+    selector = tx_data[:4].tobytes()
+    entry = uniswap_v2_router_methods.get(selector)
+    if entry is None:
+        return None
+
+    amounts = swap_selectors.get(selector)
+    args = decode_swap_args(tx_data[4:], amounts) if amounts is not None else None
+    if args is None:
+        args = decode_args(entry, tx_data[4:])
+
+    return RouterCall(selector, entry.method, entry.names, args)
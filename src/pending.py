@@ -0,0 +1,208 @@
+# pending.py
+
+import time
+from collections import deque
+
+from src.parse import RouterCall, uniswap_v2_router_methods
+from src.utils import to_data_bytes, to_quantity
+
+
+# Hands out one shared bytes object per distinct address, so the thousands of pending
+# transactions from the same sender, to the same router or through the same tokens hold a
+# pointer each instead of a copy each. Past `maxsize` distinct values the table starts over,
+# records keep the objects they already have, so memory stays bounded.
+class Interner:
+    __slots__ = ('maxsize', '_values')
+
+    def __init__(self, maxsize=262144):
+        self.maxsize = maxsize
+        self._values = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def __call__(self, value: bytes) -> bytes:
+        interned = self._values.get(value)
+        if interned is None:
+            if len(self._values) >= self.maxsize:
+                self._values.clear()
+            self._values[value] = interned = value
+        return interned
+
+
+# What the bot keeps of a pending router transaction
+class PendingTx:
+    __slots__ = ('hash', 'sender', 'to', 'nonce', 'gas', 'value', 'max_fee', 'priority_fee', 'selector', 'call', 'seen')
+
+    def __init__(self, tx_hash, sender, to, nonce, gas, value, max_fee, priority_fee, selector, call, seen):
+        self.hash = tx_hash  # 32 bytes
+        self.sender = sender  # 20 bytes, interned
+        self.to = to  # 20 bytes, interned, None for contract creations
+        self.nonce = nonce
+        self.gas = gas
+        self.value = value
+        self.max_fee = max_fee  # maxFeePerGas, gasPrice for legacy transactions
+        self.priority_fee = priority_fee  # maxPriorityFeePerGas, gasPrice for legacy transactions
+        self.selector = selector  # 4 bytes, interned
+        self.call = call  # RouterCall with interned addresses, None when not decoded
+        self.seen = seen  # time.monotonic() when added
+
+    def __repr__(self):
+        return f"PendingTx(hash=0x{self.hash.hex()} sender=0x{self.sender.hex()} nonce={self.nonce})"
+
+
+# Bounded store of pending transactions, keyed by hash
+#
+# - by_router[to] holds the transactions sent to each address, in arrival order
+# - by_sender[(sender, nonce)] detects replacements: a new hash for a sender/nonce already held
+#   replaces the old record, which add() returns
+# - records older than `ttl` seconds are evicted as new ones arrive (or by evict()), and the
+#   oldest one whenever `capacity` is reached, so memory is flat however long the bot runs
+# Records are also queued in arrival order for eviction. Removed ones are skipped once they reach
+# the front, the queue is compacted when they make up most of it.
+class PendingTxStore:
+    def __init__(self, capacity=100000, ttl=600.0):
+        self.capacity = max(1, int(capacity))
+        self.ttl = ttl
+        self.intern = Interner(4 * self.capacity)
+        self.by_hash = {}
+        self.by_router = {}
+        self.by_sender = {}
+        self._arrivals = deque()
+        self.replaced = 0  # records replaced by a transaction with the same sender and nonce
+        self.expired = 0  # records evicted by age
+        self.evicted = 0  # records evicted by capacity
+        self.removed = 0  # records removed by the caller (mined, dropped)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get("capacity", 100000), config.get("ttl", 600))
+
+    def __len__(self):
+        return len(self.by_hash)
+
+    def __contains__(self, tx_hash):
+        return to_data_bytes(tx_hash) in self.by_hash
+
+    def get(self, tx_hash) -> PendingTx | None:
+        return self.by_hash.get(to_data_bytes(tx_hash))
+
+    def get_by_sender(self, sender, nonce) -> PendingTx | None:
+        return self.by_sender.get((to_data_bytes(sender), nonce))
+
+    # Transactions sent to `router`, oldest first
+    def sent_to(self, router) -> list:
+        return list(self.by_router.get(to_data_bytes(router), {}).values())
+
+    def _intern_call(self, call: RouterCall) -> RouterCall:
+        entry = uniswap_v2_router_methods.get(call.selector)
+        if entry is None or not (entry.address_args or entry.address_list_args):
+            return call
+        args = list(call.args)
+        for i in entry.address_args:
+            args[i] = self.intern(args[i])
+        for i in entry.address_list_args:
+            args[i] = tuple(self.intern(a) for a in args[i])
+        return RouterCall(self.intern(call.selector), call.method, call.names, tuple(args))
+
+    # Store a transaction (a raw dict, web3 AttributeDict or formatted dict) with its decoded call.
+    # Returns the record it replaced, if any.
+    def add(self, tx, call: RouterCall | None = None) -> PendingTx | None:
+        now = time.monotonic()
+        self.evict(now)
+        tx_hash = to_data_bytes(tx['hash'])
+        if tx_hash in self.by_hash:
+            return None
+        intern = self.intern
+        to = tx.get('to')
+        tx_data = to_data_bytes(tx.get('input'))
+        gas_price = tx.get('gasPrice')
+        record = PendingTx(
+            tx_hash,
+            intern(to_data_bytes(tx['from'])),
+            intern(to_data_bytes(to)) if to else None,
+            to_quantity(tx.get('nonce')),
+            to_quantity(tx.get('gas')),
+            to_quantity(tx.get('value')),
+            to_quantity(tx.get('maxFeePerGas', gas_price)),
+            to_quantity(tx.get('maxPriorityFeePerGas', gas_price)),
+            intern(tx_data[:4]) if len(tx_data) >= 4 else None,
+            self._intern_call(call) if call is not None else None,
+            now,
+        )
+
+        replaced = self.by_sender.get((record.sender, record.nonce))
+        if replaced is not None:
+            self._remove(replaced)
+            self.replaced += 1
+        elif len(self.by_hash) >= self.capacity:
+            self._remove(self._pop_oldest())
+            self.evicted += 1
+
+        self.by_hash[tx_hash] = record
+        self._arrivals.append(record)
+        if len(self._arrivals) > 2 * self.capacity:
+            self._arrivals = deque(r for r in self._arrivals if self.by_hash.get(r.hash) is r)
+        self.by_sender[(record.sender, record.nonce)] = record
+        if record.to is not None:
+            sent_to = self.by_router.get(record.to)
+            if sent_to is None:
+                self.by_router[record.to] = sent_to = {}
+            sent_to[tx_hash] = record
+        return replaced
+
+    # Drop a transaction, e.g. once it was mined, returns its record if it was held
+    def remove(self, tx_hash) -> PendingTx | None:
+        record = self.by_hash.get(to_data_bytes(tx_hash))
+        if record is not None:
+            self._remove(record)
+            self.removed += 1
+        return record
+
+    def _remove(self, record: PendingTx):
+        del self.by_hash[record.hash]
+        key = (record.sender, record.nonce)
+        if self.by_sender.get(key) is record:
+            del self.by_sender[key]
+        if record.to is not None:
+            sent_to = self.by_router[record.to]
+            del sent_to[record.hash]
+            if not sent_to:
+                del self.by_router[record.to]
+
+    # Evict every record older than ttl, returns how many were
+    def evict(self, now=None) -> int:
+        if now is None:
+            now = time.monotonic()
+        deadline = now - self.ttl
+        expired = 0
+        arrivals = self._arrivals
+        by_hash = self.by_hash
+        while arrivals:
+            oldest = arrivals[0]
+            if by_hash.get(oldest.hash) is not oldest:
+                arrivals.popleft()  # removed or replaced already
+                continue
+            if oldest.seen > deadline:
+                break
+            arrivals.popleft()
+            self._remove(oldest)
+            expired += 1
+        self.expired += expired
+        return expired
+
+    # Oldest record still held, taken off the arrival queue
+    def _pop_oldest(self) -> PendingTx:
+        arrivals = self._arrivals
+        by_hash = self.by_hash
+        while True:
+            oldest = arrivals.popleft()
+            if by_hash.get(oldest.hash) is oldest:
+                return oldest
+
+    def register_metrics(self, metrics):
+        metrics.gauge("pending_store_size", lambda: len(self.by_hash), "pending router transactions held")
+        metrics.counter("pending_store_replaced_total", lambda: self.replaced, "transactions replaced by the same sender and nonce")
+        metrics.counter("pending_store_expired_total", lambda: self.expired, "transactions evicted by age")
+        metrics.counter("pending_store_evicted_total", lambda: self.evicted, "transactions evicted by capacity")
+        metrics.counter("pending_store_removed_total", lambda: self.removed, "transactions removed once mined")
@@ -0,0 +1,237 @@
+# pipeline.py
+
+import asyncio
+import time
+
+from src.logs import *
+from src.metrics import Histogram
+from src.utils import to_hex_str
+
+
+# Counters shared by every stage of the pipeline
+class PipelineStats:
+    __slots__ = ('received', 'dropped', 'fetched', 'missing', 'filtered', 'decoded', 'skipped', 'malformed', 'handled',
+                 'errors')
+
+    def __init__(self):
+        self.received = 0  # hashes/transactions accepted by the pipeline
+        self.dropped = 0  # hashes/transactions rejected because the entry queue was full
+        self.fetched = 0  # transactions returned by the fetch stage
+        self.missing = 0  # hashes the node no longer knows about
+        self.filtered = 0  # transactions rejected by the accept filter before decoding
+        self.decoded = 0  # transactions the decode stage passed on to the handler
+        self.skipped = 0  # transactions the decode stage ignored
+        self.malformed = 0  # transactions the decode stage rejected with a ValueError
+        self.handled = 0  # transactions the handler finished
+        self.errors = 0  # exceptions raised by any stage
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# Staged mempool pipeline: hash intake -> fetch -> decode -> handler
+# Full transaction bodies (e.g. from a subscription) enter directly at the decode stage.
+#
+# - accept(tx) is an optional cheap filter applied as soon as a transaction body is known
+# - fetch(tx_hash) is awaited by `fetch_workers` concurrent workers, so a slow RPC only blocks one worker
+# - decode(tx) is a plain function run on the loop, returning None to drop the transaction, or
+#   raising ValueError for input it rejects (e.g. malformed calldata), dropped with a debug log
+# - or decode_batch(txs), awaited by `decode_workers` workers with up to `decode_batch_size`
+#   transactions at a time (e.g. WorkerPool.decode_batch, which runs them in other processes).
+#   It returns one entry per transaction: the decoded value, None, or the exception raised for it
+# - handle(tx, decoded) is awaited by `handler_workers` workers
+#
+# Producers never block: when the entry queue is full the hash (or transaction) is dropped and counted.
+# The inner queues are bounded too, so a slow stage applies backpressure to the stage feeding it.
+class MempoolPipeline:
+    def __init__(self, fetch, decode, handle, accept=None, fetch_workers=16, handler_workers=1, queue_size=10000,
+                 decode_batch=None, decode_workers=1, decode_batch_size=64):
+        self.fetch = fetch
+        self.accept = accept
+        self.decode = decode
+        self.decode_batch = decode_batch
+        self.handle = handle
+        self.fetch_workers = max(1, int(fetch_workers))
+        self.handler_workers = max(1, int(handler_workers))
+        self.decode_workers = max(1, int(decode_workers)) if decode_batch is not None else 1
+        self.decode_batch_size = max(1, int(decode_batch_size))
+        self.intake_queue = asyncio.Queue(maxsize=queue_size)
+        self.decode_queue = asyncio.Queue(maxsize=queue_size)
+        self.handle_queue = asyncio.Queue(maxsize=queue_size)
+        self.stats = PipelineStats()
+        # per-stage latencies, from time.perf_counter_ns() stamps carried along with each item
+        self.latency = {
+            'queue': Histogram(),  # seen -> picked up by a fetch worker
+            'fetch': Histogram(),  # fetch call
+            'decode': Histogram(),  # fetched -> decoded, including the wait in the decode queue
+            'handle': Histogram(),  # decoded -> handled, including the wait in the handle queue
+            'seen_to_decoded': Histogram(),  # hash seen -> decoded record available
+            'end_to_end': Histogram(),  # hash seen -> handler returned
+        }
+        self._tasks = []
+
+    @classmethod
+    def from_config(cls, fetch, decode, handle, config, accept=None, decode_batch=None, decode_workers=1):
+        return cls(
+            fetch,
+            decode,
+            handle,
+            accept=accept,
+            fetch_workers=config.get("fetch_workers", 16),
+            handler_workers=config.get("handler_workers", 1),
+            queue_size=config.get("queue_size", 10000),
+            decode_batch=decode_batch,
+            decode_workers=decode_workers,
+            decode_batch_size=config.get("decode_batch_size", 64),
+        )
+
+    # Hand a hash to the pipeline without waiting, return False if it was dropped
+    def submit(self, tx_hash) -> bool:
+        try:
+            self.intake_queue.put_nowait((tx_hash, time.perf_counter_ns()))
+        except asyncio.QueueFull:
+            self.stats.dropped += 1
+            return False
+        self.stats.received += 1
+        return True
+
+    # Hand a full transaction body straight to the decode stage, skipping the fetch stage
+    def submit_tx(self, tx) -> bool:
+        if self.accept is not None and not self.accept(tx):
+            self.stats.filtered += 1
+            return True
+        now = time.perf_counter_ns()
+        try:
+            self.decode_queue.put_nowait((tx, now, now))
+        except asyncio.QueueFull:
+            self.stats.dropped += 1
+            return False
+        self.stats.received += 1
+        self.stats.fetched += 1
+        return True
+
+    # Expose counters, queue depths and stage latencies on a Metrics registry
+    def register_metrics(self, metrics):
+        for name in PipelineStats.__slots__:
+            metrics.counter(f"pipeline_{name}_total", lambda name=name: getattr(self.stats, name))
+        metrics.gauge("pipeline_intake_queue", self.intake_queue.qsize, "hashes waiting for a fetch worker")
+        metrics.gauge("pipeline_decode_queue", self.decode_queue.qsize, "transactions waiting to be decoded")
+        metrics.gauge("pipeline_handle_queue", self.handle_queue.qsize, "decoded transactions waiting for a handler")
+        for stage, histogram in self.latency.items():
+            metrics.histogram(f"pipeline_{stage}_seconds", histogram)
+
+    def backlog(self):
+        return self.intake_queue.qsize() + self.decode_queue.qsize() + self.handle_queue.qsize()
+
+    async def _fetch_worker(self):
+        while True:
+            tx_hash, seen = await self.intake_queue.get()
+            try:
+                started = time.perf_counter_ns()
+                self.latency['queue'].record((started - seen) // 1000)
+                tx = await self.fetch(tx_hash)
+                fetched = time.perf_counter_ns()
+                self.latency['fetch'].record((fetched - started) // 1000)
+                if tx is None:
+                    self.stats.missing += 1
+                elif self.accept is not None and not self.accept(tx):
+                    self.stats.filtered += 1
+                else:
+                    self.stats.fetched += 1
+                    await self.decode_queue.put((tx, seen, fetched))
+            except Exception as e:
+                self.stats.errors += 1
+                log_fatal(f"txhash={tx_hash} fetch error {str(e)}")
+            finally:
+                self.intake_queue.task_done()
+
+    async def _decode_worker(self):
+        while True:
+            tx, seen, fetched = await self.decode_queue.get()
+            try:
+                decoded = self.decode(tx)
+                if decoded is None:
+                    self.stats.skipped += 1
+                else:
+                    self.stats.decoded += 1
+                    now = time.perf_counter_ns()
+                    self.latency['decode'].record((now - fetched) // 1000)
+                    self.latency['seen_to_decoded'].record((now - seen) // 1000)
+                    await self.handle_queue.put((tx, decoded, seen, now))
+            except ValueError as e:
+                self._malformed(tx, e)
+            except Exception as e:
+                self.stats.errors += 1
+                log_fatal(f"txhash={to_hex_str(tx.get('hash', b''))} decode error {str(e)}")
+            finally:
+                self.decode_queue.task_done()
+
+    def _malformed(self, tx, error):
+        self.stats.malformed += 1
+        log_debug(f"txhash={to_hex_str(tx.get('hash', b''))} dropped, {type(error).__name__}: {str(error)}")
+
+    # Takes whatever is queued, up to decode_batch_size, so batches stay small when traffic is light
+    async def _batch_decode_worker(self):
+        while True:
+            items = [await self.decode_queue.get()]
+            while len(items) < self.decode_batch_size and not self.decode_queue.empty():
+                items.append(self.decode_queue.get_nowait())
+            try:
+                results = await self.decode_batch([tx for tx, _, _ in items])
+                now = time.perf_counter_ns()
+                for (tx, seen, fetched), decoded in zip(items, results):
+                    if isinstance(decoded, ValueError):
+                        self._malformed(tx, decoded)
+                    elif isinstance(decoded, Exception):
+                        self.stats.errors += 1
+                        log_fatal(f"txhash={to_hex_str(tx.get('hash', b''))} decode error {str(decoded)}")
+                    elif decoded is None:
+                        self.stats.skipped += 1
+                    else:
+                        self.stats.decoded += 1
+                        self.latency['decode'].record((now - fetched) // 1000)
+                        self.latency['seen_to_decoded'].record((now - seen) // 1000)
+                        await self.handle_queue.put((tx, decoded, seen, now))
+            except Exception as e:
+                self.stats.errors += len(items)
+                log_fatal(f"decode batch of {len(items)} error {type(e).__name__}: {str(e)}")
+            finally:
+                for _ in items:
+                    self.decode_queue.task_done()
+
+    async def _handle_worker(self):
+        while True:
+            tx, decoded, seen, decoded_at = await self.handle_queue.get()
+            try:
+                await self.handle(tx, decoded)
+                self.stats.handled += 1
+                now = time.perf_counter_ns()
+                self.latency['handle'].record((now - decoded_at) // 1000)
+                self.latency['end_to_end'].record((now - seen) // 1000)
+            except Exception as e:
+                self.stats.errors += 1
+                log_fatal(f"txhash={to_hex_str(tx.get('hash', b''))} error {str(e)}")
+            finally:
+                self.handle_queue.task_done()
+
+    def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._fetch_worker()) for _ in range(self.fetch_workers)]
+        if self.decode_batch is not None:
+            self._tasks += [asyncio.create_task(self._batch_decode_worker()) for _ in range(self.decode_workers)]
+        else:
+            self._tasks.append(asyncio.create_task(self._decode_worker()))
+        self._tasks += [asyncio.create_task(self._handle_worker()) for _ in range(self.handler_workers)]
+
+    # Wait for everything already submitted to go through every stage
+    async def join(self):
+        await self.intake_queue.join()
+        await self.decode_queue.join()
+        await self.handle_queue.join()
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
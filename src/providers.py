@@ -0,0 +1,286 @@
+# providers.py
+
+import asyncio
+import time
+from collections.abc import Mapping
+
+from src.logs import *
+from src.batch import RpcBatcher
+from src.metrics import Histogram
+from src.utils import to_data_bytes
+from src.wsrpc import WebSocketRpc
+
+
+# Bounded first-seen cache: a dict for lookups and a ring buffer of its keys for eviction
+# Once `maxsize` hashes are stored, adding one forgets the oldest, so memory stays flat however
+# long the bot runs. Values are (time.perf_counter_ns() of the first sighting, provider name).
+class SeenCache:
+    def __init__(self, maxsize=65536):
+        self.maxsize = max(1, int(maxsize))
+        self._first_seen = {}
+        self._ring = [None] * self.maxsize
+        self._next = 0
+
+    def __len__(self):
+        return len(self._first_seen)
+
+    def __contains__(self, key):
+        return key in self._first_seen
+
+    def get(self, key):
+        return self._first_seen.get(key)
+
+    # Only called for keys not in the cache, so every ring slot holds a distinct key
+    def add(self, key, value):
+        evicted = self._ring[self._next]
+        if evicted is not None:
+            del self._first_seen[evicted]
+        self._ring[self._next] = key
+        self._next = (self._next + 1) % self.maxsize
+        self._first_seen[key] = value
+
+
+# One WebSocket provider feeding the pool, reconnected with exponential backoff whenever it drops
+#
+# `lag` holds how far behind the first sighting (across all providers) this one delivered each
+# pending transaction, in microseconds, 0 when it was first. `score` is a moving average of it.
+class ProviderFeed:
+    def __init__(self, name, url, pool):
+        self.name = name
+        self.url = url
+        self.pool = pool
+        self.client = None
+        self.rpc = None
+        self.connected = False
+        self.score = None  # EWMA of the first-seen lag in us, None until something was seen
+        self.lag = Histogram()
+        self.first = 0  # transactions this provider delivered first
+        self.seen = 0  # transactions delivered, duplicates included
+        self.reconnects = 0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def record_lag(self, lag_us: int):
+        self.lag.record(lag_us)
+        alpha = self.pool.score_alpha
+        self.score = lag_us if self.score is None else self.score + alpha * (lag_us - self.score)
+
+    # A WebSocketRpc rather than web3, which would take about 1.4s to import before the first subscription
+    async def _connect(self):
+        client = WebSocketRpc(self.url)
+        await client.connect()
+        self.client = client
+        self.rpc = RpcBatcher.from_config(client, self.pool.batch_config) if self.pool.batch_config else client
+        self.connected = True
+        log_info(f"provider={self.name} Connected to RPC by WebSocket")
+
+    async def _disconnect(self):
+        self.connected = False
+        client, self.client, self.rpc = self.client, None, None
+        if client is not None:
+            try:
+                await client.disconnect()
+            except Exception:
+                pass
+
+    async def _run(self):
+        delay = self.pool.reconnect_delay
+        while True:
+            try:
+                await self._connect()
+                delay = self.pool.reconnect_delay
+                subscription_id = None
+                if self.pool.source == "subscription":
+                    subscription_id = await self._subscribe_pending()
+                if subscription_id is not None:
+                    heads_id = None
+                    if self.pool.on_head is not None:
+                        try:
+                            heads_id = await self.client.subscribe("newHeads")
+                        except Exception as e:
+                            log_error(f"provider={self.name} newHeads subscription failed {str(e)}")
+                    await self._subscription_loop(subscription_id, heads_id)
+                else:
+                    await self._filter_loop()
+            except asyncio.CancelledError:
+                await self._disconnect()
+                raise
+            except Exception as e:
+                log_error(f"provider={self.name} Connection lost ({type(e).__name__}: {str(e)}), reconnecting in {delay}s")
+            await self._disconnect()
+            self.reconnects += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.pool.max_reconnect_delay)
+
+    # Nodes without the full-transaction variant get the hash-only subscription (the hashes are
+    # fetched by the pipeline), nodes without subscriptions at all are polled. None when polling.
+    async def _subscribe_pending(self):
+        if self.pool.full_transactions:
+            try:
+                return await self.client.subscribe("newPendingTransactions", True)
+            except Exception as e:
+                log_warn(f"provider={self.name} Full-transaction subscription failed ({str(e)}), subscribing to hashes")
+        try:
+            return await self.client.subscribe("newPendingTransactions")
+        except Exception as e:
+            log_error(f"provider={self.name} Subscription failed ({str(e)}), falling back to filter polling")
+        return None
+
+    # A socket that is open but silent for `stall_timeout` seconds is treated as dropped
+    # Both subscriptions share the socket, new heads are told apart by their subscription id.
+    async def _subscription_loop(self, subscription_id, heads_id=None):
+        log_info(f"provider={self.name} Subscribed to newPendingTransactions "
+                 f"(full_transactions={self.pool.full_transactions}): {subscription_id}")
+        loop = asyncio.get_running_loop()
+        async with asyncio.timeout(self.pool.stall_timeout) as deadline:
+            async for response in self.client.subscriptions():
+                deadline.reschedule(loop.time() + self.pool.stall_timeout)
+                if heads_id is not None and response.get("subscription") == heads_id:
+                    self.pool.receive_head(self, response["result"]["hash"])
+                else:
+                    self.pool.receive(self, response["result"])
+
+    async def _filter_loop(self):
+        client = self.client
+        pending_filter = await client.request("eth_newPendingTransactionFilter", [])
+        block_filter = await client.request("eth_newBlockFilter", []) if self.pool.on_head is not None else None
+        while True:
+            for tx_hash in await client.request("eth_getFilterChanges", [pending_filter]):
+                self.pool.receive(self, tx_hash)
+            if block_filter is not None:
+                for block_hash in await client.request("eth_getFilterChanges", [block_filter]):
+                    self.pool.receive_head(self, block_hash)
+            await asyncio.sleep(self.pool.poll_interval)
+
+
+# Fan-in over every configured provider
+#
+# All providers stream pending transactions at once, the first copy of each one is handed to
+# `on_pending` (a hash, or a raw transaction object when full bodies are subscribed) and later
+# copies only update the latency scores. When `on_head` is set, every provider follows new blocks
+# as well and it is called with the hash of each one, once per provider that announced it. Reads go through `rpc`, which forwards every call to
+# the healthy provider delivering transactions the earliest.
+class ProviderPool:
+    def __init__(self, urls: dict, on_pending=None, source="subscription", full_transactions=True,
+                 batch_config=None, seen_cache_size=65536, score_alpha=0.05, stall_timeout=60,
+                 reconnect_delay=1, max_reconnect_delay=30, on_head=None, poll_interval=0.1):
+        self.on_pending = on_pending
+        self.on_head = on_head  # read when a provider connects, set it before start()
+        self.source = source
+        self.full_transactions = full_transactions
+        self.batch_config = batch_config  # RpcBatcher settings, None to send every request on its own
+        self.score_alpha = score_alpha
+        self.stall_timeout = stall_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.poll_interval = poll_interval  # seconds between two filter polls, providers without subscriptions
+        self.seen = SeenCache(seen_cache_size)
+        self.duplicates = 0
+        self.feeds = [ProviderFeed(name, url, self) for name, url in urls.items() if url]
+        if not self.feeds:
+            raise ValueError("No provider URL configured")
+        self.rpc = _BestRpc(self)
+
+    @classmethod
+    def from_config(cls, urls, config, on_pending=None, source="subscription", full_transactions=True, batch_config=None):
+        return cls(
+            urls,
+            on_pending=on_pending,
+            source=source,
+            full_transactions=full_transactions,
+            batch_config=batch_config,
+            seen_cache_size=config.get("seen_cache_size", 65536),
+            score_alpha=config.get("score_alpha", 0.05),
+            stall_timeout=config.get("stall_timeout", 60),
+            reconnect_delay=config.get("reconnect_delay", 1),
+            max_reconnect_delay=config.get("max_reconnect_delay", 30),
+            poll_interval=config.get("poll_interval", 0.1),
+        )
+
+    def start(self):
+        for feed in self.feeds:
+            feed.start()
+
+    def stop(self):
+        for feed in self.feeds:
+            feed.stop()
+
+    async def wait_connected(self, timeout=None) -> bool:
+        async def any_connected():
+            while not any(feed.connected for feed in self.feeds):
+                await asyncio.sleep(0.05)
+        try:
+            await asyncio.wait_for(any_connected(), timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    # Connected provider with the lowest first-seen lag, providers without a score yet come after
+    # the scored ones in configuration order. Falls back to the first provider when none is connected.
+    def best(self) -> ProviderFeed:
+        best = None
+        for feed in self.feeds:
+            if not feed.connected:
+                continue
+            if best is None or (feed.score is not None and (best.score is None or feed.score < best.score)):
+                best = feed
+        return best if best is not None else self.feeds[0]
+
+    def receive(self, feed: ProviderFeed, result):
+        now = time.perf_counter_ns()
+        feed.seen += 1
+        key = to_data_bytes(result["hash"] if isinstance(result, Mapping) else result)
+        first_seen = self.seen.get(key)
+        if first_seen is None:
+            self.seen.add(key, (now, feed.name))
+            feed.first += 1
+            feed.record_lag(0)
+            if self.on_pending is not None:
+                self.on_pending(result)
+            return
+        self.duplicates += 1
+        first_ns, first_name = first_seen
+        if first_name != feed.name:
+            feed.record_lag((now - first_ns) // 1000)
+
+    def receive_head(self, feed: ProviderFeed, block_hash):
+        if self.on_head is not None:
+            self.on_head(block_hash)
+
+    def register_metrics(self, metrics):
+        metrics.counter("provider_duplicates_total", lambda: self.duplicates, "pending transactions already seen from another provider")
+        metrics.gauge("provider_seen_cache_size", lambda: len(self.seen), "hashes held by the deduplication cache")
+        for feed in self.feeds:
+            name = feed.name
+            metrics.gauge(f"provider_{name}_connected", lambda feed=feed: int(feed.connected), f"{name} socket is open")
+            metrics.counter(f"provider_{name}_first_total", lambda feed=feed: feed.first, f"pending transactions {name} delivered first")
+            metrics.counter(f"provider_{name}_seen_total", lambda feed=feed: feed.seen, f"pending transactions delivered by {name}")
+            metrics.counter(f"provider_{name}_reconnects_total", lambda feed=feed: feed.reconnects, f"{name} reconnections")
+            metrics.histogram(f"provider_{name}_first_seen_lag_seconds", feed.lag, "delay behind the first provider to deliver a transaction")
+
+    def summary(self) -> str:
+        return ' '.join(
+            f"{feed.name}(connected={feed.connected} first={feed.first}/{feed.seen} "
+            f"score={'-' if feed.score is None else f'{feed.score:.0f}us'})"
+            for feed in self.feeds
+        )
+
+
+# Attribute access is resolved on every call, so each request goes to the provider that is best right now
+class _BestRpc:
+    def __init__(self, pool):
+        self._pool = pool
+
+    def __getattr__(self, name):
+        rpc = self._pool.best().rpc
+        if rpc is None:
+            raise ConnectionError("No provider connected")
+        return getattr(rpc, name)
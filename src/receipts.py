@@ -0,0 +1,90 @@
+# receipts.py
+
+import asyncio
+
+from src.logs import *
+from src.utils import to_data_bytes, to_hex_str, to_quantity
+
+
+# Resolves receipt futures for any number of outstanding transactions from one newHeads subscription
+#
+# Each new block body (transaction hashes only) is scanned once against the tracked hashes, and a
+# receipt is requested only for the ones it contains, instead of polling every hash until it mines.
+# Functions in `block_callbacks` are called with each new block number (e.g. GasOracle.on_new_block).
+class ReceiptTracker:
+    def __init__(self, w3):
+        self.w3 = w3
+        self.block_number = None
+        self.block_callbacks = []
+        self.subscription_id = None
+        self._waiting = {}  # tx hash bytes -> asyncio.Future
+        self._task = None
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self.subscription_id = await self.w3.eth.subscribe("newHeads")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.subscription_id is not None:
+            await self.w3.eth.unsubscribe(self.subscription_id)
+            self.subscription_id = None
+
+    # Register a hash before it is broadcast, so a block arriving right after the send can't be missed
+    def track(self, tx_hash) -> asyncio.Future:
+        key = to_data_bytes(tx_hash)
+        future = self._waiting.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._waiting[key] = future
+        return future
+
+    def forget(self, tx_hash):
+        future = self._waiting.pop(to_data_bytes(tx_hash), None)
+        if future is not None and not future.done():
+            future.cancel()
+
+    async def wait(self, tx_hash, timeout=None):
+        try:
+            return await asyncio.wait_for(asyncio.shield(self.track(tx_hash)), timeout)
+        finally:
+            self._waiting.pop(to_data_bytes(tx_hash), None)
+
+    async def _run(self):
+        async for response in self.w3.socket.process_subscriptions():
+            if response.get("subscription") != self.subscription_id:
+                continue
+            try:
+                await self._on_head(response["result"])
+            except Exception as e:
+                log_error(f"newHeads handling failed {str(e)}")
+
+    async def _on_head(self, head):
+        number = to_quantity(head["number"])
+        # scan any block skipped since the previous head as well
+        first = number if self.block_number is None else min(self.block_number + 1, number)
+        self.block_number = number
+        for callback in self.block_callbacks:
+            callback(number)
+        if not self._waiting:
+            return
+        for block_number in range(first, number + 1):
+            block = await self.w3.eth.get_block(block_number)
+            mined = [to_data_bytes(h) for h in block["transactions"] if to_data_bytes(h) in self._waiting]
+            if not mined:
+                continue
+            receipts = await asyncio.gather(
+                *(self.w3.eth.get_transaction_receipt(to_hex_str(h)) for h in mined), return_exceptions=True
+            )
+            for tx_hash, receipt in zip(mined, receipts):
+                future = self._waiting.pop(tx_hash, None)
+                if future is None or future.done():
+                    continue
+                if isinstance(receipt, Exception):
+                    future.set_exception(receipt)
+                else:
+                    future.set_result(receipt)
@@ -0,0 +1,143 @@
+# reconcile.py
+
+import asyncio
+from collections import deque
+from collections.abc import Mapping
+
+from src.logs import *
+from src.pending import PendingTxStore
+from src.utils import to_data_bytes, to_hex_str, to_quantity
+
+
+# Keeps a PendingTxStore in step with the chain, one block at a time
+#
+# Each new head (hash from the providers' newHeads subscriptions, see ProviderPool.on_head) is
+# fetched once with its transaction hashes and reconciled in bulk:
+# - mined: held records are removed, and the hash is remembered for `mined_blocks` blocks, so
+#   "is this still pending?" is a set lookup and late copies from the mempool are recognised
+# - replaced: held records of a mined sender with a lower nonce can never be mined anymore. With
+#   `full_blocks` the bodies are fetched instead, so a held record replaced by a transaction this
+#   bot never saw (same sender and nonce, another hash) is caught as well
+# - stale: records older than the store's ttl are evicted
+# Blocks skipped between two heads are fetched by number. Reorgs are not undone, transactions of
+# an orphaned block come back through the mempool once `mined_blocks` blocks have passed.
+class PendingReconciler:
+    def __init__(self, store: PendingTxStore, full_blocks=False, mined_blocks=64):
+        self.store = store
+        self.full_blocks = full_blocks
+        self.mined_blocks = max(1, int(mined_blocks))
+        self.block_number = None  # last block reconciled
+        self.mined = {}  # tx hash -> number of the block it was mined in, last `mined_blocks` blocks
+        self.blocks = 0
+        self.mined_held = 0  # held records removed because they were mined
+        self.replaced = 0  # held records removed because their sender's nonce was used by another transaction
+        self.failures = 0
+        self._recent = deque()  # (block hash, block number, tx hashes), oldest first
+        self._block_hashes = set()  # block hashes reconciled or queued
+        self._queue = None
+        self._task = None
+        self._rpc = None
+
+    @classmethod
+    def from_config(cls, config, store):
+        return cls(store, config.get("full_blocks", False), config.get("mined_blocks", 64))
+
+    # Whether `tx_hash` was mined in one of the last `mined_blocks` blocks
+    def is_mined(self, tx_hash) -> bool:
+        return to_data_bytes(tx_hash) in self.mined
+
+    # `rpc` exposes get_block, an RpcBatcher, w3.eth or ProviderPool.rpc
+    def start(self, rpc):
+        self._rpc = rpc
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # ProviderPool.on_head, called with the hash of each new block by every provider announcing it
+    def on_head(self, block_hash):
+        block_hash = to_data_bytes(block_hash)
+        if block_hash in self._block_hashes or self._queue is None:
+            return
+        self._block_hashes.add(block_hash)
+        self._queue.put_nowait(block_hash)
+
+    async def _run(self):
+        while True:
+            block_hash = await self._queue.get()
+            try:
+                block = await self._rpc.get_block(block_hash, self.full_blocks)
+                if block is None:
+                    raise ValueError("unknown block")
+                number = to_quantity(block['number'])
+                if self.block_number is not None and number > self.block_number + 1:
+                    await self._catch_up(number)
+                self.apply_block(block_hash, number, block['transactions'])
+            except Exception as e:
+                self.failures += 1
+                # let another provider's announcement of the same block retry it
+                self._block_hashes.discard(block_hash)
+                log_error(f"block={to_hex_str(block_hash)} Reconciliation failed {str(e)}")
+
+    async def _catch_up(self, number):
+        for skipped in range(max(self.block_number + 1, number - self.mined_blocks), number):
+            block = await self._rpc.get_block(skipped, self.full_blocks)
+            if block is not None:
+                block_hash = to_data_bytes(block['hash'])
+                self._block_hashes.add(block_hash)
+                self.apply_block(block_hash, skipped, block['transactions'])
+
+    # Reconcile the store with one block, `transactions` are hashes or bodies
+    def apply_block(self, block_hash: bytes, number: int, transactions):
+        store = self.store
+        hashes = []
+        for tx in transactions:
+            if isinstance(tx, Mapping):
+                tx_hash = to_data_bytes(tx['hash'])
+                held = store.get_by_sender(tx['from'], to_quantity(tx['nonce']))
+                if held is not None and held.hash != tx_hash:
+                    store.remove(held.hash)
+                    self.replaced += 1
+            else:
+                tx_hash = to_data_bytes(tx)
+            hashes.append(tx_hash)
+            self.mined[tx_hash] = number
+            record = store.remove(tx_hash)
+            if record is not None:
+                self.mined_held += 1
+                self._drop_lower_nonces(record.sender, record.nonce)
+
+        self._recent.append((block_hash, number, hashes))
+        while len(self._recent) > self.mined_blocks:
+            old_hash, old_number, old_hashes = self._recent.popleft()
+            self._block_hashes.discard(old_hash)
+            for tx_hash in old_hashes:
+                if self.mined.get(tx_hash) == old_number:
+                    del self.mined[tx_hash]
+        self.block_number = number if self.block_number is None else max(self.block_number, number)
+        self.blocks += 1
+        store.evict()
+
+    # Nonces below a mined one are used, walk down until the sender has no record for one
+    def _drop_lower_nonces(self, sender, nonce):
+        store = self.store
+        while nonce > 0:
+            nonce -= 1
+            held = store.by_sender.get((sender, nonce))
+            if held is None:
+                return
+            store.remove(held.hash)
+            self.replaced += 1
+
+    def register_metrics(self, metrics):
+        metrics.gauge("reconciler_block_number", lambda: self.block_number or 0, "last block reconciled with the pending store")
+        metrics.gauge("reconciler_mined_hashes", lambda: len(self.mined), "hashes of recently mined transactions held")
+        metrics.counter("reconciler_blocks_total", lambda: self.blocks, "blocks reconciled")
+        metrics.counter("reconciler_mined_total", lambda: self.mined_held, "pending transactions removed once mined")
+        metrics.counter("reconciler_replaced_total", lambda: self.replaced, "pending transactions removed because their nonce was used")
+        metrics.counter("reconciler_failures_total", lambda: self.failures, "blocks that could not be fetched")
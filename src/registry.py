@@ -0,0 +1,257 @@
+# registry.py
+
+import asyncio
+import atexit
+import sqlite3
+from decimal import Decimal
+from typing import NamedTuple
+
+from src.logs import *
+from src.abi import selector
+from src.filters import normalize_address
+from src.pairs import PairResolver, sort_tokens
+from src.utils import to_checksum_address, to_hex_str
+
+DECIMALS_SELECTOR = selector('ERC20', 'decimals')
+SYMBOL_SELECTOR = selector('ERC20', 'symbol')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tokens (
+    address BLOB PRIMARY KEY,
+    decimals INTEGER,
+    symbol TEXT
+);
+CREATE TABLE IF NOT EXISTS pairs (
+    pair BLOB PRIMARY KEY,
+    factory BLOB NOT NULL,
+    token0 BLOB NOT NULL,
+    token1 BLOB NOT NULL
+);
+"""
+
+
+# Metadata of a token, `decimals` is None for addresses that don't answer decimals() (not an ERC20)
+class TokenInfo(NamedTuple):
+    address: bytes
+    decimals: int | None
+    symbol: str | None
+
+
+# symbol() returns a string on most tokens and a bytes32 on a few old ones (MKR, SAI)
+def decode_symbol(output: bytes) -> str | None:
+    if len(output) == 32:
+        return output.rstrip(b'\x00').decode('utf-8', 'replace') or None
+    if len(output) < 64:
+        return None
+    offset = int.from_bytes(output[:32], 'big')
+    if offset + 32 > len(output):
+        return None
+    length = int.from_bytes(output[offset:offset + 32], 'big')
+    if offset + 32 + length > len(output):
+        return None
+    return output[offset + 32:offset + 32 + length].decode('utf-8', 'replace')
+
+
+# Token metadata and pair registry, persisted in a SQLite file
+#
+# - open() loads the whole file into dicts, every lookup afterwards is a dict access
+# - an unknown token is queued and None returned, the background task started by start()
+#   reads decimals() and symbol() of the queued tokens `batch_size` at a time (one JSON-RPC
+#   batch through RpcBatcher) and stores them
+# - pairs are derived with the PairResolver, their token0/token1 order stored with them
+# - rows are written from a worker thread, so the event loop never waits on the disk
+class TokenRegistry:
+    def __init__(self, path, resolver=None, batch_size=50, flush_interval=0.05, max_attempts=3):
+        self.path = path
+        self.resolver = resolver or PairResolver()
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.tokens = {}  # address -> TokenInfo
+        self.pairs = {}  # pair address -> (factory, token0, token1)
+        self.resolved = 0  # tokens read from the chain since startup
+        self.failures = 0  # metadata reads that raised
+        self._queue = {}  # address -> failed attempts, in arrival order
+        self._resolving = set()
+        self._given_up = set()  # failed max_attempts times, retried after a restart
+        self._new_tokens = []
+        self._new_pairs = []
+        self._db = None
+        self._rpc = None
+        self._task = None
+        self._wakeup = None
+
+    @classmethod
+    def from_config(cls, config, resolver=None):
+        return cls(
+            config.get("path", "registry.sqlite3"),
+            resolver,
+            batch_size=config.get("batch_size", 50),
+            flush_interval=config.get("flush_interval_ms", 50) / 1000,
+            max_attempts=config.get("max_attempts", 3),
+        )
+
+    def open(self):
+        if self._db is not None:
+            return
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        for address, decimals, symbol in self._db.execute("SELECT address, decimals, symbol FROM tokens"):
+            self.tokens[address] = TokenInfo(address, decimals, symbol)
+        for pair, factory, token0, token1 in self._db.execute("SELECT pair, factory, token0, token1 FROM pairs"):
+            self.pairs[pair] = (factory, token0, token1)
+        atexit.register(self.close)
+        log_info(f"Token registry {self.path}: {len(self.tokens)} tokens, {len(self.pairs)} pairs")
+
+    # `rpc` exposes call(transaction) -> bytes: w3.eth, an RpcBatcher or ProviderPool.rpc
+    def start(self, rpc):
+        self.open()
+        self._rpc = rpc
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            if self._queue:
+                self._wakeup.set()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.close()
+
+    def close(self):
+        if self._db is None:
+            return
+        self._write(*self._take_rows())
+        self._db.close()
+        self._db = None
+
+    # Never waits: the cached metadata, or None after queueing the token for the background task
+    def token(self, address) -> TokenInfo | None:
+        address = normalize_address(address)
+        info = self.tokens.get(address)
+        if info is None:
+            self._enqueue(address)
+        return info
+
+    def _enqueue(self, address):
+        if address in self._queue or address in self._resolving or address in self._given_up:
+            return
+        self._queue[address] = 0
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # Pair of two tokens through the resolver, returns (pair, token0, token1) and records it
+    def pair(self, factory, token_a, token_b) -> tuple[bytes, bytes, bytes]:
+        factory = normalize_address(factory)
+        pair = self.resolver.pair_address(factory, token_a, token_b)
+        known = self.pairs.get(pair)
+        if known is not None:
+            return pair, known[1], known[2]
+        token0, token1 = sort_tokens(normalize_address(token_a), normalize_address(token_b))
+        self.pairs[pair] = (factory, token0, token1)
+        self._new_pairs.append((pair, factory, token0, token1))
+        return pair, token0, token1
+
+    # Queue the metadata of every token on a swap path and record its pairs
+    def watch_path(self, path, factory):
+        for token in path:
+            self.token(token)
+        for token_a, token_b in zip(path, path[1:]):
+            self.pair(factory, token_a, token_b)
+
+    def label(self, address) -> str:
+        info = self.token(address)
+        if info is not None and info.symbol:
+            return info.symbol
+        return to_hex_str(address)[:10]
+
+    # Token amount in whole units when the decimals are known, the raw integer otherwise
+    def format_amount(self, address, amount: int) -> str:
+        info = self.token(address)
+        if info is None or info.decimals is None:
+            return str(amount)
+        return str(Decimal(amount).scaleb(-info.decimals))
+
+    # Awaits the metadata when it is not cached, for callers off the hot path (contracts/dex.py)
+    async def resolve(self, address, rpc=None) -> TokenInfo | None:
+        address = normalize_address(address)
+        info = self.tokens.get(address)
+        if info is None:
+            info = await self._fetch(address, rpc or self._rpc)
+            if info is not None:
+                self._store(info)
+        return info
+
+    async def _fetch(self, address, rpc) -> TokenInfo | None:
+        to = to_checksum_address(address)
+        decimals_output, symbol_output = await asyncio.gather(
+            rpc.call({'to': to, 'data': to_hex_str(DECIMALS_SELECTOR)}),
+            rpc.call({'to': to, 'data': to_hex_str(SYMBOL_SELECTOR)}),
+            return_exceptions=True,
+        )
+        if isinstance(decimals_output, Exception):
+            # a revert and a dropped connection look the same from here, the caller retries
+            self.failures += 1
+            log_debug(f"token={to} decimals() failed {str(decimals_output)}")
+            return None
+        decimals_output = bytes(decimals_output)
+        decimals = int.from_bytes(decimals_output[:32], 'big') if len(decimals_output) >= 32 else None
+        if decimals is not None and decimals > 255:
+            decimals = None
+        symbol = None if isinstance(symbol_output, Exception) else decode_symbol(bytes(symbol_output))
+        return TokenInfo(address, decimals, symbol)
+
+    def _store(self, info: TokenInfo):
+        self.tokens[info.address] = info
+        self._new_tokens.append(tuple(info))
+        self.resolved += 1
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # let a burst of unknown tokens gather into one batch
+            await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            batch = []
+            while self._queue and len(batch) < self.batch_size:
+                address = next(iter(self._queue))
+                batch.append((address, self._queue.pop(address)))
+            self._resolving.update(address for address, _ in batch)
+            try:
+                results = await asyncio.gather(*(self._fetch(address, self._rpc) for address, _ in batch))
+            finally:
+                self._resolving.difference_update(address for address, _ in batch)
+            for (address, attempts), info in zip(batch, results):
+                if info is not None:
+                    self._store(info)
+                elif attempts + 1 < self.max_attempts:
+                    self._queue[address] = attempts + 1
+                else:
+                    self._given_up.add(address)
+                    log_warn(f"token={to_hex_str(address)} metadata unavailable after {self.max_attempts} attempts")
+            if self._new_tokens or self._new_pairs:
+                await asyncio.to_thread(self._write, *self._take_rows())
+            if self._queue:
+                self._wakeup.set()
+
+    # Taken on the event loop thread, written from the worker thread
+    def _take_rows(self):
+        tokens, self._new_tokens = self._new_tokens, []
+        pairs, self._new_pairs = self._new_pairs, []
+        return tokens, pairs
+
+    def _write(self, tokens, pairs):
+        if self._db is None or not (tokens or pairs):
+            return
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO tokens VALUES (?, ?, ?)", tokens)
+            self._db.executemany("INSERT OR IGNORE INTO pairs VALUES (?, ?, ?, ?)", pairs)
+
+    def register_metrics(self, metrics):
+        metrics.gauge("registry_tokens", lambda: len(self.tokens), "tokens with cached metadata")
+        metrics.gauge("registry_pairs", lambda: len(self.pairs), "pairs with cached token order")
+        metrics.gauge("registry_queued", lambda: len(self._queue), "tokens waiting for their metadata")
+        metrics.counter("registry_resolved_total", lambda: self.resolved, "token metadata read from the chain")
+        metrics.counter("registry_failures_total", lambda: self.failures, "token metadata reads that failed")
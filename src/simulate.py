@@ -0,0 +1,112 @@
+# simulate.py
+
+from typing import NamedTuple
+
+from src.amm import get_amount_in, get_amount_out
+from src.parse import RouterCall
+
+
+# Outcome of applying a pending swap to the pools along its path
+# - amounts: token amounts at each step of the path, amounts[0] in, amounts[-1] out
+# - reserves_before / reserves_after: (reserve_in, reserve_out) of each hop
+# - executed_price: amounts[-1] / amounts[0]
+# - spot_price: product of the hop mid prices before the swap
+# - price_impact: 1 - executed_price / spot_price, fee included
+# - reverts: True when the router would revert on the sender's slippage limit
+class SwapSimulation(NamedTuple):
+    method: str
+    path: tuple
+    amounts: list
+    reserves_before: list
+    reserves_after: list
+    executed_price: float
+    spot_price: float
+    price_impact: float
+    reverts: bool
+
+
+# method -> (exact input?, name of the amount argument, name of the limit argument)
+# ETH-in methods take the amount or the limit from msg.value instead of an argument.
+SWAP_KINDS = {
+    'swapExactTokensForTokens': (True, 'amountIn', 'amountOutMin'),
+    'swapExactTokensForETH': (True, 'amountIn', 'amountOutMin'),
+    'swapExactETHForTokens': (True, None, 'amountOutMin'),
+    'swapTokensForExactTokens': (False, 'amountOut', 'amountInMax'),
+    'swapTokensForExactETH': (False, 'amountOut', 'amountInMax'),
+    'swapETHForExactTokens': (False, 'amountOut', None),
+    # fee-on-transfer tokens are simulated as if they had no transfer tax
+    'swapExactTokensForTokensSupportingFeeOnTransferTokens': (True, 'amountIn', 'amountOutMin'),
+    'swapExactTokensForETHSupportingFeeOnTransferTokens': (True, 'amountIn', 'amountOutMin'),
+    'swapExactETHForTokensSupportingFeeOnTransferTokens': (True, None, 'amountOutMin'),
+}
+
+
+# No hop from a token to itself, UniswapV2Library.sortTokens reverts with IDENTICAL_ADDRESSES
+def valid_path(path) -> bool:
+    return all(token_in != token_out for token_in, token_out in zip(path, path[1:]))
+
+
+# Collect (reserve_in, reserve_out) along the path, None if any hop is not cached.
+# `reserves_of(token_a, token_b)` returns (reserve_a, reserve_b, ...) like PairCache.get_reserves.
+def path_reserves(path, reserves_of):
+    reserves = []
+    for token_in, token_out in zip(path, path[1:]):
+        hop = reserves_of(token_in, token_out)
+        if hop is None:
+            return None
+        reserves.append((hop[0], hop[1]))
+    return reserves
+
+
+# Apply a decoded swap to the cached reserves, `value` is the transaction's msg.value.
+# Returns None for non-swap calls, unknown pools or swaps the router would reject outright
+# (including paths through the same token twice in a row, which UniswapV2Library rejects).
+def simulate_swap(call: RouterCall, reserves_of, value: int = 0) -> SwapSimulation | None:
+    kind = SWAP_KINDS.get(call.method)
+    if kind is None:
+        return None
+    exact_in, amount_arg, limit_arg = kind
+    path = call.get('path')
+    if path is None or len(path) < 2 or not valid_path(path):
+        return None
+    reserves = path_reserves(path, reserves_of)
+    if reserves is None:
+        return None
+
+    amount = call.get(amount_arg) if amount_arg else value
+    limit = call.get(limit_arg) if limit_arg else value
+    try:
+        if exact_in:
+            amounts = [amount]
+            for reserve_in, reserve_out in reserves:
+                amounts.append(get_amount_out(amounts[-1], reserve_in, reserve_out))
+            reverts = amounts[-1] < limit
+        else:
+            amounts = [amount]
+            for reserve_in, reserve_out in reversed(reserves):
+                amounts.append(get_amount_in(amounts[-1], reserve_in, reserve_out))
+            amounts.reverse()
+            reverts = amounts[0] > limit
+    except ValueError:
+        return None
+
+    reserves_after = [
+        (reserve_in + amounts[i], reserve_out - amounts[i + 1])
+        for i, (reserve_in, reserve_out) in enumerate(reserves)
+    ]
+    spot_price = 1.0
+    for reserve_in, reserve_out in reserves:
+        spot_price *= reserve_out / reserve_in
+    executed_price = amounts[-1] / amounts[0]
+
+    return SwapSimulation(
+        method=call.method,
+        path=path,
+        amounts=amounts,
+        reserves_before=reserves,
+        reserves_after=reserves_after,
+        executed_price=executed_price,
+        spot_price=spot_price,
+        price_impact=1 - executed_price / spot_price,
+        reverts=reverts,
+    )
@@ -0,0 +1,189 @@
+# txbuilder.py
+
+from eth_abi import encode
+from eth_hash.auto import keccak
+from eth_keys import keys
+
+from src.abi import function_selectors
+from src.utils import to_data_bytes
+
+_ZERO_PADDING = bytes(12)
+_EMPTY_LIST = b'\xc0'  # RLP of an empty access list
+EIP1559_TX_TYPE = b'\x02'
+
+
+def _address_word(value) -> bytes:
+    address = to_data_bytes(value)
+    if len(address) != 20:
+        raise ValueError(f"Not a 20 byte address: {value!r}")
+    return _ZERO_PADDING + address
+
+
+def _uint_word(value) -> bytes:
+    return value.to_bytes(32, 'big')
+
+
+def _bool_word(value) -> bytes:
+    return _uint_word(1 if value else 0)
+
+
+def _bytes32_word(value) -> bytes:
+    data = to_data_bytes(value)
+    if len(data) > 32:
+        raise ValueError(f"bytes32 value of {len(data)} bytes")
+    return data.ljust(32, b'\x00')
+
+
+# uintN / intN encoders checking the value fits in N bits, like eth_abi does
+def _uint_encoder(bits: int):
+    limit = 1 << bits
+
+    def encode_uint(value) -> bytes:
+        if not 0 <= value < limit:
+            raise ValueError(f"{value} out of range for uint{bits}")
+        return value.to_bytes(32, 'big')
+    return encode_uint
+
+
+def _int_encoder(bits: int):
+    limit = 1 << (bits - 1)
+
+    def encode_int(value) -> bytes:
+        if not -limit <= value < limit:
+            raise ValueError(f"{value} out of range for int{bits}")
+        return value.to_bytes(32, 'big', signed=True)
+    return encode_int
+
+
+def _bits(abi_type: str, prefix: str) -> int | None:
+    size = abi_type[len(prefix):] or '256'
+    if not size.isdigit() or not 8 <= int(size) <= 256 or int(size) % 8:
+        return None
+    return int(size)
+
+
+# Encoder of a single-word type, None for anything else (fixed-size arrays, bytesN, tuples, ...)
+def _word_encoder(abi_type: str):
+    if abi_type == 'address':
+        return _address_word
+    if abi_type == 'bool':
+        return _bool_word
+    if abi_type == 'bytes32':
+        return _bytes32_word
+    if abi_type.startswith('uint'):
+        bits = _bits(abi_type, 'uint')
+        return _uint_encoder(bits) if bits else None
+    if abi_type.startswith('int'):
+        bits = _bits(abi_type, 'int')
+        return _int_encoder(bits) if bits else None
+    return None
+
+
+# Calldata encoder of one ABI function, built once from the ABI
+#
+# Arguments made of single words (address, bool, intN/uintN, bytes32) and dynamic arrays of them,
+# which covers the router and ERC20 methods, are packed directly. Anything else goes through eth_abi.
+# Values out of range for their type raise ValueError. `selector` comes precompiled from src.abi.
+class MethodEncoder:
+    __slots__ = ('method', 'signature', 'selector', 'types', '_words')
+
+    def __init__(self, method: str, types: tuple, selector: bytes):
+        self.method = method
+        self.types = types
+        self.signature = f"{method}({','.join(types)})"
+        self.selector = selector
+        # (word encoder, is array) per argument, None when some type needs eth_abi
+        words = []
+        for abi_type in types:
+            is_array = abi_type.endswith('[]')
+            word = _word_encoder(abi_type[:-2] if is_array else abi_type)
+            if word is None:
+                words = None
+                break
+            words.append((word, is_array))
+        self._words = words
+
+    def encode(self, *args) -> bytes:
+        if len(args) != len(self.types):
+            raise TypeError(f"{self.signature} takes {len(self.types)} arguments, got {len(args)}")
+        if self._words is None:
+            return self.selector + encode(self.types, args)
+        head = [self.selector]
+        tail = []
+        offset = 32 * len(args)
+        for (word, is_array), value in zip(self._words, args):
+            if is_array:
+                head.append(_uint_word(offset))
+                tail.append(_uint_word(len(value)))
+                tail.extend(word(v) for v in value)
+                offset += 32 * (len(value) + 1)
+            else:
+                head.append(word(value))
+        return b''.join(head) + b''.join(tail)
+
+
+# Method name -> MethodEncoder for a contract of contracts/abi/, the first definition wins for overloaded names
+def build_encoders(contract: str) -> dict:
+    encoders = {}
+    for selector, entry in function_selectors(contract).items():
+        if entry['name'] not in encoders:
+            encoders[entry['name']] = MethodEncoder(entry['name'], tuple(entry['types']), selector)
+    return encoders
+
+
+def _rlp_length(length: int, offset: int) -> bytes:
+    if length < 56:
+        return bytes((offset + length,))
+    encoded = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes((offset + 55 + len(encoded),)) + encoded
+
+
+def _rlp_bytes(value: bytes) -> bytes:
+    if len(value) == 1 and value[0] < 0x80:
+        return value
+    return _rlp_length(len(value), 0x80) + value
+
+
+def _rlp_int(value: int) -> bytes:
+    if value < 0:
+        raise ValueError(f"Negative transaction field {value}")
+    return _rlp_bytes(value.to_bytes((value.bit_length() + 7) // 8, 'big'))
+
+
+def _rlp_list(payload: bytes) -> bytes:
+    return _rlp_length(len(payload), 0xc0) + payload
+
+
+# Signs EIP-1559 transactions into raw bytes without web3, eth_account or any RPC call
+#
+# Transactions are the dicts build_transaction would return ('nonce', 'gas', 'maxFeePerGas',
+# 'maxPriorityFeePerGas', 'to', 'value', 'data', optional 'chainId'), so the nonce and fees
+# come from whatever local state the caller keeps (NonceManager, GasOracle).
+# The access list is always empty and extra keys such as 'from' are ignored.
+class RawTxBuilder:
+    def __init__(self, private_key, chain_id: int):
+        self.chain_id = chain_id
+        self._key = keys.PrivateKey(to_data_bytes(private_key))
+        self.address = self._key.public_key.to_checksum_address()
+
+    def _payload(self, tx: dict) -> bytes:
+        return b''.join((
+            _rlp_int(tx.get('chainId', self.chain_id)),
+            _rlp_int(tx['nonce']),
+            _rlp_int(tx['maxPriorityFeePerGas']),
+            _rlp_int(tx['maxFeePerGas']),
+            _rlp_int(tx['gas']),
+            _rlp_bytes(to_data_bytes(tx.get('to'))),
+            _rlp_int(tx.get('value', 0)),
+            _rlp_bytes(to_data_bytes(tx.get('data'))),
+            _EMPTY_LIST,
+        ))
+
+    # Returns (raw signed transaction, transaction hash)
+    def sign(self, tx: dict) -> tuple:
+        payload = self._payload(tx)
+        signature = self._key.sign_msg_hash(keccak(EIP1559_TX_TYPE + _rlp_list(payload)))
+        raw = EIP1559_TX_TYPE + _rlp_list(
+            payload + _rlp_int(signature.v) + _rlp_int(signature.r) + _rlp_int(signature.s)
+        )
+        return raw, keccak(raw)
@@ -1,12 +1,11 @@
-import os, json, random
-from web3.auto import w3
-
-def clear_console():
-    os.system('cls' if os.name == 'nt' else 'clear')
-
+import json, random
+from eth_hash.auto import keccak
 
+# eth_account pulls in most of web3's dependency tree, only the keystore helpers need it
 def generate_keystore(content, password):
-    keystore = w3.eth.account.encrypt(content, password)
+    from eth_account import Account
+
+    keystore = Account.encrypt(content, password)
     return keystore
 
 
@@ -18,11 +17,57 @@ def save_keystore(keystore, filename):
 def load_keystore(filename, password):
     with open(filename, 'r') as f:
         keystore = json.load(f)
+    from eth_account import Account
+
     try:
-        return w3.eth.account.decrypt(keystore, password)
+        return Account.decrypt(keystore, password)
     except ValueError:
         return random.getrandbits(256).to_bytes(32, 'big')
 
 
-def match_addresses(address: str, addresses: list[str]) -> bool:
-    return address.lower() in [a.lower() for a in addresses]
\ No newline at end of file
+# Transactions may come formatted by web3 (HexBytes) or raw from a subscription (hex strings)
+def to_data_bytes(data) -> bytes:
+    if data is None:
+        return b''
+    if isinstance(data, str):
+        return bytes.fromhex(data[2:] if data[:2] in ('0x', '0X') else data)
+    return bytes(data)
+
+
+# Quantities arrive as ints (formatted by web3) or hex strings (raw JSON-RPC objects), a missing one is 0
+def to_quantity(value) -> int:
+    if value is None:
+        return 0
+    return int(value, 16) if isinstance(value, str) else int(value)
+
+
+def to_hex_str(data) -> str:
+    if isinstance(data, str):
+        return data if data[:2] in ('0x', '0X') else '0x' + data
+    return '0x' + bytes(data).hex()
+
+
+# EIP-55 mixed case address, without going through eth_utils
+def to_checksum_address(address) -> str:
+    hex_address = to_data_bytes(address).hex()
+    digest = keccak(hex_address.encode()).hex()
+    return '0x' + ''.join(c.upper() if int(d, 16) >= 8 else c for c, d in zip(hex_address, digest))
+
+
+TX_QUANTITY_FIELDS = ('blockNumber', 'chainId', 'gas', 'gasPrice', 'maxFeePerGas', 'maxPriorityFeePerGas',
+                      'nonce', 'transactionIndex', 'type', 'v', 'value', 'yParity')
+TX_DATA_FIELDS = ('blockHash', 'hash', 'input', 'r', 's')
+
+
+# Turn a raw JSON-RPC transaction object (hex strings) into ints and bytes, addresses stay hex strings
+def format_transaction(tx: dict) -> dict:
+    tx = dict(tx)
+    for field in TX_QUANTITY_FIELDS:
+        value = tx.get(field)
+        if isinstance(value, str):
+            tx[field] = int(value, 16)
+    for field in TX_DATA_FIELDS:
+        value = tx.get(field)
+        if isinstance(value, str):
+            tx[field] = to_data_bytes(value)
+    return tx
@@ -0,0 +1,183 @@
+# workers.py
+
+import asyncio
+import multiprocessing
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+from src.logs import *
+from src.pairs import PairResolver
+from src.parse import parse_univ2_router_tx
+from src.simulate import simulate_swap
+from src.utils import to_data_bytes
+
+# One slot per pair: seqlock counter | pair address | reserve0 | reserve1 | block number
+# Reserves are uint112 on chain, stored as 16 little endian bytes. 64 bytes per slot.
+SLOT = struct.Struct('<I20s16s16sQ')
+SEQ = struct.Struct('<I')
+EMPTY_PAIR = bytes(20)
+
+
+# Fixed-layout reserve table in shared memory, written by the event loop process only and read by
+# the workers without any pickling or locking
+#
+# Pairs are placed by open addressing on their first 8 bytes (pair addresses are keccak output,
+# so already uniform), with linear probing. Each slot is guarded by a seqlock: the writer makes the
+# counter odd, writes, makes it even again, a reader retries until it saw the same even counter
+# before and after copying the slot. Pairs are never removed, a full table stops publishing new ones.
+class ReserveTable:
+    def __init__(self, shm: SharedMemory, capacity: int, owner: bool):
+        self.shm = shm
+        self.capacity = capacity
+        self.mask = capacity - 1
+        self.owner = owner  # the creating process unlinks the segment
+        self.full = False
+        self._buf = shm.buf
+        self._slots = {}  # pair -> slot offset, writer side only
+
+    @classmethod
+    def create(cls, capacity=65536):
+        if capacity <= 0 or capacity & (capacity - 1):
+            raise ValueError(f"Capacity must be a power of two, got {capacity}")
+        return cls(SharedMemory(create=True, size=capacity * SLOT.size), capacity, owner=True)
+
+    # Worker processes are spawned by the creator and share its resource tracker, which already
+    # knows the segment, so attaching doesn't make anyone but the creator unlink it
+    @classmethod
+    def attach(cls, name, capacity):
+        return cls(SharedMemory(name=name), capacity, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def __len__(self):
+        return len(self._slots)
+
+    def _find_free(self, pair: bytes) -> int | None:
+        index = int.from_bytes(pair[:8], 'little') & self.mask
+        for _ in range(self.capacity):
+            offset = index * SLOT.size
+            if self._buf[offset + 4:offset + 24] == EMPTY_PAIR:
+                return offset
+            index = (index + 1) & self.mask
+        return None
+
+    def publish(self, pair: bytes, reserve0: int, reserve1: int, block_number: int):
+        offset = self._slots.get(pair)
+        if offset is None:
+            # keep a free slot so readers probing for a missing pair always stop
+            if len(self._slots) >= self.capacity - 1:
+                if not self.full:
+                    self.full = True
+                    log_warn(f"Reserve table full ({self.capacity} pairs), new pairs are simulated on the event loop only")
+                return
+            offset = self._find_free(pair)
+            self._slots[pair] = offset
+        buf = self._buf
+        seq = SEQ.unpack_from(buf, offset)[0]
+        SEQ.pack_into(buf, offset, (seq + 1) & 0xFFFFFFFF)
+        SLOT.pack_into(buf, offset, (seq + 1) & 0xFFFFFFFF, pair, reserve0.to_bytes(16, 'little'),
+                       reserve1.to_bytes(16, 'little'), block_number)
+        SEQ.pack_into(buf, offset, (seq + 2) & 0xFFFFFFFF)
+
+    # (reserve0, reserve1, block_number) of a pair, None when it was never published
+    def get(self, pair: bytes):
+        buf = self._buf
+        unpack_from = SLOT.unpack_from
+        index = int.from_bytes(pair[:8], 'little') & self.mask
+        for _ in range(self.capacity):
+            offset = index * SLOT.size
+            while True:
+                seq, slot_pair, reserve0, reserve1, block_number = unpack_from(buf, offset)
+                if not seq & 1 and SEQ.unpack_from(buf, offset)[0] == seq:
+                    break
+            if slot_pair == pair:
+                return int.from_bytes(reserve0, 'little'), int.from_bytes(reserve1, 'little'), block_number
+            if slot_pair == EMPTY_PAIR:
+                return None
+            index = (index + 1) & self.mask
+        return None
+
+    def close(self):
+        self._buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# State of a worker process, set up once by _init_worker
+_table = None
+_resolver = None
+_factory = None
+
+
+def _init_worker(table_name, capacity, factory, factories, default_init_code_hash):
+    global _table, _resolver, _factory
+    _table = ReserveTable.attach(table_name, capacity)
+    _resolver = PairResolver(factories, default_init_code_hash)
+    _factory = to_data_bytes(factory)
+
+
+# Same contract as PairCache.get_reserves, read from the shared table
+def _reserves_of(token_a: bytes, token_b: bytes):
+    reserves = _table.get(_resolver.pair_address(_factory, token_a, token_b))
+    if reserves is None or token_a < token_b:
+        return reserves
+    return reserves[1], reserves[0], reserves[2]
+
+
+# Runs in a worker: decode each calldata and simulate the swaps against the shared reserves.
+# One entry per input: None when it is not a router call, (RouterCall, SwapSimulation or None)
+# otherwise, or the exception raised while decoding it.
+def decode_and_simulate(batch):
+    results = []
+    for tx_data, value in batch:
+        try:
+            call = parse_univ2_router_tx(tx_data) if len(tx_data) >= 4 else None
+            if call is None:
+                results.append(None)
+                continue
+            simulation = simulate_swap(call, _reserves_of, value) if call.is_swap else None
+            results.append((call, simulation))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+# Pool of worker processes doing the CPU-bound part of the pipeline: calldata decoding and swap simulation
+# The event loop only converts each batch to (calldata, value) pairs and awaits the result, so sockets
+# keep being served while the workers run. Workers are spawned, not forked, so they don't inherit the
+# loop's threads.
+class WorkerPool:
+    def __init__(self, table: ReserveTable, factory, resolver=None, processes=None):
+        resolver = resolver or PairResolver()
+        self.table = table
+        self.processes = processes or os.cpu_count() or 1
+        self.batches = 0
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(table.name, table.capacity, to_data_bytes(factory), resolver.init_code_hashes,
+                      resolver.default_init_code_hash),
+        )
+
+    @classmethod
+    def from_config(cls, config, table, factory, resolver=None):
+        return cls(table, factory, resolver, processes=config.get("processes"))
+
+    # Start every process now rather than on the first batch, each one imports the decoder (~0.3s)
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self._executor, decode_and_simulate, []) for _ in range(self.processes)))
+
+    async def decode_batch(self, txs) -> list:
+        batch = [(to_data_bytes(tx['input']), tx.get('value', 0)) for tx in txs]
+        self.batches += 1
+        return await asyncio.get_running_loop().run_in_executor(self._executor, decode_and_simulate, batch)
+
+    def stop(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
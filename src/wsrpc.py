@@ -0,0 +1,149 @@
+# wsrpc.py
+
+import asyncio
+import itertools
+import json
+
+from src.batch import RpcMethods
+
+
+# JSON-RPC over one WebSocket, without web3
+#
+# websockets imports in about 0.1s where web3 takes about 1.4s (eth_account and py_ecc), so the
+# mempool feed is subscribed before web3 would even be loaded. Requests are matched to their
+# responses by id, any number of them can be in flight. Subscription notifications are queued
+# for subscriptions() as {'subscription': id, 'result': ...}, the shape web3 yields them in.
+# send_batch_request / recv_for_batch_request are what RpcBatcher expects of a persistent provider.
+class WebSocketRpc(RpcMethods):
+    def __init__(self, url):
+        self.url = url
+        self._socket = None
+        self._reader = None
+        self._ids = itertools.count(1)
+        self._waiting = {}  # request id -> Future of its response, every id of a batch -> the batch's Future
+        self._batches = {}  # id of the first request of a batch -> (Future, request ids), until recv_for_batch_request
+        self._notifications = asyncio.Queue()
+
+    # websockets is imported here too, `import main` doesn't pay for it
+    async def connect(self):
+        from websockets.asyncio.client import connect
+
+        # blocks with full transactions easily go over the 1MiB default
+        self._socket = await connect(self.url, max_size=None)
+        self._reader = asyncio.create_task(self._read())
+
+    async def disconnect(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            self._reader = None
+        if self._socket is not None:
+            await self._socket.close()
+            self._socket = None
+        self._fail_waiting(ConnectionError("disconnected"))
+
+    async def _read(self):
+        try:
+            async for message in self._socket:
+                self._dispatch(json.loads(message))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._fail_waiting(ConnectionError(f"connection lost ({type(e).__name__}: {str(e)})"))
+        else:
+            self._fail_waiting(ConnectionError("connection closed"))
+
+    def _fail_waiting(self, error):
+        waiting, self._waiting = self._waiting, {}
+        for future in waiting.values():
+            if not future.done():
+                future.set_exception(error)
+        # ends subscriptions()
+        self._notifications.put_nowait(error)
+
+    def _dispatch(self, message):
+        if isinstance(message, list):
+            # a batch answer, routed by the first id this connection is waiting for
+            for response in message:
+                future = self._waiting.get(response.get("id")) if isinstance(response, dict) else None
+                if future is not None:
+                    break
+            else:
+                # nothing matches, RpcBatcher fails the oldest batch on the missing ids
+                future = self._oldest_batch()
+        elif message.get("method") == "eth_subscription":
+            self._notifications.put_nowait(message["params"])
+            return
+        else:
+            future = self._waiting.pop(message.get("id"), None)
+            if future is None:
+                # an error without id answers a batch the node could not parse
+                future = self._oldest_batch()
+        if future is None or future.done():
+            return
+        for batch_future, request_ids in self._batches.values():
+            if batch_future is future:
+                for request_id in request_ids:
+                    self._waiting.pop(request_id, None)
+        future.set_result(message)
+
+    def _oldest_batch(self):
+        return next((future for future, _ in self._batches.values() if not future.done()), None)
+
+    async def _send(self, message):
+        if self._socket is None:
+            raise ConnectionError("not connected")
+        await self._socket.send(json.dumps(message, separators=(',', ':')))
+
+    async def request(self, method, params):
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request_id] = future
+        try:
+            await self._send({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+            response = await future
+        finally:
+            self._waiting.pop(request_id, None)
+        if response.get("error") is not None:
+            raise ValueError(response["error"])
+        return response.get("result")
+
+    # `requests` are (method, params) pairs, returns the request objects sent
+    async def send_batch_request(self, requests) -> list:
+        request_dicts = [
+            {"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params}
+            for method, params in requests
+        ]
+        future = asyncio.get_running_loop().create_future()
+        request_ids = [request["id"] for request in request_dicts]
+        for request_id in request_ids:
+            self._waiting[request_id] = future
+        self._batches[request_ids[0]] = (future, request_ids)
+        try:
+            await self._send(request_dicts)
+        except BaseException:
+            for request_id in request_ids:
+                self._waiting.pop(request_id, None)
+            del self._batches[request_ids[0]]
+            raise
+        return request_dicts
+
+    # The answer as the node sent it, a list of responses in any order (or a single error object)
+    async def recv_for_batch_request(self, request_dicts):
+        batch = self._batches.get(request_dicts[0]["id"])
+        if batch is None:
+            raise ConnectionError("batch was not sent")
+        try:
+            return await batch[0]
+        finally:
+            del self._batches[request_dicts[0]["id"]]
+
+    async def subscribe(self, *params):
+        return await self.request("eth_subscribe", list(params))
+
+    # Notifications of every subscription of this connection, raises once the connection is gone
+    async def subscriptions(self):
+        while True:
+            notification = await self._notifications.get()
+            if isinstance(notification, Exception):
+                raise notification
+            yield notification
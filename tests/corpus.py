@@ -0,0 +1,31 @@
+# Random UniswapV2 Router calldata for the decoder tests, reproducible from a seeded random.Random
+
+import random
+
+from eth_abi import encode
+
+from src.parse import uniswap_v2_router_methods
+
+
+def random_value(abi_type: str, rng: random.Random):
+    if abi_type == 'address':
+        return '0x' + rng.randbytes(20).hex()
+    if abi_type == 'address[]':
+        return ['0x' + rng.randbytes(20).hex() for _ in range(rng.randint(2, 4))]
+    if abi_type == 'bool':
+        return rng.random() < 0.5
+    if abi_type == 'uint8':
+        return rng.randint(27, 28)
+    if abi_type == 'bytes32':
+        return rng.randbytes(32)
+    return rng.getrandbits(rng.choice((64, 96, 128, 256)))
+
+
+# `n` calldata of router methods with arguments, picked at random
+def build_corpus(n: int, rng: random.Random) -> list:
+    entries = [(selector, entry) for selector, entry in uniswap_v2_router_methods.items() if entry.types]
+    corpus = []
+    for _ in range(n):
+        selector, entry = rng.choice(entries)
+        corpus.append(selector + encode(entry.types, [random_value(t, rng) for t in entry.types]))
+    return corpus
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from src.amm import (get_amount_in, get_amount_out, get_amounts_in, get_amounts_in_batch, get_amounts_out,
+                     get_amounts_out_batch, quote)
+
+
+def test_router_values():
+    # 997 * 1000 * 10000 // (10000 * 1000 + 997 * 1000), floored like Solidity
+    assert get_amount_out(1000, 10000, 10000) == 906
+    # 10000 * 906 * 1000 // ((10000 - 906) * 997) + 1
+    assert get_amount_in(906, 10000, 10000) == 1000
+    assert quote(5, 10, 30) == 15
+
+
+def test_amount_in_is_the_least_buying_amount_out():
+    rng = random.Random(9)
+    for _ in range(1000):
+        reserve_in, reserve_out = rng.randrange(1, 10**24), rng.randrange(2, 10**24)
+        amount_out = rng.randrange(1, reserve_out)
+        amount_in = get_amount_in(amount_out, reserve_in, reserve_out)
+        assert get_amount_out(amount_in, reserve_in, reserve_out) >= amount_out
+        if amount_in > 1:
+            assert get_amount_out(amount_in - 1, reserve_in, reserve_out) < amount_out
+
+
+def test_router_reverts():
+    with pytest.raises(ValueError, match="INSUFFICIENT_INPUT_AMOUNT"):
+        get_amount_out(0, 10, 10)
+    with pytest.raises(ValueError, match="INSUFFICIENT_LIQUIDITY"):
+        get_amount_out(1, 0, 10)
+    with pytest.raises(ValueError, match="ds-math-sub-underflow"):
+        get_amount_in(10, 10, 10)
+    with pytest.raises(ValueError, match="INVALID_PATH"):
+        get_amounts_out(1, [])
+
+
+def test_multi_hop_paths():
+    reserves = [(10**21, 2 * 10**21), (5 * 10**20, 10**24)]
+    amounts = get_amounts_out(10**18, reserves)
+    assert amounts[1] == get_amount_out(10**18, *reserves[0])
+    assert amounts[2] == get_amount_out(amounts[1], *reserves[1])
+    amounts_in = get_amounts_in(amounts[2], reserves)
+    assert amounts_in[-1] == amounts[2] and amounts_in[0] <= 10**18
+
+
+def test_batches_match_the_scalar_functions():
+    reserves = [(10**21, 2 * 10**21), (5 * 10**20, 10**24)]
+    sizes = [0, 1, 10**15, 10**18, 10**22]
+    out = get_amounts_out_batch(sizes, reserves)
+    assert out == [0 if size == 0 else get_amounts_out(size, reserves)[-1] for size in sizes]
+    wanted = [0, 1, 10**20, 10**24]
+    assert get_amounts_in_batch(wanted, reserves) == [None, get_amounts_in(1, reserves)[0],
+                                                      get_amounts_in(10**20, reserves)[0], None]
+    assert get_amounts_out_batch(sizes, [(0, 1)]) == [0] * len(sizes)
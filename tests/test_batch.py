@@ -0,0 +1,111 @@
+import asyncio
+import itertools
+import random
+
+import pytest
+
+from src.batch import RpcBatcher
+
+
+# Persistent-provider-like fake: answers each batch late, with its responses shuffled
+class Provider:
+    def __init__(self, rng, latency=0.002):
+        self.rng = rng
+        self.latency = latency
+        self.ids = itertools.count(1)
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.sizes = []
+        self.answer = None  # replaces the responses of the next batch when set
+
+    async def send_batch_request(self, requests):
+        self.in_flight += 1
+        self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        self.sizes.append(len(requests))
+        return [{'jsonrpc': '2.0', 'id': next(self.ids), 'method': method, 'params': params}
+                for method, params in requests]
+
+    async def recv_for_batch_request(self, request_dicts):
+        await asyncio.sleep(self.rng.random() * self.latency)
+        self.in_flight -= 1
+        responses = [{'jsonrpc': '2.0', 'id': r['id'], 'result': [r['method'], *r['params']]} for r in request_dicts]
+        self.rng.shuffle(responses)
+        if self.answer is not None:
+            responses, self.answer = self.answer(responses), None
+        return responses
+
+
+def test_results_reach_their_callers_one_batch_at_a_time():
+    async def run():
+        provider = Provider(random.Random(4))
+        batcher = RpcBatcher(provider, max_size=3, window=0.001)
+
+        async def call(i):
+            await asyncio.sleep(random.Random(i).random() * 0.01)
+            return await batcher.request("eth_call", [i])
+
+        results = await asyncio.gather(*(call(i) for i in range(60)))
+        assert results == [["eth_call", i] for i in range(60)]
+        assert provider.most_in_flight == 1
+        assert max(provider.sizes) <= 3 and sum(provider.sizes) == 60
+
+    asyncio.run(run())
+
+
+def test_requests_made_during_a_batch_go_out_together():
+    async def run():
+        provider = Provider(random.Random(1), latency=0.01)
+        batcher = RpcBatcher(provider, max_size=100, window=0)
+        first = batcher.request("eth_chainId", [])
+        while not provider.in_flight:
+            await asyncio.sleep(0)
+        later = [batcher.request("eth_call", [i]) for i in range(5)]
+        await asyncio.gather(first, *later)
+        assert provider.sizes == [1, 5]
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize('answer', [
+    lambda responses: responses[1:],  # one missing
+    lambda responses: [dict(r, id=r['id'] + 100) for r in responses],  # another batch's ids
+    lambda responses: [responses[0]] * len(responses),  # duplicates
+])
+def test_mismatched_responses_fail_the_whole_batch(answer):
+    async def run():
+        provider = Provider(random.Random(2))
+        provider.answer = answer
+        batcher = RpcBatcher(provider, max_size=3, window=0.001)
+        results = await asyncio.gather(*(batcher.request("eth_call", [i]) for i in range(3)), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        # the next batch is unaffected
+        assert await batcher.request("eth_chainId", []) == ["eth_chainId"]
+
+    asyncio.run(run())
+
+
+def test_error_responses_fail_only_their_request():
+    async def run():
+        provider = Provider(random.Random(3))
+        provider.answer = lambda responses: [dict(r, result=None, error={'code': -32000, 'message': 'boom'})
+                                             if r['id'] == 1 else r for r in responses]
+        batcher = RpcBatcher(provider, max_size=2, window=0.001)
+        failed, ok = await asyncio.gather(batcher.request("eth_call", [0]), batcher.request("eth_call", [1]),
+                                          return_exceptions=True)
+        assert isinstance(failed, ValueError) and ok == ["eth_call", 1]
+
+    asyncio.run(run())
+
+
+class HttpProvider:
+    async def make_batch_request(self, requests):
+        return [{'jsonrpc': '2.0', 'id': i, 'result': i} for i in range(len(requests) - 1)]
+
+
+def test_short_answer_without_ids_fails():
+    async def run():
+        batcher = RpcBatcher(HttpProvider(), max_size=2, window=0.001)
+        results = await asyncio.gather(batcher.request("a", []), batcher.request("b", []), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+    asyncio.run(run())
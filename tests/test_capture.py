@@ -0,0 +1,113 @@
+import asyncio
+import os
+import time
+
+import pytest
+
+from src.capture import KIND_HASH, KIND_TX, CaptureReader, CaptureWriter, replay
+
+MS = 1_000_000  # ns
+
+TX = {
+    'hash': b'\xaa' * 32,
+    'to': '0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D',
+    'input': '0x7ff36ab5' + '00' * 32,
+    'nonce': '0x5',
+    'value': 10 ** 18,
+}
+
+
+# Takes what replay() feeds, with the time it arrived
+class Pipeline:
+    def __init__(self):
+        self.fed = []
+        self.started = time.perf_counter_ns()
+
+    def _arrived(self, kind, value):
+        self.fed.append((kind, value, time.perf_counter_ns() - self.started))
+        return True
+
+    def submit(self, tx_hash):
+        return self._arrived(KIND_HASH, tx_hash)
+
+    def submit_tx(self, tx):
+        return self._arrived(KIND_TX, tx)
+
+    def backlog(self):
+        return 0
+
+
+def write_capture(path, records):
+    writer = CaptureWriter(str(path), truncate=True)
+    for result, t_ns in records:
+        writer.write(result, t_ns)
+    writer.close()
+
+
+# a hash, a transaction and a hash, 100ms apart
+RECORDS = [(b'\x01' * 32, 1_000 * MS), (TX, 1_100 * MS), ('0x' + '02' * 32, 1_200 * MS)]
+
+
+def test_records_read_back(tmp_path):
+    path = tmp_path / "capture.bin"
+    write_capture(path, RECORDS)
+    with CaptureReader(str(path)) as reader:
+        records = [(t_ns, kind, bytes(payload)) for t_ns, kind, payload in reader]
+    assert [(t_ns, kind) for t_ns, kind, _ in records] == [(1_000 * MS, KIND_HASH), (1_100 * MS, KIND_TX), (1_200 * MS, KIND_HASH)]
+    assert records[0][2] == b'\x01' * 32 and records[2][2] == b'\x02' * 32
+    assert b'"hash":"0x' + b'aa' * 32 + b'"' in records[1][2]
+
+
+def test_replay_at_full_speed(tmp_path):
+    path = tmp_path / "capture.bin"
+    write_capture(path, RECORDS)
+    pipeline = Pipeline()
+    assert asyncio.run(replay(str(path), pipeline, speed=0, max_backlog=10)) == 3
+    (_, first, _), (_, tx, _), (_, last, at) = pipeline.fed
+    assert first == b'\x01' * 32 and last == b'\x02' * 32
+    # quantities and data fields come back formatted, addresses as they were
+    assert tx == {'hash': b'\xaa' * 32, 'to': TX['to'], 'input': bytes.fromhex(TX['input'][2:]), 'nonce': 5, 'value': 10 ** 18}
+    assert at < 50 * MS
+
+
+@pytest.mark.parametrize("speed", [1.0, 2.0])
+def test_replay_keeps_the_relative_timing(tmp_path, speed):
+    path = tmp_path / "capture.bin"
+    write_capture(path, RECORDS)
+    pipeline = Pipeline()
+    asyncio.run(replay(str(path), pipeline, speed=speed, max_backlog=10))
+    # the schedule starts with the replay, the first arrival may already be a little late
+    arrivals = [at - pipeline.fed[0][2] for _, _, at in pipeline.fed]
+    for arrival, expected in zip(arrivals, (0, 100 * MS / speed, 200 * MS / speed)):
+        assert expected - 10 * MS <= arrival < expected + 30 * MS
+
+
+def test_truncated_final_record_is_skipped(tmp_path):
+    path = tmp_path / "capture.bin"
+    write_capture(path, RECORDS)
+    # a crash in the middle of the last record
+    os.truncate(path, os.path.getsize(path) - 5)
+    with CaptureReader(str(path)) as reader:
+        assert [kind for _, kind, _ in reader] == [KIND_HASH, KIND_TX]
+    pipeline = Pipeline()
+    assert asyncio.run(replay(str(path), pipeline, speed=0, max_backlog=10)) == 2
+    assert pipeline.fed[-1][1]['hash'] == b'\xaa' * 32
+
+
+def test_writer_appends_to_a_capture(tmp_path):
+    path = tmp_path / "capture.bin"
+    write_capture(path, RECORDS[:1])
+    writer = CaptureWriter(str(path))
+    writer.write(RECORDS[1][0], RECORDS[1][1])
+    writer.close()
+    with CaptureReader(str(path)) as reader:
+        assert [kind for _, kind, _ in reader] == [KIND_HASH, KIND_TX]
+
+
+def test_not_a_capture_file(tmp_path):
+    path = tmp_path / "other.bin"
+    path.write_bytes(b'not a capture')
+    with pytest.raises(ValueError):
+        CaptureWriter(str(path))
+    with pytest.raises(ValueError):
+        CaptureReader(str(path))
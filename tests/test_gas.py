@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+import requests
+
+from src.gas import FEE_HISTORY_WAIT_TIMES, GasOracle
+
+GWEI = 10 ** 9
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+# requests.Session stand-in: answers with `data`, or raises `error`
+class Session:
+    def __init__(self, data=None, error=None):
+        self.data = data
+        self.error = error
+        self.timeouts = []
+
+    def get(self, url, timeout=None):
+        self.timeouts.append(timeout)
+        if self.error is not None:
+            raise self.error
+        return Response(self.data)
+
+
+class Eth:
+    def __init__(self, history=None, delay=0):
+        self.history = history
+        self.delay = delay
+        self.calls = 0
+
+    async def fee_history(self, blocks, newest, percentiles):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.history
+
+
+class W3:
+    def __init__(self, eth):
+        self.eth = eth
+
+
+API = {
+    priority: {'maxWaitTimeEstimate': wait, 'suggestedMaxFeePerGas': fee, 'suggestedMaxPriorityFeePerGas': tip}
+    for priority, wait, fee, tip in (('low', 60000, '20.5', '1'), ('medium', 30000, '25', '1.5'), ('high', 15000, '30', '2'))
+}
+# two blocks of (low, medium, high) rewards, an empty one, then the next base fee
+HISTORY = {
+    'baseFeePerGas': [10 * GWEI, 11 * GWEI, 12 * GWEI],
+    'reward': [[1 * GWEI, 2 * GWEI, 3 * GWEI], [], [1 * GWEI, 4 * GWEI, 5 * GWEI]],
+}
+
+
+def oracle(session, eth=None, timeout=5):
+    gas = GasOracle('https://gas.example/fees', W3(eth) if eth is not None else None, timeout=timeout)
+    gas.session = session
+    return gas
+
+
+def test_api_suggestion():
+    session = Session(API)
+    gas = oracle(session)
+    assert asyncio.run(gas.suggest('low')) == [60000, 20_500_000_000, 1 * GWEI]
+    assert gas.source == 'api' and session.timeouts == [5]
+
+
+def test_api_timeout_falls_back_to_fee_history():
+    eth = Eth(HISTORY)
+    gas = oracle(Session(error=requests.exceptions.Timeout("read timed out")), eth)
+    medium = asyncio.run(gas.suggest('medium'))
+    assert gas.source == 'fee_history' and eth.calls == 1
+    # median tip of the non-empty blocks, room for the next base fee to double
+    assert medium == [FEE_HISTORY_WAIT_TIMES['medium'], 2 * 12 * GWEI + 4 * GWEI, 4 * GWEI]
+
+
+def test_no_url_uses_fee_history_only():
+    gas = GasOracle(None, W3(Eth(HISTORY)))
+    assert asyncio.run(gas.suggest('high'))[2] == 5 * GWEI
+    assert gas.source == 'fee_history'
+
+
+def test_fee_history_timeout_keeps_the_last_suggestion():
+    async def run():
+        eth = Eth(HISTORY)
+        gas = oracle(Session(error=requests.exceptions.ConnectionError("refused")), eth, timeout=0.05)
+        first = await gas.suggest('medium')
+        eth.delay = 3600
+        refreshed = await asyncio.wait_for(gas.refresh(), 1)
+        return first, refreshed, await gas.suggest('medium')
+
+    first, refreshed, last = asyncio.run(run())
+    assert not refreshed and last == first
+
+
+def test_nothing_available():
+    gas = oracle(Session(error=requests.exceptions.Timeout()), Eth(HISTORY, delay=3600), timeout=0.05)
+    with pytest.raises(RuntimeError):
+        asyncio.run(gas.suggest())
+
+
+def test_stop_cancels_the_refreshes():
+    async def run():
+        gas = oracle(Session(API))
+        gas.refresh_interval = 3600
+        await gas.start()
+        # a new block starts a refresh stuck on eth_feeHistory
+        gas.session = Session(error=requests.exceptions.Timeout())
+        gas.w3 = W3(Eth(HISTORY, delay=3600))
+        gas.on_new_block(1)
+        await asyncio.sleep(0.01)
+        refreshing = gas._refreshing
+        await asyncio.wait_for(gas.stop(), 1)
+        return gas, refreshing
+
+    gas, refreshing = asyncio.run(run())
+    assert refreshing.cancelled()
+    assert gas._task is None and gas._refreshing is None
+    assert gas.source == 'api'
@@ -0,0 +1,66 @@
+import json
+import threading
+
+import pytest
+
+from src import logs
+
+
+@pytest.fixture(autouse=True)
+def restore_logging():
+    yield
+    logs.configure_logging(level='trace', console=False)
+
+
+def read_json(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_records_reach_the_json_file(tmp_path):
+    path = tmp_path / "log.jsonl"
+    logs.configure_logging(level='info', json_path=str(path), console=False)
+    logs.log_debug("hidden")
+    logs.log_info("shown", 1)
+    logs.flush_logs()
+    assert [(r['level'], r['msg']) for r in read_json(path)] == [('info', 'shown 1')]
+
+
+def test_full_queue_drops_and_reports(tmp_path):
+    path = tmp_path / "log.jsonl"
+    logs.configure_logging(level='info', json_path=str(path), console=False, queue_size=4)
+    # hold the writer on one record while the queue fills up
+    blocker = threading.Event()
+    logs._records.put(_Waiter(blocker))
+    dropped = logs.dropped_logs()
+    for i in range(20):
+        logs.log_info(f"record {i}")
+    assert logs.dropped_logs() > dropped
+    blocker.set()
+    logs.flush_logs()
+    logs.log_info("after")
+    logs.flush_logs()
+    messages = [r['msg'] for r in read_json(path)]
+    assert any(m.startswith("Log queue full, dropped") for m in messages)
+    assert messages[-1] == "after"
+
+
+def test_reconfigure_closes_the_previous_file(tmp_path):
+    logs.configure_logging(json_path=str(tmp_path / "first.jsonl"), console=False)
+    first = logs._json_sink
+    writer = logs._writer_thread
+    logs.configure_logging(json_path=str(tmp_path / "second.jsonl"), console=False)
+    assert first.closed and not writer.is_alive()
+    assert logs._writer_thread.is_alive()
+
+
+# A record the writer blocks on until `event` is set
+class _Waiter(tuple):
+    def __new__(cls, event):
+        return super().__new__(cls, (0.0, logs.INFO, "waiter"))
+
+    def __init__(self, event):
+        self.event = event
+
+    def __iter__(self):
+        self.event.wait(5)
+        return super().__iter__()
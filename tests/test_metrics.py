@@ -0,0 +1,34 @@
+import random
+
+from src.metrics import Histogram, Metrics, bucket_index, bucket_value
+
+
+def test_buckets_bound_the_relative_error():
+    for value in [0, 1, 15, 16, 17, 1000, 123456, 10**9]:
+        low = bucket_value(bucket_index(value))
+        assert low <= value
+        assert value - low <= value / 16
+
+
+def test_percentiles():
+    histogram = Histogram()
+    values = list(range(1, 10001))
+    random.Random(12).shuffle(values)
+    for value in values:
+        histogram.record(value)
+    assert histogram.count == 10000 and histogram.max == 10000
+    for q in (0.5, 0.9, 0.99):
+        assert abs(histogram.percentile(q) - q * 10000) <= q * 10000 / 16
+    assert Histogram().percentile(0.5) == 0
+
+
+def test_render():
+    metrics = Metrics()
+    histogram = Histogram()
+    histogram.record(2048)
+    metrics.counter("things_total", lambda: 3, "things")
+    metrics.histogram("wait_seconds", histogram)
+    text = metrics.render()
+    assert "# TYPE sandwichbot_things_total counter\nsandwichbot_things_total 3\n" in text
+    assert 'sandwichbot_wait_seconds{quantile="0.5"} 0.002048' in text
+    assert "sandwichbot_wait_seconds_count 1" in text
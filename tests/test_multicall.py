@@ -0,0 +1,159 @@
+import asyncio
+
+from eth_abi import decode, encode
+
+from src.multicall import (
+    AGGREGATE3_SELECTOR, BALANCE_OF_SELECTOR, GET_BLOCK_NUMBER_SELECTOR, GET_ETH_BALANCE_SELECTOR,
+    GET_RESERVES_SELECTOR, MULTICALL3_ADDRESS, ReadAggregator, erc20_balance, eth_balance, is_revert,
+    pair_reserves,
+)
+from src.utils import to_data_bytes
+
+MULTICALL = to_data_bytes(MULTICALL3_ADDRESS)
+TOKEN = b'\x01' * 20
+PAIR = b'\x02' * 20
+OWNER = b'\x03' * 20
+BLOCK = 19_000_000
+
+
+def word(value: int) -> bytes:
+    return value.to_bytes(32, 'big')
+
+
+# A node with a token, a pair and (unless `multicall` is off) Multicall3, answering eth_call
+# and eth_getBalance. `fail` is raised by the next eth_call instead of answering it.
+class Node:
+    def __init__(self, multicall=True):
+        self.multicall = multicall
+        self.fail = None
+        self.aggregate_calls = []  # decoded (target, allowFailure, data) lists sent to aggregate3
+        self.calls = 0
+        self.balance_calls = 0
+
+    def execute(self, target: bytes, data: bytes):
+        if target == TOKEN and data[:4] == BALANCE_OF_SELECTOR:
+            return True, word(1000)
+        if target == PAIR and data[:4] == GET_RESERVES_SELECTOR:
+            return True, word(10) + word(20) + word(30)
+        if target == MULTICALL and data[:4] == GET_ETH_BALANCE_SELECTOR:
+            return True, word(5 * 10 ** 18)
+        if target == MULTICALL and data[:4] == GET_BLOCK_NUMBER_SELECTOR:
+            return True, word(BLOCK)
+        return False, b''
+
+    async def call(self, transaction, block="latest"):
+        self.calls += 1
+        if self.fail is not None:
+            error, self.fail = self.fail, None
+            raise error
+        target, data = to_data_bytes(transaction['to']), to_data_bytes(transaction['data'])
+        if target == MULTICALL:
+            if not self.multicall:
+                return b''
+            assert data[:4] == AGGREGATE3_SELECTOR
+            calls = decode(['(address,bool,bytes)[]'], data[4:])[0]
+            self.aggregate_calls.append(calls)
+            results = [self.execute(to_data_bytes(call_target), call_data) for call_target, _, call_data in calls]
+            return encode(['(bool,bytes)[]'], [results])
+        success, output = self.execute(target, data)
+        if not success:
+            raise ValueError({'code': 3, 'message': 'execution reverted'})
+        return output
+
+    async def get_balance(self, address, block="latest"):
+        self.balance_calls += 1
+        return 5 * 10 ** 18
+
+
+READS = dict(
+    token_balance=erc20_balance(TOKEN, OWNER),
+    eth_balance=eth_balance(OWNER),
+    reserves=pair_reserves(PAIR),
+    missing=pair_reserves(b'\x04' * 20),
+)
+
+
+def test_aggregate3_encoding():
+    node = Node()
+    asyncio.run(ReadAggregator(node).read(**READS))
+    calls = node.aggregate_calls[0]
+    # the block number first, every read allowed to fail, ETH balances through the multicall contract
+    assert [(to_data_bytes(target), allow_failure) for target, allow_failure, _ in calls] == [
+        (MULTICALL, False), (TOKEN, True), (MULTICALL, True), (PAIR, True), (b'\x04' * 20, True),
+    ]
+    assert calls[1][2] == BALANCE_OF_SELECTOR + bytes(12) + OWNER
+    assert calls[2][2] == GET_ETH_BALANCE_SELECTOR + bytes(12) + OWNER
+
+
+def test_aggregate3_decoding():
+    node = Node()
+    reader = ReadAggregator(node)
+    snapshot = asyncio.run(reader.read(**READS))
+    assert snapshot.source == "multicall" and snapshot.block_number == BLOCK
+    assert snapshot.token_balance == 1000
+    assert snapshot.eth_balance == 5 * 10 ** 18
+    assert snapshot.reserves == (10, 20, 30)
+    assert snapshot.missing is None
+    assert node.calls == 1 and reader.round_trips == 1
+
+
+def test_batch_fallback_reads_the_same_values():
+    node = Node()
+    snapshot = asyncio.run(ReadAggregator(node, multicall_address=None).read(**READS))
+    assert snapshot.source == "batch" and snapshot.block_number is None
+    assert (snapshot.token_balance, snapshot.eth_balance, snapshot.reserves, snapshot.missing) == \
+        (1000, 5 * 10 ** 18, (10, 20, 30), None)
+    assert node.balance_calls == 1 and not node.aggregate_calls
+
+
+def test_no_contract_turns_multicall_off():
+    async def run():
+        reader = ReadAggregator(Node(multicall=False))
+        first = await reader.read(**READS)
+        second = await reader.read(**READS)
+        return reader, first, second
+
+    reader, first, second = asyncio.run(run())
+    assert reader.multicall_address is None
+    assert first.source == second.source == "batch"
+    assert first.token_balance == 1000
+
+
+def test_reverted_aggregate3_turns_multicall_off():
+    node = Node()
+    node.fail = ValueError({'code': 3, 'message': 'execution reverted'})
+    reader = ReadAggregator(node)
+    assert asyncio.run(reader.read(**READS)).source == "batch"
+    assert reader.multicall_address is None
+
+
+def test_node_error_only_pauses_multicall():
+    async def run(retry_interval):
+        node = Node()
+        reader = ReadAggregator(node, retry_interval=retry_interval)
+        node.fail = ValueError({'code': -32000, 'message': 'request timed out'})
+        first = await reader.read(**READS)
+        second = await reader.read(**READS)
+        return reader, first, second
+
+    reader, first, second = asyncio.run(run(60))
+    assert first.source == second.source == "batch"
+    assert reader.multicall_address == MULTICALL
+
+    # tried again once the interval is over
+    reader, first, second = asyncio.run(run(0))
+    assert (first.source, second.source) == ("batch", "multicall")
+
+
+def test_connection_error_only_pauses_multicall():
+    node = Node()
+    node.fail = ConnectionError("No provider connected")
+    reader = ReadAggregator(node, retry_interval=0)
+    assert asyncio.run(reader.read(**READS)).source == "batch"
+    assert asyncio.run(reader.read(**READS)).source == "multicall"
+
+
+def test_revert_errors():
+    assert is_revert(ValueError({'code': 3, 'message': 'execution reverted'}))
+    assert is_revert(ValueError('VM Exception while processing transaction: revert'))
+    assert not is_revert(ValueError({'code': -32000, 'message': 'header not found'}))
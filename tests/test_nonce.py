@@ -0,0 +1,133 @@
+import asyncio
+
+from src.nonce import NonceManager, is_already_known, is_nonce_error
+
+
+class Eth:
+    def __init__(self, pending):
+        self.pending = pending
+
+    async def get_transaction_count(self, address, block):
+        return self.pending
+
+
+class W3:
+    def __init__(self, pending):
+        self.eth = Eth(pending)
+
+
+def manager(pending=5):
+    return NonceManager(W3(pending), '0x' + '11' * 20)
+
+
+def test_nonces_are_handed_out_locally():
+    async def run():
+        nonces = manager(5)
+        return [await nonces.next_nonce() for _ in range(3)]
+
+    assert asyncio.run(run()) == [5, 6, 7]
+
+
+def test_resync_keeps_nonces_the_node_has_not_seen():
+    async def run():
+        nonces = manager(5)
+        for _ in range(3):
+            nonce = await nonces.next_nonce()
+            nonces.sent(nonce, bytes([nonce]) * 32)
+        # the node only saw nonce 5 so far
+        nonces.w3.eth.pending = 6
+        await nonces.resync()
+        assert sorted(nonces.in_flight) == [6, 7]
+        return await nonces.next_nonce()
+
+    assert asyncio.run(run()) == 8
+
+
+def test_resync_takes_the_node_nonce_when_ahead():
+    async def run():
+        nonces = manager(5)
+        nonces.sent(await nonces.next_nonce(), b'\x05' * 32)
+        nonces.w3.eth.pending = 9
+        await nonces.resync()
+        assert not nonces.in_flight
+        return await nonces.next_nonce()
+
+    assert asyncio.run(run()) == 9
+
+
+def test_released_nonce_is_reused():
+    async def run():
+        nonces = manager(5)
+        first, second = await nonces.next_nonce(), await nonces.next_nonce()
+        nonces.sent(second, b'\x06' * 32)
+        await nonces.release(first)  # cancelled after a later one was sent
+        return await nonces.next_nonce(), await nonces.next_nonce()
+
+    assert asyncio.run(run()) == (5, 7)
+
+
+def test_dropped_transaction_gives_its_nonce_back():
+    async def run():
+        nonces = manager(5)
+        for _ in range(2):
+            nonce = await nonces.next_nonce()
+            nonces.sent(nonce, bytes([nonce]) * 32)
+        # nonce 5 fell out of the mempool, the node is back at 5 while 6 is still ours
+        await nonces.dropped(5)
+        return await nonces.next_nonce(), await nonces.next_nonce()
+
+    assert asyncio.run(run()) == (5, 7)
+
+
+def test_resync_during_a_send_keeps_its_nonce():
+    async def run():
+        nonces = manager(5)
+        being_sent = await nonces.next_nonce()
+        later = await nonces.next_nonce()
+        nonces.sent(later, b'\x06' * 32)
+        # a nonce error elsewhere resyncs while nonce 5 is still being signed and broadcast
+        await nonces.resync()
+        assert not nonces.gaps
+        reissued = await nonces.next_nonce()
+        nonces.sent(being_sent, b'\x05' * 32)
+        return being_sent, reissued
+
+    assert asyncio.run(run()) == (5, 7)
+
+
+def test_resync_with_only_a_send_in_progress():
+    async def run():
+        nonces = manager(5)
+        await nonces.next_nonce()
+        await nonces.resync()
+        return await nonces.next_nonce()
+
+    assert asyncio.run(run()) == 6
+
+
+def test_failed_send_released_after_a_resync_is_reused():
+    async def run():
+        nonces = manager(5)
+        being_sent = await nonces.next_nonce()
+        nonces.sent(await nonces.next_nonce(), b'\x06' * 32)
+        await nonces.resync()
+        await nonces.release(being_sent)
+        assert not nonces.handed_out
+        return await nonces.next_nonce()
+
+    assert asyncio.run(run()) == 5
+
+
+def test_confirmed_checks_the_hash():
+    nonces = manager()
+    nonces.sent(5, b'\x01' * 32)
+    nonces.confirmed(5, b'\x02' * 32)
+    assert 5 in nonces.in_flight
+    nonces.confirmed(5, b'\x01' * 32)
+    assert not nonces.in_flight
+
+
+def test_error_classes():
+    assert is_nonce_error(ValueError({'message': 'nonce too low'}))
+    assert not is_nonce_error(ValueError('already known'))
+    assert is_already_known(ValueError({'code': -32000, 'message': 'already known'}))
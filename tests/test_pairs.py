@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from src.pairs import PairCache, PairResolver, sort_tokens
+
+FACTORY = '0x5C69bEe701ef814a2B6a3EDD4B1652CB9cc5aA6f'
+WETH = bytes.fromhex('c02aaa39b223fe8d0a0e5c4f27ead9083c756cc2')
+USDC = bytes.fromhex('a0b86991c6218b36c1d19d4a2e9eb0ce3606eb48')
+
+
+def test_pair_address_matches_mainnet():
+    pair = PairResolver().pair_address(FACTORY, WETH, USDC)
+    assert pair == bytes.fromhex('b4e16d0168e52d35cacd2c6185b44281ec28c9dc')
+    assert PairResolver().pair_address(FACTORY, '0x' + USDC.hex(), WETH) == pair
+
+
+def test_sort_tokens():
+    assert sort_tokens(WETH, USDC) == (USDC, WETH)
+    with pytest.raises(ValueError):
+        sort_tokens(WETH, WETH)
+
+
+class Node:
+    def __init__(self):
+        self.deployed = False
+        self.calls = 0
+
+    async def call(self, transaction):
+        self.calls += 1
+        if not self.deployed:
+            return b''
+        return (1000).to_bytes(32, 'big') + (2000).to_bytes(32, 'big') + bytes(32)
+
+
+async def watch(cache, node):
+    cache.watch_path((WETH, USDC), node.call)
+    await asyncio.gather(*cache._loading.values())
+
+
+def test_missing_pair_is_checked_again_after_ttl():
+    async def run():
+        cache = PairCache(FACTORY, missing_ttl=60)
+        node = Node()
+        await watch(cache, node)
+        assert cache.get_reserves(WETH, USDC) is None and len(cache.missing) == 1
+
+        # created meanwhile, but still within the ttl
+        node.deployed = True
+        await watch(cache, node)
+        assert node.calls == 1
+
+        pair = cache.pair_address(WETH, USDC)
+        cache.missing[pair] = 0  # ttl elapsed
+        await watch(cache, node)
+        assert node.calls == 2 and not cache.missing
+        assert cache.get_reserves(USDC, WETH)[:2] == (1000, 2000)
+
+    asyncio.run(run())
+
+
+def test_missing_pairs_are_bounded():
+    cache = PairCache(FACTORY, missing_size=3)
+    for i in range(10):
+        cache._add_missing(bytes([i]) * 20)
+    assert len(cache.missing) == 3
+    assert list(cache.missing) == [bytes([i]) * 20 for i in (7, 8, 9)]
+
+
+class Rpc:
+    def __init__(self, logs):
+        self.logs = logs
+        self.requests = []
+
+    async def get_logs(self, log_filter):
+        self.requests.append(log_filter['blockHash'])
+        return self.logs
+
+    async def get_block(self, block_hash, full_transactions=False):
+        return {'number': '0x2a'}
+
+
+def test_new_heads_apply_sync_logs_once_per_block():
+    async def run():
+        cache = PairCache(FACTORY)
+        node = Node()
+        node.deployed = True
+        await watch(cache, node)
+        pair = cache.pair_address(WETH, USDC)
+        data = '0x' + (1500).to_bytes(32, 'big').hex() + (2500).to_bytes(32, 'big').hex()
+        rpc = Rpc([{'address': '0x' + pair.hex(), 'data': data, 'blockNumber': '0x2b'}])
+        cache.start(rpc)
+        block_hash = '0x' + '01' * 32
+        # every provider announces the same block
+        cache.on_head(block_hash)
+        cache.on_head(bytes.fromhex('01' * 32))
+        await asyncio.sleep(0.01)
+        assert rpc.requests == [block_hash]
+        assert cache.get_reserves(USDC, WETH) == (1500, 2500, 43)
+
+        # a block without Sync logs still moves the block number
+        rpc.logs = []
+        cache.on_head('0x' + '02' * 32)
+        await asyncio.sleep(0.01)
+        await cache.stop()
+        assert cache.block_number == 43
+
+    asyncio.run(run())
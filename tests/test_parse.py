@@ -0,0 +1,64 @@
+import random
+
+import pytest
+from eth_abi import encode
+
+from src.abi import selector
+from src.parse import (MalformedCalldata, decode_args, decode_swap_args, parse_univ2_router_tx, swap_selectors,
+                       uniswap_v2_router_methods)
+
+from corpus import build_corpus
+
+WETH = '0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2'
+USDC = '0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48'
+RECIPIENT = '0x' + '11' * 20
+SWAP = selector('UniswapV2Router02', 'swapExactTokensForTokens')
+SWAP_TYPES = ['uint256', 'uint256', 'address[]', 'address', 'uint256']
+
+
+def swap_calldata(path=(WETH, USDC)):
+    return SWAP + encode(SWAP_TYPES, [10**18, 12345, list(path), RECIPIENT, 1700000000])
+
+
+def test_swap_is_decoded_to_raw_addresses():
+    call = parse_univ2_router_tx(swap_calldata())
+    assert call.method == 'swapExactTokensForTokens'
+    assert call.args == (10**18, 12345, (bytes.fromhex(WETH[2:]), bytes.fromhex(USDC[2:])),
+                         bytes.fromhex(RECIPIENT[2:]), 1700000000)
+
+
+def test_fast_path_matches_eth_abi():
+    for tx_data in build_corpus(500, random.Random(5)):
+        entry = uniswap_v2_router_methods[tx_data[:4]]
+        expected = decode_args(entry, tx_data[4:])
+        assert parse_univ2_router_tx(tx_data).args == expected
+        amounts = swap_selectors.get(tx_data[:4])
+        if amounts is not None:
+            assert decode_swap_args(memoryview(tx_data)[4:], amounts) == expected
+
+
+def test_unknown_selector():
+    assert parse_univ2_router_tx(b'\xde\xad\xbe\xef' + bytes(64)) is None
+    assert parse_univ2_router_tx(b'') is None
+
+
+def test_non_canonical_layouts_fall_back_to_eth_abi():
+    tx_data = bytearray(swap_calldata())
+    # dirty padding in the recipient word: the fast path refuses it, eth_abi decides
+    tx_data[4 + 3 * 32] = 1
+    assert decode_swap_args(memoryview(tx_data)[4:], 2) is None
+    with pytest.raises(MalformedCalldata):
+        parse_univ2_router_tx(tx_data)
+
+
+def test_truncated_calldata_is_malformed():
+    tx_data = swap_calldata()
+    with pytest.raises(MalformedCalldata):
+        parse_univ2_router_tx(tx_data[:-32])
+    with pytest.raises(ValueError):
+        parse_univ2_router_tx(tx_data[:40])
+
+
+def test_extra_trailing_bytes_are_accepted_like_eth_abi():
+    tx_data = swap_calldata() + bytes(7)
+    assert parse_univ2_router_tx(tx_data).args == decode_args(uniswap_v2_router_methods[SWAP], tx_data[4:])
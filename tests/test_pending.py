@@ -0,0 +1,73 @@
+from src.pending import PendingTxStore
+
+ROUTER = '0x7a250d5630b4cf539739df2c5dacb4c659f2488d'
+
+
+def tx(n, sender=1, nonce=None, to=ROUTER):
+    return {
+        'hash': '0x' + n.to_bytes(32, 'big').hex(),
+        'from': '0x' + sender.to_bytes(20, 'big').hex(),
+        'to': to,
+        'nonce': hex(n if nonce is None else nonce),
+        'gas': hex(200000),
+        'value': '0x0',
+        'maxFeePerGas': hex(10**9),
+        'maxPriorityFeePerGas': hex(10**8),
+        'input': '0x',
+    }
+
+
+def test_add_and_lookup():
+    store = PendingTxStore(capacity=10)
+    store.add(tx(1))
+    record = store.get(tx(1)['hash'])
+    assert record.nonce == 1 and record.gas == 200000 and record.max_fee == 10**9
+    assert tx(1)['hash'] in store
+    assert store.get_by_sender(tx(1)['from'], 1) is record
+    assert store.sent_to(ROUTER) == [record]
+    # the same hash twice is ignored
+    assert store.add(tx(1)) is None and len(store) == 1
+
+
+def test_same_sender_and_nonce_replaces():
+    store = PendingTxStore(capacity=10)
+    store.add(tx(1, nonce=7))
+    replaced = store.add(tx(2, nonce=7))
+    assert replaced is not None and replaced.hash == bytes.fromhex(tx(1)['hash'][2:])
+    assert tx(1)['hash'] not in store and tx(2)['hash'] in store
+    assert len(store) == 1 and store.replaced == 1
+    assert store.get_by_sender(tx(2)['from'], 7).hash == bytes.fromhex(tx(2)['hash'][2:])
+    assert len(store.sent_to(ROUTER)) == 1
+
+
+def test_capacity_evicts_the_oldest():
+    store = PendingTxStore(capacity=3)
+    for n in range(5):
+        store.add(tx(n, sender=n))
+    assert len(store) == 3 and store.evicted == 2
+    assert [r.nonce for r in store.sent_to(ROUTER)] == [2, 3, 4]
+    assert tx(0)['hash'] not in store and tx(1)['hash'] not in store
+
+
+def test_eviction_skips_removed_and_replaced_records():
+    store = PendingTxStore(capacity=3)
+    store.add(tx(0, sender=0))
+    store.add(tx(1, sender=1, nonce=0))
+    store.add(tx(2, sender=1, nonce=0))  # replaces 1
+    store.remove(tx(0)['hash'])
+    store.add(tx(3, sender=3))
+    store.add(tx(4, sender=4))
+    assert store.evicted == 0 and len(store) == 3
+    store.add(tx(5, sender=5))
+    assert store.evicted == 1 and tx(2)['hash'] not in store
+
+
+def test_ttl_expires_old_records():
+    store = PendingTxStore(capacity=10, ttl=60)
+    store.add(tx(1))
+    store.add(tx(2))
+    now = store.get(tx(2)['hash']).seen
+    assert store.evict(now + 30) == 0
+    assert store.evict(now + 61) == 2
+    assert len(store) == 0 and store.expired == 2
+    assert store.by_router == {} and store.by_sender == {}
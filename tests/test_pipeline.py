@@ -0,0 +1,178 @@
+import asyncio
+
+from src.parse import MalformedCalldata, parse_univ2_router_tx, uniswap_v2_router_methods
+from src.pipeline import MempoolPipeline
+
+
+def test_malformed_calldata_is_dropped_not_an_error():
+    handled = []
+
+    async def handle(tx, decoded):
+        handled.append(decoded)
+
+    def decode(tx):
+        return parse_univ2_router_tx(tx['input'])
+
+    selector = next(s for s, entry in uniswap_v2_router_methods.items() if entry.method == 'addLiquidityETH')
+
+    async def run():
+        pipeline = MempoolPipeline(None, decode, handle)
+        pipeline.start()
+        pipeline.submit_tx({'hash': b'\x01' * 32, 'input': selector + b'\x00' * 7})
+        pipeline.submit_tx({'hash': b'\x02' * 32, 'input': b'\x12\x34\x56\x78'})
+        await pipeline.decode_queue.join()
+        await pipeline.handle_queue.join()
+        await pipeline.stop()
+        return pipeline.stats
+
+    stats = asyncio.run(run())
+    assert stats.malformed == 1 and stats.skipped == 1 and stats.errors == 0 and not handled
+
+
+def test_malformed_calldata_is_a_value_error():
+    assert issubclass(MalformedCalldata, ValueError)
+
+
+def tx_hash(i):
+    return i.to_bytes(32, 'big')
+
+
+def test_full_entry_queue_drops_and_counts():
+    async def run():
+        pipeline = MempoolPipeline(None, None, None, queue_size=3)
+        accepted = [pipeline.submit(tx_hash(i)) for i in range(5)]
+        accepted += [pipeline.submit_tx({'hash': tx_hash(i)}) for i in range(5)]
+        return accepted, pipeline.stats
+
+    accepted, stats = asyncio.run(run())
+    assert accepted == [True] * 3 + [False] * 2 + [True] * 3 + [False] * 2
+    assert stats.received == 6 and stats.dropped == 4
+
+
+def test_slow_handler_backs_up_every_stage():
+    async def run():
+        unblocked = asyncio.Event()
+        handled = []
+
+        async def fetch(h):
+            return {'hash': h}
+
+        async def handle(tx, decoded):
+            await unblocked.wait()
+            handled.append(tx['hash'])
+
+        pipeline = MempoolPipeline(fetch, lambda tx: tx, handle, fetch_workers=1, queue_size=2)
+        pipeline.start()
+        accepted = 0
+        for i in range(50):
+            accepted += pipeline.submit(tx_hash(i))
+            await asyncio.sleep(0)
+        # every queue is full and each worker holds one item, nothing else got in
+        backlog = (pipeline.intake_queue.qsize(), pipeline.decode_queue.qsize(), pipeline.handle_queue.qsize())
+        unblocked.set()
+        await pipeline.join()
+        await pipeline.stop()
+        return accepted, backlog, handled, pipeline.stats
+
+    accepted, backlog, handled, stats = asyncio.run(run())
+    assert backlog == (2, 2, 2)
+    # the handler, the decode worker and the fetch worker each hold one more
+    assert accepted == 2 * 3 + 3
+    assert stats.dropped == 50 - accepted
+    assert handled == [tx_hash(i) for i in range(accepted)]
+
+
+def test_fetch_workers_run_concurrently():
+    async def run():
+        running = 0
+        most = 0
+
+        async def fetch(h):
+            nonlocal running, most
+            running += 1
+            most = max(most, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return None
+
+        pipeline = MempoolPipeline(fetch, lambda tx: tx, None, fetch_workers=4)
+        pipeline.start()
+        for i in range(10):
+            pipeline.submit(tx_hash(i))
+        await pipeline.join()
+        await pipeline.stop()
+        return most, pipeline.stats
+
+    most, stats = asyncio.run(run())
+    assert most == 4
+    assert stats.missing == 10
+
+
+def test_failing_fetch_is_counted_and_the_rest_goes_through():
+    async def run():
+        handled = []
+
+        async def fetch(h):
+            if h[-1] % 2:
+                raise ConnectionError("No provider connected")
+            return {'hash': h}
+
+        async def handle(tx, decoded):
+            handled.append(tx['hash'])
+
+        pipeline = MempoolPipeline(fetch, lambda tx: tx, handle, fetch_workers=3)
+        pipeline.start()
+        for i in range(10):
+            pipeline.submit(tx_hash(i))
+        await pipeline.join()
+        await pipeline.stop()
+        return sorted(handled), pipeline.stats
+
+    handled, stats = asyncio.run(run())
+    assert stats.errors == 5 and stats.fetched == 5 and stats.handled == 5
+    assert handled == [tx_hash(i) for i in range(0, 10, 2)]
+
+
+def test_join_drains_before_stop():
+    async def run():
+        handled = []
+
+        async def fetch(h):
+            await asyncio.sleep(0.001)
+            return {'hash': h}
+
+        async def handle(tx, decoded):
+            await asyncio.sleep(0.001)
+            handled.append(tx['hash'])
+
+        pipeline = MempoolPipeline(fetch, lambda tx: tx, handle, fetch_workers=2, queue_size=4)
+        pipeline.start()
+        for i in range(4):
+            pipeline.submit(tx_hash(i))
+        await pipeline.join()
+        await pipeline.stop()
+        return handled, pipeline
+
+    handled, pipeline = asyncio.run(run())
+    assert len(handled) == 4 and pipeline.backlog() == 0
+    assert pipeline.stats.handled == 4 and pipeline.stats.errors == 0
+    assert not pipeline._tasks
+
+
+def test_stop_cancels_work_in_progress():
+    async def run():
+        started = asyncio.Event()
+
+        async def fetch(h):
+            started.set()
+            await asyncio.sleep(3600)
+
+        pipeline = MempoolPipeline(fetch, lambda tx: tx, None, fetch_workers=2)
+        pipeline.start()
+        pipeline.submit(tx_hash(1))
+        await started.wait()
+        await asyncio.wait_for(pipeline.stop(), 1)
+        return pipeline
+
+    pipeline = asyncio.run(run())
+    assert pipeline.stats.errors == 0 and not pipeline._tasks
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from src.providers import ProviderPool
+
+
+class FakeClient:
+    def __init__(self, accepts_full=True, accepts_subscriptions=True):
+        self.accepts_full = accepts_full
+        self.accepts_subscriptions = accepts_subscriptions
+        self.subscribed = []
+
+    async def subscribe(self, kind, *args):
+        self.subscribed.append((kind, *args))
+        if not self.accepts_subscriptions or (args and args[0] and not self.accepts_full):
+            raise ValueError("unsupported")
+        return f"0x{len(self.subscribed)}"
+
+    async def disconnect(self):
+        pass
+
+
+def feed_with(client, full_transactions=True):
+    pool = ProviderPool({"node": "ws://127.0.0.1:1"}, full_transactions=full_transactions)
+    feed = pool.feeds[0]
+    feed.client = client
+    return feed
+
+
+def test_full_transaction_subscription():
+    client = FakeClient()
+    assert asyncio.run(feed_with(client)._subscribe_pending()) == "0x1"
+    assert client.subscribed == [("newPendingTransactions", True)]
+
+
+def test_rejected_full_transactions_fall_back_to_hashes():
+    client = FakeClient(accepts_full=False)
+    assert asyncio.run(feed_with(client)._subscribe_pending()) == "0x2"
+    assert client.subscribed == [("newPendingTransactions", True), ("newPendingTransactions",)]
+
+
+def test_hash_only_mode_subscribes_once():
+    client = FakeClient()
+    asyncio.run(feed_with(client, full_transactions=False)._subscribe_pending())
+    assert client.subscribed == [("newPendingTransactions",)]
+
+
+def test_no_subscriptions_falls_back_to_polling():
+    assert asyncio.run(feed_with(FakeClient(accepts_subscriptions=False))._subscribe_pending()) is None
+
+
+def test_reads_fail_once_every_provider_is_down():
+    feed = feed_with(FakeClient())
+    feed.rpc = feed.client
+    feed.connected = True
+    assert feed.pool.rpc.subscribe is not None
+    asyncio.run(feed._disconnect())
+    assert feed.client is None and feed.rpc is None
+    with pytest.raises(ConnectionError):
+        feed.pool.rpc.get_block
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from src.receipts import ReceiptTracker
+
+MINED = b'\x01' * 32
+OTHER = b'\x02' * 32
+
+
+# AsyncWeb3 stand-in: newHeads pushed with head(), blocks and receipts served from dicts
+class Eth:
+    def __init__(self, blocks, receipts):
+        self.blocks = blocks
+        self.receipts = receipts
+        self.unsubscribed = []
+
+    async def subscribe(self, kind):
+        return "0xheads"
+
+    async def unsubscribe(self, subscription_id):
+        self.unsubscribed.append(subscription_id)
+
+    async def get_block(self, number):
+        return self.blocks.get(number, {"transactions": []})
+
+    async def get_transaction_receipt(self, tx_hash):
+        receipt = self.receipts[tx_hash]
+        if isinstance(receipt, Exception):
+            raise receipt
+        return receipt
+
+
+class Socket:
+    def __init__(self):
+        self.queue = asyncio.Queue()
+
+    async def process_subscriptions(self):
+        while True:
+            yield await self.queue.get()
+
+
+class W3:
+    def __init__(self, blocks=None, receipts=None):
+        self.eth = Eth(blocks or {}, receipts or {})
+        self.socket = Socket()
+
+    def head(self, number, subscription="0xheads"):
+        self.socket.queue.put_nowait({"subscription": subscription, "result": {"number": hex(number)}})
+
+
+def test_receipt_of_a_mined_transaction():
+    async def run():
+        w3 = W3({5: {"transactions": ["0x" + OTHER.hex(), "0x" + MINED.hex()]}},
+                {"0x" + MINED.hex(): {"status": 1, "blockNumber": 5}})
+        tracker = ReceiptTracker(w3)
+        await tracker.start()
+        tracker.track(MINED)
+        w3.head(5)
+        receipt = await tracker.wait(MINED, 1)
+        await tracker.stop()
+        return tracker, w3, receipt
+
+    tracker, w3, receipt = asyncio.run(run())
+    assert receipt == {"status": 1, "blockNumber": 5}
+    assert not tracker._waiting
+    assert w3.eth.unsubscribed == ["0xheads"]
+
+
+def test_blocks_skipped_between_heads_are_scanned():
+    async def run():
+        w3 = W3({6: {"transactions": [MINED]}}, {"0x" + MINED.hex(): {"status": 1}})
+        tracker = ReceiptTracker(w3)
+        numbers = []
+        tracker.block_callbacks.append(numbers.append)
+        await tracker.start()
+        w3.head(5)
+        await asyncio.sleep(0.01)
+        tracker.track(MINED)
+        w3.head(7)
+        receipt = await tracker.wait(MINED, 1)
+        await tracker.stop()
+        return numbers, receipt
+
+    numbers, receipt = asyncio.run(run())
+    assert numbers == [5, 7] and receipt == {"status": 1}
+
+
+def test_wait_times_out_and_forgets_the_hash():
+    async def run():
+        w3 = W3()
+        tracker = ReceiptTracker(w3)
+        await tracker.start()
+        w3.head(5)
+        with pytest.raises(TimeoutError):
+            await tracker.wait(MINED, 0.05)
+        waiting = dict(tracker._waiting)
+        await tracker.stop()
+        return waiting
+
+    assert asyncio.run(run()) == {}
+
+
+def test_receipt_error_reaches_the_waiter():
+    async def run():
+        w3 = W3({5: {"transactions": [MINED]}}, {"0x" + MINED.hex(): ValueError("header not found")})
+        tracker = ReceiptTracker(w3)
+        await tracker.start()
+        tracker.track(MINED)
+        w3.head(5)
+        with pytest.raises(ValueError):
+            await tracker.wait(MINED, 1)
+        await tracker.stop()
+
+    asyncio.run(run())
+
+
+def test_other_subscriptions_are_ignored():
+    async def run():
+        w3 = W3({5: {"transactions": [MINED]}}, {"0x" + MINED.hex(): {"status": 1}})
+        tracker = ReceiptTracker(w3)
+        await tracker.start()
+        tracker.track(MINED)
+        w3.head(5, subscription="0xother")
+        await asyncio.sleep(0.01)
+        block_number = tracker.block_number
+        await tracker.stop()
+        return block_number
+
+    assert asyncio.run(run()) is None
@@ -0,0 +1,53 @@
+from src.pending import PendingTxStore
+from src.reconcile import PendingReconciler
+
+ROUTER = '0x7a250d5630b4cf539739df2c5dacb4c659f2488d'
+SENDER = '0x' + '11' * 20
+
+
+def tx_hash(n):
+    return '0x' + n.to_bytes(32, 'big').hex()
+
+
+def tx(n, nonce, sender=SENDER):
+    return {'hash': tx_hash(n), 'from': sender, 'to': ROUTER, 'nonce': hex(nonce), 'input': '0x'}
+
+
+def block_hash(number):
+    return bytes([number]) * 32
+
+
+def store_with(*transactions):
+    store = PendingTxStore(capacity=100)
+    for transaction in transactions:
+        store.add(transaction)
+    return store
+
+
+def test_mined_transactions_and_lower_nonces_are_removed():
+    store = store_with(tx(1, 0), tx(2, 1), tx(3, 2), tx(4, 0, sender='0x' + '22' * 20))
+    reconciler = PendingReconciler(store)
+    reconciler.apply_block(block_hash(1), 1, [tx_hash(2)])
+    assert tx_hash(2) not in store and tx_hash(1) not in store
+    assert tx_hash(3) in store and tx_hash(4) in store
+    assert reconciler.mined_held == 1 and reconciler.replaced == 1
+    assert reconciler.is_mined(tx_hash(2)) and not reconciler.is_mined(tx_hash(3))
+    assert reconciler.block_number == 1
+
+
+def test_full_blocks_catch_replacements_never_seen():
+    store = store_with(tx(1, 5))
+    reconciler = PendingReconciler(store, full_blocks=True)
+    # same sender and nonce, a hash the bot never saw
+    reconciler.apply_block(block_hash(1), 1, [tx(9, 5)])
+    assert len(store) == 0 and reconciler.replaced == 1 and reconciler.mined_held == 0
+    assert reconciler.is_mined(tx_hash(9))
+
+
+def test_mined_hashes_are_forgotten_after_mined_blocks():
+    reconciler = PendingReconciler(store_with(), mined_blocks=2)
+    for number in range(1, 4):
+        reconciler.apply_block(block_hash(number), number, [tx_hash(number)])
+    assert not reconciler.is_mined(tx_hash(1))
+    assert reconciler.is_mined(tx_hash(2)) and reconciler.is_mined(tx_hash(3))
+    assert reconciler.blocks == 3 and reconciler.block_number == 3
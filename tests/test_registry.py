@@ -0,0 +1,29 @@
+from eth_abi import encode
+
+from src.registry import decode_symbol
+
+
+def test_string_symbol():
+    assert decode_symbol(encode(['string'], ['USDC'])) == 'USDC'
+
+
+def test_bytes32_symbol():
+    assert decode_symbol(b'MKR'.ljust(32, b'\x00')) == 'MKR'
+
+
+def test_empty_bytes32_symbol():
+    assert decode_symbol(bytes(32)) is None
+
+
+def test_truncated_outputs_are_rejected():
+    output = encode(['string'], ['WETH'])
+    assert decode_symbol(b'') is None
+    assert decode_symbol(output[:40]) is None
+    # offset pointing past the end
+    assert decode_symbol((1000).to_bytes(32, 'big') + bytes(32)) is None
+    # length running past the end
+    assert decode_symbol(output[:32] + (100).to_bytes(32, 'big') + output[64:]) is None
+
+
+def test_invalid_utf8_is_replaced():
+    assert decode_symbol(encode(['bytes'], [b'\xffA'])) == '�A'
@@ -0,0 +1,47 @@
+from eth_abi import encode
+
+from src.abi import selector
+from src.amm import get_amount_in, get_amount_out
+from src.parse import parse_univ2_router_tx
+from src.simulate import simulate_swap, valid_path
+
+WETH = bytes.fromhex('c02aaa39b223fe8d0a0e5c4f27ead9083c756cc2')
+USDC = bytes.fromhex('a0b86991c6218b36c1d19d4a2e9eb0ce3606eb48')
+RECIPIENT = '0x' + '11' * 20
+RESERVES = {(WETH, USDC): (10**21, 3 * 10**12), (USDC, WETH): (3 * 10**12, 10**21)}
+
+
+def reserves_of(token_a, token_b):
+    reserves = RESERVES.get((token_a, token_b))
+    return None if reserves is None else (*reserves, 1)
+
+
+def call(method, types, args):
+    return parse_univ2_router_tx(selector('UniswapV2Router02', method) + encode(types, args))
+
+
+def test_exact_input_swap():
+    swap = call('swapExactTokensForTokens', ['uint256', 'uint256', 'address[]', 'address', 'uint256'],
+                [10**18, 0, [WETH, USDC], RECIPIENT, 0])
+    simulation = simulate_swap(swap, reserves_of)
+    out = get_amount_out(10**18, 10**21, 3 * 10**12)
+    assert simulation.amounts == [10**18, out]
+    assert simulation.reserves_after == [(10**21 + 10**18, 3 * 10**12 - out)]
+    assert not simulation.reverts and 0.003 < simulation.price_impact < 0.005
+
+
+def test_exact_output_swap_paid_in_eth():
+    swap = call('swapETHForExactTokens', ['uint256', 'address[]', 'address', 'uint256'],
+                [10**9, [WETH, USDC], RECIPIENT, 0])
+    needed = get_amount_in(10**9, 10**21, 3 * 10**12)
+    assert simulate_swap(swap, reserves_of, value=needed).reverts is False
+    assert simulate_swap(swap, reserves_of, value=needed - 1).reverts is True
+
+
+def test_unsimulated_calls():
+    swap = call('swapExactTokensForTokens', ['uint256', 'uint256', 'address[]', 'address', 'uint256'],
+                [10**18, 0, [WETH, WETH], RECIPIENT, 0])
+    assert not valid_path(swap.get('path')) and simulate_swap(swap, reserves_of) is None
+    unknown_pair = call('swapExactTokensForTokens', ['uint256', 'uint256', 'address[]', 'address', 'uint256'],
+                        [10**18, 0, [WETH, b'\x01' * 20], RECIPIENT, 0])
+    assert simulate_swap(unknown_pair, reserves_of) is None
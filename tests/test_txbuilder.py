@@ -0,0 +1,48 @@
+import pytest
+from eth_abi import encode
+
+from src.abi import selector
+from src.txbuilder import MethodEncoder, build_encoders
+
+WETH = '0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2'
+USDC = '0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48'
+RECIPIENT = '0x' + '11' * 20
+
+
+def test_router_methods_match_eth_abi():
+    swap = build_encoders('UniswapV2Router02')['swapExactTokensForTokens']
+    args = (10**18, 12345, [WETH, USDC], RECIPIENT, 1700000000)
+    assert swap.selector == selector('UniswapV2Router02', 'swapExactTokensForTokens')
+    assert swap.encode(*args) == swap.selector + encode(swap.types, args)
+
+
+def test_erc20_methods_match_eth_abi():
+    approve = build_encoders('ERC20')['approve']
+    args = (RECIPIENT, 2**256 - 1)
+    assert approve.encode(*args) == approve.selector + encode(approve.types, args)
+
+
+def test_signed_and_bytes32_words_match_eth_abi():
+    encoder = MethodEncoder('f', ('int128', 'bool', 'bytes32'), b'\x00' * 4)
+    args = (-5, True, b'\xab' * 32)
+    assert encoder.encode(*args) == b'\x00' * 4 + encode(encoder.types, args)
+
+
+def test_fixed_size_arrays_go_through_eth_abi():
+    encoder = MethodEncoder('f', ('uint256[2]', 'address[]'), b'\x00' * 4)
+    args = ([1, 2], [WETH])
+    assert encoder.encode(*args) == b'\x00' * 4 + encode(encoder.types, args)
+
+
+@pytest.mark.parametrize('abi_type, value', [
+    ('uint8', 300),
+    ('uint256', -1),
+    ('uint256', 2**256),
+    ('int8', 128),
+    ('int8', -129),
+    ('bytes32', b'\x01' * 33),
+    ('address', '0x1234'),
+])
+def test_out_of_range_values_are_rejected(abi_type, value):
+    with pytest.raises(ValueError):
+        MethodEncoder('f', (abi_type,), b'\x00' * 4).encode(value)
@@ -0,0 +1,96 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from src.workers import SEQ, SLOT, ReserveTable
+
+
+def pair(i: int) -> bytes:
+    return i.to_bytes(20, 'little')
+
+
+@pytest.fixture
+def table():
+    table = ReserveTable.create(8)
+    yield table
+    table.close()
+
+
+# The workers' side of the same segment
+@pytest.fixture
+def reader(table):
+    reader = ReserveTable.attach(table.name, table.capacity)
+    yield reader
+    reader.close()
+
+
+def test_capacity_must_be_a_power_of_two():
+    with pytest.raises(ValueError):
+        ReserveTable.create(12)
+
+
+def test_published_reserves_are_read_back(table, reader):
+    table.publish(pair(1), 2 ** 112 - 1, 7, 100)
+    table.publish(pair(9), 3, 4, 101)  # same first slot as pair(1), probed to the next one
+    table.publish(pair(1), 5, 6, 102)
+    assert reader.get(pair(1)) == (5, 6, 102)
+    assert reader.get(pair(9)) == (3, 4, 101)
+    assert reader.get(pair(2)) is None
+    assert len(table) == 2
+
+
+def test_full_table_keeps_one_free_slot(table, reader):
+    for i in range(1, 9):
+        table.publish(pair(i), i, i, i)
+    assert table.full and len(table) == table.capacity - 1
+    # the last pair is not stored, and a lookup for it still ends on the free slot
+    assert reader.get(pair(8)) is None
+    assert reader.get(pair(100)) is None
+    # pairs already stored are still updated
+    table.publish(pair(3), 30, 31, 32)
+    assert reader.get(pair(3)) == (30, 31, 32)
+
+
+def test_reader_retries_while_a_slot_is_written(table, reader):
+    table.publish(pair(1), 1, 1, 1)
+    offset = table._slots[pair(1)]
+    # the writer is halfway through: the counter is odd and only reserve0 is new
+    seq = SEQ.unpack_from(table.shm.buf, offset)[0]
+    SLOT.pack_into(table.shm.buf, offset, seq + 1, pair(1), (2).to_bytes(16, 'little'), (1).to_bytes(16, 'little'), 1)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(reader.get(pair(1))), daemon=True)
+    thread.start()
+    time.sleep(0.05)
+    assert thread.is_alive() and not results
+    SLOT.pack_into(table.shm.buf, offset, seq + 1, pair(1), (2).to_bytes(16, 'little'), (2).to_bytes(16, 'little'), 2)
+    SEQ.pack_into(table.shm.buf, offset, seq + 2)
+    thread.join(1)
+    assert results == [(2, 2, 2)]
+
+
+# Publishes (i, i, i) in a loop for `seconds`, from another process like the event loop's
+def publish_for(name, capacity, seconds):
+    table = ReserveTable.attach(name, capacity)
+    deadline = time.monotonic() + seconds
+    i = 0
+    while time.monotonic() < deadline:
+        i += 1
+        table.publish(pair(1), i, i, i)
+    table.close()
+
+
+def test_reads_across_processes_are_consistent(table):
+    writer = multiprocessing.get_context('spawn').Process(target=publish_for, args=(table.name, table.capacity, 0.3))
+    writer.start()
+    seen = set()
+    while writer.is_alive():
+        reserves = table.get(pair(1))
+        if reserves is not None:
+            assert reserves[0] == reserves[1] == reserves[2]
+            seen.add(reserves[2])
+    writer.join()
+    assert writer.exitcode == 0
+    # the values read kept changing while the writer ran
+    assert len(seen) > 1
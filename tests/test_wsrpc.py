@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+import pytest
+from websockets.asyncio.server import serve
+
+from src.batch import RpcBatcher
+from src.wsrpc import WebSocketRpc
+
+
+# Answers eth_blockNumber with the request id, in reverse order of arrival for batches,
+# pushes a notification after eth_subscribe and closes the socket on "close"
+async def node_handler(websocket):
+    async for message in websocket:
+        message = json.loads(message)
+        if isinstance(message, list):
+            await websocket.send(json.dumps([answer(request) for request in reversed(message)]))
+            continue
+        if message["method"] == "close":
+            await websocket.close()
+            return
+        await websocket.send(json.dumps(answer(message)))
+        if message["method"] == "eth_subscribe":
+            await websocket.send(json.dumps({
+                "jsonrpc": "2.0", "method": "eth_subscription",
+                "params": {"subscription": "0xsub", "result": {"hash": "0x" + "11" * 32}},
+            }))
+
+
+def answer(request):
+    if request["method"] == "eth_blockNumber":
+        return {"jsonrpc": "2.0", "id": request["id"], "result": hex(request["id"])}
+    if request["method"] == "eth_subscribe":
+        return {"jsonrpc": "2.0", "id": request["id"], "result": "0xsub"}
+    return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32601, "message": "no such method"}}
+
+
+async def with_client(test):
+    async with serve(node_handler, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        client = WebSocketRpc(f"ws://127.0.0.1:{port}")
+        await client.connect()
+        try:
+            return await test(client)
+        finally:
+            await client.disconnect()
+
+
+def test_concurrent_requests_get_their_own_response():
+    async def test(client):
+        return await asyncio.gather(*(client.request("eth_blockNumber", []) for _ in range(20)))
+
+    results = asyncio.run(with_client(test))
+    assert [int(result, 16) for result in results] == list(range(1, 21))
+
+
+def test_error_response_raises():
+    async def test(client):
+        with pytest.raises(ValueError):
+            await client.request("eth_nothing", [])
+
+    asyncio.run(with_client(test))
+
+
+def test_batches_through_the_batcher():
+    async def test(client):
+        batcher = RpcBatcher(client, max_size=5)
+        results = await asyncio.gather(*(batcher.request("eth_blockNumber", []) for _ in range(12)))
+        return results, batcher.batches
+
+    results, batches = asyncio.run(with_client(test))
+    assert batches == 3
+    assert [int(result, 16) for result in results] == list(range(1, 13))
+
+
+def test_subscription_notifications():
+    async def test(client):
+        assert await client.subscribe("newPendingTransactions") == "0xsub"
+        async for notification in client.subscriptions():
+            return notification
+
+    notification = asyncio.run(with_client(test))
+    assert notification == {"subscription": "0xsub", "result": {"hash": "0x" + "11" * 32}}
+
+
+def test_closed_connection_fails_requests_and_subscriptions():
+    async def test(client):
+        with pytest.raises(ConnectionError):
+            await client.request("close", [])
+        with pytest.raises(ConnectionError):
+            async for _ in client.subscriptions():
+                pass
+
+    asyncio.run(with_client(test))